@@ -1,99 +1,303 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from fastapi.responses import Response, FileResponse
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Header, Query, Request, WebSocket
+from fastapi.responses import Response, StreamingResponse
+from app.schemas.live_stream import LiveStreamRequest, LiveStreamResponse
 from app.services import live_stream_service
+from app.services.live_stream_service import DEFAULT_STREAM_ID, CHUNK_FILE_PATTERN, SUBTITLE_FILE_PATTERN
+from app.services.segment_service import serve_segment, SEGMENT_CACHE_CONTROL
+import asyncio
 import os
 
-from app.variables import LIVESTREAM_OUTPUT, PLAYLIST_FILE, PLAYLIST_OUTPUT, TRANSLATION_OUTPUT, VIDEO_OUTPUT
-
 router = APIRouter()
 
+PLAYLIST_HEADERS = {
+    "Content-Type": "application/vnd.apple.mpegurl",
+    "Cache-Control": "no-cache",
+}
+
+# Seconds between keep-alive comments on an idle cue event stream, so proxies keep the connection open
+CUE_KEEPALIVE = 15
+
+# Build the response for an in-memory playlist, answering 304 when the player already has this version
+def playlist_response(playlist, request: Request) -> Response:
+    content, etag = playlist.snapshot()
+    headers = {**PLAYLIST_HEADERS, "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=content, headers=headers, media_type="application/vnd.apple.mpegurl")
+
+# Block an LL-HLS playlist reload (`_HLS_msn`, optionally `_HLS_part`) until the requested segment or part is published
+async def wait_for_playlist_segment(playlist, msn: int, part: int = None):
+    if msn is None:
+        if part is not None:
+            raise HTTPException(status_code=400, detail="_HLS_part requires _HLS_msn")
+        return
+    # The last published segment is next_sequence - 1, and requests more than two segments past it are refused
+    if msn > playlist.next_sequence + 1:
+        raise HTTPException(status_code=400, detail="Requested media sequence number is too far in the future")
+    if not await playlist.wait_for_segment(msn, timeout=3 * playlist.target_duration, part=part):
+        raise HTTPException(status_code=503, detail="Requested segment is not available yet")
+
+# Look up a running stream
+def find_stream(stream_id: str, detail: str):
+    stream = live_stream_service.get_stream(stream_id)
+    if stream is None:
+        raise HTTPException(status_code=404, detail=detail)
+    return stream
+
+# Check the run of a run-scoped segment URL; `run_id` is None for the unversioned URLs
+def check_run(stream, run_id: str, detail: str):
+    if run_id is not None and run_id != stream.run_id:
+        raise HTTPException(status_code=404, detail=detail)
+
+# Handlers shared by the default-stream endpoints and the per-stream endpoints
+async def serve_video_playlist(stream_id: str, request: Request, hls_msn: int, hls_part: int = None):
+    playlist = find_stream(stream_id, "Playlist not found").video_playlist
+    await wait_for_playlist_segment(playlist, hls_msn, hls_part)
+    return playlist_response(playlist, request)
+
+def serve_master_playlist(stream_id: str, request: Request):
+    return playlist_response(find_stream(stream_id, "Playlist not found").master_playlist, request)
+
+def serve_chunk(stream_id: str, request: Request, filename: str, run_id: str = None):
+    stream = find_stream(stream_id, "Chunk file not found")
+    check_run(stream, run_id, "Chunk file not found")
+    file_path = f"{stream.video_dir}/{filename}"
+    if CHUNK_FILE_PATTERN.fullmatch(filename) and os.path.isfile(file_path):
+        media_type = "video/MP2T" if filename.endswith(".ts") else "video/mp4"
+        return serve_segment(file_path, media_type, request.headers, immutable=run_id is not None)
+    else:
+        raise HTTPException(status_code=404, detail="Chunk file not found")
+
+# Serve an LL-HLS part, waiting for it if it is the hinted next part and streaming it while it is written
+async def serve_part(stream_id: str, filename: str, run_id: str = None):
+    stream = find_stream(stream_id, "Part not found")
+    check_run(stream, run_id, "Part not found")
+    segmenter = stream.video_segmenter
+    if segmenter is None:
+        raise HTTPException(status_code=404, detail="Part not found")
+    timeout = 3 * stream.video_playlist.part_target
+    part = await segmenter.wait_for_part(filename, timeout)
+    if part is None:
+        raise HTTPException(status_code=404, detail="Part not found")
+    headers = {"Cache-Control": SEGMENT_CACHE_CONTROL if part.complete and run_id is not None else "no-cache"}
+    return StreamingResponse(segmenter.iter_part(part, timeout), media_type="video/mp4", headers=headers)
+
+async def serve_subtitle_playlist(stream_id: str, request: Request, language: str, hls_msn: int):
+    detail = f"{language.capitalize()} subtitle playlist is not found"
+    playlist = find_stream(stream_id, detail).subtitle_playlists.get(language)
+    if playlist is None:
+        raise HTTPException(status_code=404, detail=detail)
+    await wait_for_playlist_segment(playlist, hls_msn)
+    return playlist_response(playlist, request)
+
+def serve_translation(stream_id: str, request: Request, language: str, filename: str, run_id: str = None):
+    stream = find_stream(stream_id, "Subtitle file not found")
+    check_run(stream, run_id, "Subtitle file not found")
+    subtitle_path = f"{stream.translation_dir}/{language}/{filename}"
+    if language in stream.languages and SUBTITLE_FILE_PATTERN.fullmatch(filename) and os.path.isfile(subtitle_path):
+        return serve_segment(subtitle_path, "text/vtt", request.headers, immutable=run_id is not None)
+    else:
+        raise HTTPException(status_code=404, detail="Subtitle file not found")
+
+# Look up the cue channel of a language of a running stream
+def find_cue_channel(stream_id: str, language: str):
+    stream = live_stream_service.get_stream(stream_id)
+    return stream.broadcaster.channel(language) if stream is not None else None
+
+# Push the finalized cues of a language as Server-Sent Events; `Last-Event-ID` resumes after a reconnect
+def serve_cue_events(stream_id: str, language: str, last_event_id: str):
+    channel = find_cue_channel(stream_id, language)
+    if channel is None:
+        raise HTTPException(status_code=404, detail=f"{language.capitalize()} subtitle cues are not found")
+
+    async def events():
+        async for event in channel.subscribe(last_event_id, keepalive=CUE_KEEPALIVE):
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                cue_id, message = event
+                yield f"id: {cue_id}\ndata: {message}\n\n"
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+# Push the finalized cues of a language over a WebSocket; `last_id` resumes after a reconnect
+async def push_cues(websocket: WebSocket, stream_id: str, language: str, last_id: str):
+    channel = find_cue_channel(stream_id, language)
+    if channel is None:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+
+    async def send_cues():
+        async for cue_id, message in channel.subscribe(last_id):
+            await websocket.send_text(message)
+
+    # Cues are only sent, but reading is how a closed connection is noticed while no cue is published
+    async def wait_for_disconnect():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    sender = asyncio.create_task(send_cues())
+    receiver = asyncio.create_task(wait_for_disconnect())
+    try:
+        done, _ = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (sender, receiver):
+            task.cancel()
+        await asyncio.gather(sender, receiver, return_exceptions=True)
+    # The stream was stopped: every cue has been sent
+    if sender in done and sender.exception() is None:
+        await websocket.close()
+
+
 # Endpoint to start processing the video stream
 @router.post("/process-stream/")
 async def process_video_endpoint(background_tasks: BackgroundTasks, stream_url: str):
-    try:    
+    try:
         # Add the process_video function as a background task
         background_tasks.add_task(live_stream_service.process_stream, stream_url)
         return {"message": "Video stream processing started"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Endpoint to start processing a new stream next to the running ones
+@router.post("/streams", response_model=LiveStreamResponse)
+async def start_stream_endpoint(request: LiveStreamRequest):
+    stream = await live_stream_service.start_stream(str(request.stream_url), request.stream_id, request.languages)
+    return stream.info()
+
+# Endpoint to list the running streams
+@router.get("/streams", response_model=list[LiveStreamResponse])
+def list_streams_endpoint():
+    return [stream.info() for stream in live_stream_service.list_streams()]
+
+# Endpoint to describe a running stream
+@router.get("/streams/{stream_id}", response_model=LiveStreamResponse)
+def get_stream_endpoint(stream_id: str):
+    return find_stream(stream_id, "Stream not found").info()
+
+# Endpoint to report the pipeline latency, queue depths and disk usage of a running stream
+@router.get("/streams/{stream_id}/status")
+def get_stream_status_endpoint(stream_id: str):
+    return find_stream(stream_id, "Stream not found").status()
+
+# Endpoint to stop a stream and delete its files
+@router.delete("/streams/{stream_id}")
+def stop_stream_endpoint(stream_id: str, background_tasks: BackgroundTasks):
+    stream = find_stream(stream_id, "Stream not found")
+    background_tasks.add_task(live_stream_service.stop_stream, stream.stream_id)
+    return {"message": f"Stream {stream_id} is stopping"}
+
+@router.get("/streams/{stream_id}/index.m3u8")
+async def get_stream_master_m3u8(request: Request, stream_id: str):
+    return serve_master_playlist(stream_id, request)
+
+@router.get("/streams/{stream_id}/playlist.m3u8")
+async def get_stream_m3u8(
+    request: Request,
+    stream_id: str,
+    hls_msn: int = Query(None, alias="_HLS_msn"),
+    hls_part: int = Query(None, alias="_HLS_part"),
+):
+    return await serve_video_playlist(stream_id, request, hls_msn, hls_part)
+
+@router.get("/streams/{stream_id}/chunks/{filename}")
+async def get_stream_chunk(request: Request, stream_id: str, filename: str):
+    return serve_chunk(stream_id, request, filename)
+
+@router.get("/streams/{stream_id}/parts/{filename}")
+async def get_stream_part(stream_id: str, filename: str):
+    return await serve_part(stream_id, filename)
+
+@router.get("/streams/{stream_id}/subtitles/{language}")
+async def get_stream_subtitle(request: Request, stream_id: str, language: str, hls_msn: int = Query(None, alias="_HLS_msn")):
+    return await serve_subtitle_playlist(stream_id, request, language, hls_msn)
+
+# Segments of one run of a stream, cached as immutable; the unversioned routes below are revalidated
+@router.get("/streams/{stream_id}/runs/{run_id}/chunks/{filename}")
+async def get_stream_run_chunk(request: Request, stream_id: str, run_id: str, filename: str):
+    return serve_chunk(stream_id, request, filename, run_id)
+
+@router.get("/streams/{stream_id}/runs/{run_id}/parts/{filename}")
+async def get_stream_run_part(stream_id: str, run_id: str, filename: str):
+    return await serve_part(stream_id, filename, run_id)
+
+@router.get("/streams/{stream_id}/runs/{run_id}/{language}/{filename}")
+async def get_stream_run_translation(request: Request, stream_id: str, run_id: str, language: str, filename: str):
+    return serve_translation(stream_id, request, language, filename, run_id)
+
+@router.get("/streams/{stream_id}/cues/{language}")
+async def get_stream_cue_events(stream_id: str, language: str, last_event_id: str = Header(None)):
+    return serve_cue_events(stream_id, language, last_event_id)
+
+@router.websocket("/streams/{stream_id}/cues/{language}")
+async def stream_cues_websocket(websocket: WebSocket, stream_id: str, language: str, last_id: str = Query(None)):
+    await push_cues(websocket, stream_id, language, last_id)
+
+@router.get("/streams/{stream_id}/{language}/{filename}")
+async def get_stream_translation(request: Request, stream_id: str, language: str, filename: str):
+    return serve_translation(stream_id, request, language, filename)
+
 # Endpoint to serve the .m3u8 playlist file
 @router.get("/playlist.m3u8")
-async def get_m3u8():
-    if os.path.isfile(PLAYLIST_FILE):
-        headers = {
-            "Content-Type": "application/vnd.apple.mpegurl",
-            "Cache-Control": "no-cache, no-store, must-revalidate",
-            "Pragma": "no-cache",
-            "Expires": "0",
-        }
-        with open(PLAYLIST_FILE, "rb") as f:
-            return Response(content=f.read(), headers=headers, media_type="application/vnd.apple.mpegurl")
-    else:
-        raise HTTPException(status_code=404, detail="Playlist not found")
+async def get_m3u8(
+    request: Request,
+    hls_msn: int = Query(None, alias="_HLS_msn"),
+    hls_part: int = Query(None, alias="_HLS_part"),
+):
+    return await serve_video_playlist(DEFAULT_STREAM_ID, request, hls_msn, hls_part)
 
 
 # Endpoint to serve the index .m3u8 master file
 @router.get("/index.m3u8")
-async def get_m3u8():
-    if os.path.isfile(LIVESTREAM_OUTPUT):
-        headers = {
-            "Content-Type": "application/vnd.apple.mpegurl",
-            "Cache-Control": "no-cache, no-store, must-revalidate",
-            "Pragma": "no-cache",
-            "Expires": "0",
-        }
-        with open(LIVESTREAM_OUTPUT, "rb") as f:
-            return Response(content=f.read(), headers=headers, media_type="application/vnd.apple.mpegurl")
-    else:
-        raise HTTPException(status_code=404, detail="Playlist not found")
+async def get_master_m3u8(request: Request):
+    return serve_master_playlist(DEFAULT_STREAM_ID, request)
+
+
+# Endpoints to serve the segments of the current run of the default stream, cached as immutable
+@router.get("/runs/{run_id}/chunks/{filename}")
+async def get_run_chunk(request: Request, run_id: str, filename: str):
+    return serve_chunk(DEFAULT_STREAM_ID, request, filename, run_id)
+
+@router.get("/runs/{run_id}/parts/{filename}")
+async def get_run_part(run_id: str, filename: str):
+    return await serve_part(DEFAULT_STREAM_ID, filename, run_id)
+
+@router.get("/runs/{run_id}/{language}/{filename}")
+async def get_run_translation(request: Request, run_id: str, language: str, filename: str):
+    return serve_translation(DEFAULT_STREAM_ID, request, language, filename, run_id)
 
 
 # Endpoint to serve individual .ts video chunks
 @router.get("/chunks/{filename}")
-async def get_chunk(filename: str):
-    file_path = f"{VIDEO_OUTPUT}/{filename}"
-    if os.path.isfile(file_path):
-        headers = {
-            "Content-Type": "video/MP2T",
-            "Cache-Control": "no-cache, no-store, must-revalidate",
-            "Pragma": "no-cache",
-            "Expires": "0",
-        }
-        return FileResponse(file_path, headers=headers, media_type="video/MP2T")
-    else:
-        raise HTTPException(status_code=404, detail="Chunk file not found")
+async def get_chunk(request: Request, filename: str):
+    return serve_chunk(DEFAULT_STREAM_ID, request, filename)
+
+
+# Endpoint to serve LL-HLS partial segments
+@router.get("/parts/{filename}")
+async def get_part(filename: str):
+    return await serve_part(DEFAULT_STREAM_ID, filename)
+
 
-        
 # Endpoint to serve subtitle files
 @router.get("/subtitles/{language}")
-async def get_subtitle(language: str):
-    subtitle_path = f"{PLAYLIST_OUTPUT}/{language}_sub.m3u8"
-    if os.path.isfile(subtitle_path):
-        headers = {
-            "Content-Type": "application/vnd.apple.mpegurl",
-            "Cache-Control": "no-cache, no-store, must-revalidate",
-            "Pragma": "no-cache",
-            "Expires": "0",
-        }
-        with open(subtitle_path, "rb") as f:
-            return Response(content=f.read(), headers=headers, media_type="application/vnd.apple.mpegurl")
-    else:
-        raise HTTPException(status_code=404, detail=f"{language.capitalize()} subtitle playlist is not found")
+async def get_subtitle(request: Request, language: str, hls_msn: int = Query(None, alias="_HLS_msn")):
+    return await serve_subtitle_playlist(DEFAULT_STREAM_ID, request, language, hls_msn)
+
+
+# Endpoints to push the finalized subtitle cues as they are published, over Server-Sent Events or a WebSocket
+@router.get("/cues/{language}")
+async def get_cue_events(language: str, last_event_id: str = Header(None)):
+    return serve_cue_events(DEFAULT_STREAM_ID, language, last_event_id)
+
+@router.websocket("/cues/{language}")
+async def cues_websocket(websocket: WebSocket, language: str, last_id: str = Query(None)):
+    await push_cues(websocket, DEFAULT_STREAM_ID, language, last_id)
 
 
-        
 # Endpoint to serve individual translation chunks
 @router.get("/{language}/{filename}")
-async def get_translation_audio(language: str, filename: str):
-    subtitle_path = f"{TRANSLATION_OUTPUT}/{language}/{filename}"
-    if os.path.isfile(subtitle_path):
-        headers = {
-            "Content-Type": "text/vtt",  # Correct MIME type for WebVTT
-            "Cache-Control": "no-cache, no-store, must-revalidate",
-            "Pragma": "no-cache",
-            "Expires": "0",
-        }
-        return FileResponse(subtitle_path, headers=headers, media_type="text/vtt")
-    else:
-        raise HTTPException(status_code=404, detail="Subtitle file not found")
+async def get_translation_audio(request: Request, language: str, filename: str):
+    return serve_translation(DEFAULT_STREAM_ID, request, language, filename)
@@ -1,14 +1,26 @@
 # app/main.py
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from app.api.api_v1.api import api_router
+from app.services import live_stream_service, translation_service
 from fastapi.middleware.cors import CORSMiddleware
 from os import makedirs
 
 
-app = FastAPI()
+# Stream pipelines run on the server's event loop; on shutdown FFmpeg is stopped and the chunks already
+# read are published before the loop goes away, then the XL8 connections are closed
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await live_stream_service.stop_all_streams()
+    await translation_service.close_translator()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS middleware to allow access from different origins
 app.add_middleware(
@@ -28,6 +40,11 @@ app.mount("/static", StaticFiles(directory="app/static"), name="static")
 makedirs("app/media/chunks", exist_ok=True)
 app.mount("/media", StaticFiles(directory="app/media/chunks"), name="media")
 
+# Prometheus metrics of every stream: pipeline stage latencies, queue depths, backlog and API latencies
+@app.get("/metrics")
+async def metrics():
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 # Redirect root to the player page with an example .m3u8 URL (you can adjust this later)
 @app.get("/")
 async def main():
@@ -1,4 +1,20 @@
-from pydantic import BaseModel, HttpUrl
+from typing import Annotated
+from pydantic import BaseModel, Field, HttpUrl
+
+# Language code such as "vi" or "zh-Hant"; it names the subtitle directories and URLs of the language
+LanguageCode = Annotated[str, Field(pattern=r"^[a-z]{2,3}(-[A-Za-z0-9]{2,8})?$")]
 
 class LiveStreamRequest(BaseModel):
     stream_url: HttpUrl
+    stream_id: str | None = Field(default=None, pattern=r"^[A-Za-z0-9_-]{1,64}$")
+    # Subtitle languages of the stream, TARGET_LANGUAGES when not set
+    languages: list[LanguageCode] | None = Field(default=None, min_length=1, max_length=20)
+
+class LiveStreamResponse(BaseModel):
+    stream_id: str
+    stream_url: str
+    index_url: str
+    playlist_url: str
+    subtitle_urls: dict[str, str]
+    cue_urls: dict[str, str]
+    storage: dict
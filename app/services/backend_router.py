@@ -0,0 +1,249 @@
+# service/backend_router.py
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from app.services.metrics_service import observe_api_request
+
+# Latency samples needed before a backend's p95 is trusted as its hedging delay
+MIN_LATENCY_SAMPLES = 20
+
+
+class Backend:
+    """
+    A named backend (an STT or translation API, a local model, a stub) with its health statistics.
+
+    Tracks the latency of recent successful calls and the outcome of recent calls, and a circuit breaker
+    that opens after `failure_threshold` consecutive failures: the backend is skipped for `cooldown`
+    seconds, then a single trial call decides whether it closes again.
+
+    Args:
+        name (str): Name of the backend.
+        call (callable): Function doing the work; raises on failure.
+        failure_threshold (int): Consecutive failures that open the circuit.
+        cooldown (float): Seconds the circuit stays open before a trial call.
+        window (int): Number of recent calls the statistics are computed on.
+    """
+
+    def __init__(self, name: str, call, failure_threshold: int = 5, cooldown: float = 30.0, window: int = 100):
+        self.name = name
+        self.call = call
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def acquire(self):
+        """
+        Check whether a call may go to this backend now.
+
+        Returns:
+            str: "closed" for a healthy backend, "trial" for the single call allowed on a half-open
+                 circuit (to be given back with `release` if it is not made), or None.
+        """
+        with self.lock:
+            state = self.state
+            if state == "closed":
+                return "closed"
+            if state == "half-open" and not self.trial_running:
+                self.trial_running = True
+                return "trial"
+            return None
+
+    def release(self):
+        """Give back a half-open trial that was not used."""
+        with self.lock:
+            self.trial_running = False
+
+    def record(self, latency: float, success: bool):
+        with self.lock:
+            self.outcomes.append(success)
+            self.trial_running = False
+            if success:
+                self.latencies.append(latency)
+                self.consecutive_failures = 0
+                self.opened_at = None
+            else:
+                self.consecutive_failures += 1
+                # A failed trial re-opens the circuit right away
+                if self.opened_at is not None or self.consecutive_failures >= self.failure_threshold:
+                    if self.opened_at is None:
+                        print(f"Circuit of backend {self.name} opened after {self.consecutive_failures} failures")
+                    self.opened_at = time.monotonic()
+
+    def percentile(self, fraction: float):
+        """Latency percentile of the recent successful calls, or None without enough samples."""
+        with self.lock:
+            if len(self.latencies) < MIN_LATENCY_SAMPLES:
+                return None
+            latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+    def stats(self) -> dict:
+        with self.lock:
+            calls = len(self.outcomes)
+            errors = calls - sum(self.outcomes)
+        return {
+            "state": self.state,
+            "calls": calls,
+            "error_rate": errors / calls if calls else 0.0,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+        }
+
+
+class StubBackend:
+    """
+    Local stand-in for a backend in tests: returns `result` after a random latency, failing at `failure_rate`.
+
+    Args:
+        result: Value returned by every successful call (or a callable receiving the call arguments).
+        latency (tuple): (min, max) latency in seconds.
+        failure_rate (float): Probability of raising instead of returning.
+    """
+
+    def __init__(self, result, latency: tuple = (0.0, 0.0), failure_rate: float = 0.0):
+        self.result = result
+        self.latency = latency
+        self.failure_rate = failure_rate
+
+    def __call__(self, *args):
+        time.sleep(random.uniform(*self.latency))
+        if random.random() < self.failure_rate:
+            raise RuntimeError("Stub backend failure")
+        return self.result(*args) if callable(self.result) else self.result
+
+
+class BackendRouter:
+    """
+    Route calls over an ordered list of interchangeable backends.
+
+    The first backend whose circuit is closed is the primary. If it has not answered within its p95
+    latency (or `hedge_delay` until enough calls were measured), counted from when the call started
+    running rather than from when it was queued for a thread, a hedged duplicate goes to the next
+    backend and the first successful answer wins. A failure moves on to the next backend immediately, so
+    a backend that is down costs one failed call instead of a chain of retries.
+
+    Args:
+        name (str): Name of the router, used for logs and thread names.
+        backends (list): Backends in order of preference.
+        hedge_delay (float): Hedging delay used until a backend has enough latency samples.
+        max_workers (int): Number of calls in flight at the same time, across all requests (see `resize`).
+    """
+
+    def __init__(self, name: str, backends: list, hedge_delay: float, max_workers: int = 16):
+        self.name = name
+        self.backends = list(backends)
+        self.hedge_delay = hedge_delay
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self.lock = threading.Lock()
+
+    def resize(self, concurrent_requests: int):
+        """Size the thread pool for `concurrent_requests` requests at a time, each of which may go to every backend."""
+        max_workers = max(concurrent_requests, 1) * len(self.backends)
+        with self.lock:
+            if max_workers == self.max_workers:
+                return
+            previous, self.executor = self.executor, ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=self.name)
+            self.max_workers = max_workers
+        # Calls already running on the previous pool finish there
+        previous.shutdown(wait=False)
+
+    def replace(self, name: str, call):
+        """Swap the function of a backend, e.g. for a `StubBackend` in tests."""
+        for backend in self.backends:
+            if backend.name == name:
+                backend.call = call
+                return
+        raise KeyError(name)
+
+    def timed_call(self, backend: Backend, args: tuple, started: Future = None):
+        start = time.monotonic()
+        if started is not None:
+            started.set_result(start)
+        try:
+            result = backend.call(*args)
+        except Exception:
+            backend.record(time.monotonic() - start, success=False)
+            observe_api_request(self.name, backend.name, time.monotonic() - start, success=False)
+            raise
+        backend.record(time.monotonic() - start, success=True)
+        observe_api_request(self.name, backend.name, time.monotonic() - start, success=True)
+        return result
+
+    def call(self, *args):
+        """
+        Call the backends with `args` until one succeeds.
+
+        Raises:
+            RuntimeError: When every backend failed or was skipped.
+        """
+        # Backends with an open circuit are skipped; if every circuit is open, all of them get a chance
+        permits = [(backend, backend.acquire()) for backend in self.backends]
+        candidates = [backend for backend, permit in permits if permit] or list(self.backends)
+        trials = {backend for backend, permit in permits if permit == "trial"}
+        running = {}
+        errors = []
+
+        def launch():
+            backend = candidates.pop(0)
+            trials.discard(backend)
+            started = Future()
+            with self.lock:
+                running[self.executor.submit(self.timed_call, backend, args, started)] = backend
+            return backend, started
+
+        try:
+            latest, started = launch()
+            while running:
+                waiting = set(running)
+                timeout = None
+                if candidates:
+                    if started.done():
+                        # The next hedge waits for the usual worst case of the latest backend, from its start
+                        deadline = started.result() + (latest.percentile(0.95) or self.hedge_delay)
+                        timeout = max(deadline - time.monotonic(), 0)
+                    else:
+                        # A call waiting for a thread is not slow yet
+                        waiting.add(started)
+                done, _ = wait(waiting, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    # The calls in flight are slower than usual: hedge with the next backend
+                    print(f"{self.name}: hedging with backend {candidates[0].name}")
+                    latest, started = launch()
+                    continue
+
+                finished = done - {started}
+                for future in finished:
+                    backend = running.pop(future)
+                    try:
+                        return future.result()
+                    except Exception as e:
+                        print(f"{self.name}: backend {backend.name} failed: {e}")
+                        errors.append(f"{backend.name}: {e}")
+                # A failure falls over to the next backend right away
+                if finished and candidates:
+                    latest, started = launch()
+            raise RuntimeError(f"All {self.name} backends failed ({'; '.join(errors)})")
+        finally:
+            for backend in trials:
+                backend.release()
+
+    def stats(self) -> dict:
+        """Health statistics of every backend."""
+        return {backend.name: backend.stats() for backend in self.backends}
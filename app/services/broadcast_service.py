@@ -0,0 +1,147 @@
+# service/broadcast_service.py
+import asyncio
+import json
+import re
+
+# Number of recent cues kept per language for subscribers that reconnect or fall behind
+CUE_HISTORY = 256
+
+VTT_TIMING = re.compile(r"^(\d+):(\d{2}):(\d{2}(?:\.\d+)?) --> (\d+):(\d{2}):(\d{2}(?:\.\d+)?)")
+
+
+# Parse the cues of a WebVTT file into {"start", "end", "text"} dicts with times in seconds
+def parse_vtt_cues(content: str) -> list:
+    cues = []
+    for block in content.split("\n\n"):
+        lines = block.strip().splitlines()
+        for i, line in enumerate(lines):
+            match = VTT_TIMING.match(line)
+            if match:
+                hours, minutes, seconds, end_hours, end_minutes, end_seconds = match.groups()
+                cues.append({
+                    "start": int(hours) * 3600 + int(minutes) * 60 + float(seconds),
+                    "end": int(end_hours) * 3600 + int(end_minutes) * 60 + float(end_seconds),
+                    "text": "\n".join(lines[i + 1:]),
+                })
+                break
+    return cues
+
+
+# Read the cues of a WebVTT file
+def read_vtt_cues(subtitle_file: str) -> list:
+    with open(subtitle_file, "r", encoding="utf-8") as file:
+        return parse_vtt_cues(file.read())
+
+
+class CueChannel:
+    """
+    Fan-out of the finalized subtitle cues of one language to every subscriber.
+
+    Published cues are encoded to JSON once and appended to a shared log under increasing IDs; the
+    producer then wakes all subscribers with a single event. Each subscriber keeps its own position in
+    the log and sends the encoded messages as they are, so a cue costs one encoding in total and a
+    lookup and a send per subscriber. A slow subscriber never holds up the producer or the others: it
+    only falls behind in the log, and skips ahead to the oldest cue still kept if it falls out of it.
+
+    Cue IDs are `<run_id>-<number>`. Numbers start over when a stream is restarted, so an ID from
+    another run says nothing about the cues of this one and is ignored.
+
+    Args:
+        run_id (str): ID of the stream run the cues belong to.
+        history (int): Number of recent cues kept for subscribers that reconnect or fall behind.
+    """
+
+    def __init__(self, run_id: str, history: int = CUE_HISTORY):
+        self.run_id = run_id
+        self.history = history
+        self.messages = {}
+        self.first_id = 0
+        self.next_id = 0
+        self.subscribers = 0
+        self.closed = False
+        self.changed = asyncio.Event()
+
+    def publish(self, cue: dict):
+        """Append a cue to the log and wake the subscribers."""
+        self.messages[self.next_id] = json.dumps({"id": self.event_id(self.next_id), **cue}, ensure_ascii=False)
+        self.next_id += 1
+        while self.next_id - self.first_id > self.history:
+            del self.messages[self.first_id]
+            self.first_id += 1
+        self.notify()
+
+    def event_id(self, number: int) -> str:
+        return f"{self.run_id}-{number}"
+
+    def parse_event_id(self, event_id: str):
+        """Return the number of a cue ID of this run, or None for an ID of another run or a malformed one."""
+        run_id, _, number = (event_id or "").rpartition("-")
+        if run_id != self.run_id or not number.isdigit():
+            return None
+        return int(number)
+
+    def close(self):
+        """End every subscription once it has sent the cues already published."""
+        self.closed = True
+        self.notify()
+
+    def notify(self):
+        # Waiters hold the previous event, so a cue published while they send is never missed
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    async def subscribe(self, last_id: str = None, keepalive: float = None):
+        """
+        Yield `(id, message)` for every cue published after the cue `last_id` (only new cues when None or
+        an ID of another run), until the channel is closed. With `keepalive`, `None` is yielded after that
+        many seconds without a cue.
+        """
+        last_number = self.parse_event_id(last_id)
+        cursor = self.next_id if last_number is None else last_number + 1
+        self.subscribers += 1
+        try:
+            while True:
+                changed = self.changed
+                cursor = max(cursor, self.first_id)
+                while cursor < self.next_id:
+                    yield self.event_id(cursor), self.messages[cursor]
+                    cursor = max(cursor + 1, self.first_id)
+                if self.closed:
+                    return
+                try:
+                    await asyncio.wait_for(changed.wait(), keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self.subscribers -= 1
+
+
+class SubtitleBroadcaster:
+    """
+    Cue channels of a stream, one per target language.
+
+    Args:
+        languages (iterable): Language codes of the stream's subtitles.
+        run_id (str): ID of the stream run, the prefix of the cue IDs.
+    """
+
+    def __init__(self, languages, run_id: str):
+        self.channels = {language: CueChannel(run_id) for language in languages}
+
+    def channel(self, language: str) -> CueChannel:
+        return self.channels.get(language)
+
+    # Publish the cues of a translated subtitle file to the subscribers of its language; the file is read
+    # on a worker thread
+    async def publish_file(self, language: str, subtitle_file: str, sequence: int) -> int:
+        cues = await asyncio.to_thread(read_vtt_cues, subtitle_file)
+        for cue in cues:
+            self.channels[language].publish({"language": language, "chunk": sequence, **cue})
+        return len(cues)
+
+    def close(self):
+        for channel in self.channels.values():
+            channel.close()
+
+    def stats(self) -> dict:
+        return {language: channel.subscribers for language, channel in self.channels.items()}
@@ -0,0 +1,120 @@
+# service/cache_service.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from app.services.metrics_service import CONTENT_CACHE_LOOKUPS
+from app.variables import CONTENT_CACHE_PATH, CONTENT_CACHE_SIZE_MB
+
+
+# Hash of a piece of content (raw PCM samples, or the fields of a translation request)
+def content_hash(*parts) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode() if isinstance(part, str) else part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ContentCache:
+    """
+    Persistent SQLite cache of transcripts and translations, keyed by a hash of their input.
+
+    Replayed audio (a restarted stream, ads, jingles) is transcribed once, and a Korean sentence is
+    translated into a language once; later lookups are a single indexed read instead of a paid API call.
+    Entries are JSON values in a namespace ("transcript", "translation"). The least recently used ones
+    are evicted once the total size exceeds `max_bytes`. Hits and misses are counted per namespace and
+    exported as `content_cache_lookups_total`.
+
+    Args:
+        path (str): Path of the SQLite database.
+        max_bytes (int): Total size of the cached values; 0 disables the cache.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+        self.size = 0
+        self.connection = None
+        if max_bytes:
+            self.open()
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "accessed REAL NOT NULL, PRIMARY KEY (namespace, key))"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        self.size = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def get(self, namespace: str, key: str):
+        """Return the cached value, or None."""
+        if self.connection is None:
+            return None
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            if row is None:
+                self.misses[namespace] = self.misses.get(namespace, 0) + 1
+                CONTENT_CACHE_LOOKUPS.labels(namespace, "miss").inc()
+                return None
+            self.hits[namespace] = self.hits.get(namespace, 0) + 1
+            CONTENT_CACHE_LOOKUPS.labels(namespace, "hit").inc()
+            self.connection.execute(
+                "UPDATE entries SET accessed = ? WHERE namespace = ? AND key = ?", (time.time(), namespace, key)
+            )
+        return json.loads(row[0])
+
+    def set(self, namespace: str, key: str, value):
+        """Store a value, evicting the least recently used entries."""
+        if self.connection is None:
+            return
+        content = json.dumps(value, ensure_ascii=False)
+        size = len(content.encode())
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            previous = self.connection.execute(
+                "SELECT size FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            self.connection.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, size, accessed) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, content, size, time.time()),
+            )
+            self.size += size - (previous[0] if previous else 0)
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        """Delete the least recently used entries until the cache is 10% under its limit; the caller holds the lock."""
+        target = self.max_bytes * 0.9
+        rows = self.connection.execute("SELECT namespace, key, size FROM entries ORDER BY accessed")
+        evicted = []
+        for namespace, key, size in rows:
+            if self.size <= target:
+                break
+            evicted.append((namespace, key))
+            self.size -= size
+        rows.close()
+        self.connection.executemany("DELETE FROM entries WHERE namespace = ? AND key = ?", evicted)
+
+    def stats(self) -> dict:
+        """Return the hit and miss counters per namespace and the cache size."""
+        with self.lock:
+            return {"hits": dict(self.hits), "misses": dict(self.misses), "size_bytes": self.size}
+
+
+content_cache = ContentCache(CONTENT_CACHE_PATH, CONTENT_CACHE_SIZE_MB * 1024 * 1024)
@@ -0,0 +1,202 @@
+# service/ingest_service.py
+import asyncio
+import os
+from collections import deque
+from typing import NamedTuple
+
+from app.services.llhls_service import CmafSegmenter
+from app.services.pcm_buffer import PcmRingBuffer, read_pcm_chunks
+from app.services.vad_service import read_speech_segments
+
+
+class AudioFile(NamedTuple):
+    """A closed audio segment file and its span in the stream, as reported by the segment muxer."""
+
+    path: str     # Path of the WAV file
+    start: float  # Stream time of the first sample, in seconds
+    end: float    # Stream time after the last sample, in seconds
+
+
+# Keep reading the FFmpeg log so a full stderr pipe never blocks the process
+async def drain_stderr(stream: asyncio.StreamReader, tail: deque):
+    async for line in stream:
+        tail.append(line.decode(errors="replace"))
+
+
+# Stop an FFmpeg process, killing it if it does not exit within `timeout` seconds
+async def terminate_process(process: asyncio.subprocess.Process, timeout: float = 5):
+    if process.returncode is not None:
+        return
+    try:
+        process.terminate()
+        await asyncio.wait_for(process.wait(), timeout)
+    except ProcessLookupError:
+        pass
+    except asyncio.TimeoutError:
+        print(f"FFmpeg process {process.pid} did not exit, killing it")
+        process.kill()
+        await process.wait()
+
+
+# Wrap the read end of a pipe in a StreamReader
+async def open_pipe_reader(fd: int) -> asyncio.StreamReader:
+    reader = asyncio.StreamReader(limit=1024 * 1024)
+    await asyncio.get_running_loop().connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(fd, "rb", buffering=0)
+    )
+    return reader
+
+
+async def segment_stream(
+    stream_url: str,
+    chunk_duration: int,
+    video_dir: str,
+    audio_dir: str,
+    on_segment_closed=None,
+    on_started=None,
+    pcm_buffer: PcmRingBuffer = None,
+    vad: bool = False,
+    video_segmenter: CmafSegmenter = None,
+    part_duration: float = 0.5,
+    audio_interval: float = None,
+):
+    """
+    Segment the video for HLS and the audio for STT with a single FFmpeg process.
+
+    The source is pulled and demuxed once and written to two outputs: the stream-copied HLS video
+    segments (`video_N.ts`) and 16 kHz mono PCM WAV segments (`audio_N.wav`). Both outputs are cut
+    every `chunk_duration` seconds on the same input timestamps, so segment N of each covers the same
+    span of the stream (video cuts snap to the next keyframe, so they match exactly when the source
+    keyframe interval divides the chunk duration).
+
+    With a `pcm_buffer`, the audio is written as raw PCM to stdout instead of WAV files. It is read into
+    the ring buffer and every `chunk_duration` seconds an `AudioChunk` viewing it is published instead
+    of a file path. With `vad`, silence is skipped and the chunks are variable-length speech segments
+    cut at pauses instead. With `audio_interval` (streaming STT), the piped audio is published in
+    chunks of that many seconds while the video is still cut every `chunk_duration` seconds.
+
+    With a `video_segmenter` (LL-HLS), the video is written as fragmented MP4 to an extra pipe instead,
+    one fragment per `part_duration` and at every keyframe, and cut into parts and segments by the
+    segmenter as it is read.
+
+    Args:
+        stream_url (str): Input URL of the stream.
+        chunk_duration (int): Duration of each segment in seconds.
+        video_dir (str): Directory of the video segments.
+        audio_dir (str): Directory of the audio segments.
+        on_segment_closed (callable): Coroutine function awaited with every closed audio segment; the
+                                      next segment is not read until it returns, which applies backpressure.
+        on_started (callable): Called with the FFmpeg process once it is running.
+        pcm_buffer (PcmRingBuffer): Ring buffer receiving the audio in pipe mode.
+        vad (bool): Cut the piped audio into speech segments with voice activity detection.
+        video_segmenter (CmafSegmenter): Segmenter receiving the fMP4 video in LL-HLS mode.
+        part_duration (float): Target duration of the LL-HLS parts in seconds.
+        audio_interval (float): Duration of the published PCM chunks in pipe mode, if not `chunk_duration`.
+
+    Returns:
+        int: Exit code of FFmpeg. Cancelling the task terminates FFmpeg (and kills it if it hangs).
+    """
+    os.makedirs(video_dir, exist_ok=True)
+    os.makedirs(audio_dir, exist_ok=True)
+
+    command = [
+        "ffmpeg",
+        "-i", stream_url,                      # Input URL of the video stream, demuxed once for both outputs
+
+        # Output 1: HLS video segments
+        "-map", "0:v:0",                       # Select the first video stream
+        "-map", "0:a:0?",                      # Keep the first audio stream in the video segments if there is one
+        "-c:v", "copy",                        # Copy the video codec without re-encoding
+        "-c:a", "copy",                        # Copy the audio codec without re-encoding
+    ]
+    video_read_fd = video_write_fd = None
+    if video_segmenter is not None:
+        video_read_fd, video_write_fd = os.pipe()
+        command += [
+            "-f", "mp4",                       # Fragmented MP4 (CMAF) for LL-HLS parts
+            "-movflags", "empty_moov+default_base_moof+frag_keyframe",  # Init segment first, a new fragment at every keyframe
+            # Fragments end on the first frame past the duration, so aim a bit lower to stay within the part target
+            "-frag_duration", str(int(part_duration * 0.9 * 1_000_000)),
+            f"pipe:{video_write_fd}",
+        ]
+    else:
+        command += [
+            "-f", "hls",                           # Specify the output format as HLS
+            "-hls_time", str(chunk_duration),      # Duration of each HLS segment in seconds
+            "-hls_list_size", "5",                 # FFmpeg's own playlist is not served, keep it short (segment files are not deleted)
+            "-hls_flags", "temp_file",             # Write segments to a temp file and rename once closed
+            "-hls_segment_filename", os.path.join(video_dir, "video_%d.ts"),
+            os.path.join(video_dir, "source.m3u8"),
+        ]
+
+    command += [
+        # Output 2: PCM audio for STT
+        "-map", "0:a:0",                       # Select the first audio stream
+        "-c:a", "pcm_s16le",                   # Set audio codec to uncompressed PCM (WAV format)
+        "-ar", "16000",                        # Set audio sample rate to 16 kHz (common for STT)
+        "-ac", "1",                            # Set audio channels to mono (single channel for STT)
+        "-af", "aresample=async=1",            # Fill or trim timestamp gaps so sample counts follow stream time
+    ]
+    if pcm_buffer is not None:
+        command += [
+            "-f", "s16le",                     # Raw samples without a container
+            "pipe:1",                          # Stream them on stdout
+        ]
+    else:
+        command += [
+            "-f", "segment",                       # Use the segment muxer to split the audio
+            "-segment_time", str(chunk_duration),  # Duration of each audio segment in seconds
+            "-segment_list", "pipe:1",             # Report every closed segment on stdout
+            "-segment_list_type", "csv",           # One "filename,start,end" line per segment
+            "-reset_timestamps", "1",              # Reset timestamps for each new segment
+            os.path.join(audio_dir, "audio_%d.wav"),
+        ]
+
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        pass_fds=(video_write_fd,) if video_write_fd is not None else (),
+    )
+    stderr_tail = deque(maxlen=50)
+    stderr_task = asyncio.create_task(drain_stderr(process.stderr, stderr_tail))
+    video_task = None
+    if video_segmenter is not None:
+        os.close(video_write_fd)
+        video_task = asyncio.create_task(video_segmenter.run(await open_pipe_reader(video_read_fd)))
+    if on_started:
+        on_started(process)
+    print(f"Stream segmentation started from streaming input URL {stream_url}")
+
+    try:
+        if pcm_buffer is not None:
+            # Publish every chunk of audio as soon as it has been read
+            read_chunks = read_speech_segments if vad else read_pcm_chunks
+            async for chunk in read_chunks(process.stdout, pcm_buffer, audio_interval or chunk_duration):
+                print(f"Audio chunk {chunk.index} read at {chunk.start:.2f}s ({len(chunk.samples) / pcm_buffer.sample_rate:.2f}s)")
+                if on_segment_closed:
+                    await on_segment_closed(chunk)
+        else:
+            # Publish a "segment closed" event with the segment times for every line of the audio segment list
+            async for line in process.stdout:
+                fields = line.decode().strip().split(",")
+                if len(fields) < 3 or not fields[0]:
+                    continue
+                file_path = os.path.join(audio_dir, os.path.basename(fields[0]))
+                print(f"Audio segment closed: {file_path}")
+                if on_segment_closed:
+                    await on_segment_closed(AudioFile(file_path, float(fields[1]), float(fields[2])))
+
+        # Wait for the FFmpeg process to complete and report errors
+        await process.wait()
+        await stderr_task
+        if video_task is not None:
+            await video_task
+        if process.returncode != 0:
+            print(f"FFmpeg stream segmentation error: {''.join(stderr_tail)}")
+        return process.returncode
+    finally:
+        await terminate_process(process)
+        stderr_task.cancel()
+        if video_task is not None:
+            video_task.cancel()
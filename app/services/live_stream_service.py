@@ -1,163 +1,781 @@
 # service/live_stream_service.py
+import asyncio
+import functools
+import math
 import os
+import re
 import shutil
-import glob
-import time
+import threading
+import uuid
 from concurrent.futures import ThreadPoolExecutor
-from app.services.stt_service import transcribe_audio
-from app.services.video_service import segment_video  # Import video segmentation
-from app.services.audio_service import segment_audio
+from app.services.stt_service import transcribe_audio, transcribe_pcm, save_transcript, stt_router
+from app.services.ingest_service import segment_stream  # Import the combined video and audio segmentation
 from app.services.translation_service import translate_file  # Import translation function
-from app.variables import AUDIO_OUTPUT, LIVESTREAM_OUTPUT, MEDIA_DIR, THAI_WEBVTT_FILE, VIDEO_OUTPUT, PLAYLIST_OUTPUT, PLAYLIST_FILE, CHUNK_DURATION, SUBTITLE_OUTPUT, TRANSLATION_OUTPUT, VIET_WEBVTT_FILE
-
-# Set up an executor for background tasks
-executor = ThreadPoolExecutor(max_workers=5)  # Allow both video and audio tasks
-
-# Automatically create the media directories if they don't exist
-def setup_media_directories():
-    os.makedirs(VIDEO_OUTPUT, exist_ok=True)
-    os.makedirs(PLAYLIST_OUTPUT, exist_ok=True)
-    os.makedirs(AUDIO_OUTPUT, exist_ok=True)
-    os.makedirs(SUBTITLE_OUTPUT, exist_ok=True)
-    os.makedirs(TRANSLATION_OUTPUT, exist_ok=True)
-
-    
-# Create index files and translation file
-def setup_output_files():
-    # index output
-    langs = {"vi": "Vietnamese", "th": "Thai"}
-    with open(LIVESTREAM_OUTPUT, "w") as f:
-        m3u8_content = "#EXTM3U\n"
-        m3u8_content += "#EXT-X-VERSION:3\n"
-        
-        for key in langs:
-            m3u8_content += f'#EXT-X-MEDIA:TYPE=SUBTITLES,GROUP-ID="subs",NAME="{langs[key]}",FORCED=NO,AUTOSELECT=YES,URI="/api/v1/streaming/subtitles/{key}",LANGUAGE="{key}"\n'
-        
-        m3u8_content += '\n#EXT-X-STREAM-INF:SUBTITLES="subs"\n/api/v1/streaming/playlist.m3u8'
-        f.write(m3u8_content)
-    
-    print("Finished writing the master output file.")
-
-    # create two blank translation file
-    with open(THAI_WEBVTT_FILE, 'w') as f:
-        pass
-    with open(VIET_WEBVTT_FILE, 'w') as f:
-        pass
-
-# Function to update the m3u8 playlist file dynamically
-def update_m3u8_playlist():
-    try:
-        chunk_files = sorted(glob.glob(f"{VIDEO_OUTPUT}/video_*.ts"), key=os.path.getctime)
-        if not chunk_files:
-            print("No video chunks found to create m3u8 file.")
-            return
+from app.services.llhls_service import CmafSegmenter, INIT_SEGMENT_FILE
+from app.services.playlist_service import HLSPlaylist, LowLatencyPlaylist, MasterPlaylist
+from app.services.metrics_service import StreamMetrics
+from app.services.broadcast_service import SubtitleBroadcaster
+from app.services.cache_service import content_cache
+from app.services.retention_service import RetentionManager
+from app.services.pcm_buffer import AudioChunk, PcmRingBuffer, pcm_to_wav, SAMPLE_RATE
+from app.services.vad_service import FRAME_DURATION
+from app.services.streaming_stt_service import StreamingTranscriber
+from app.services.stitching_service import SentenceStitcher, transcript_segments
+from app.services.segment_service import segment_cache
+from app.services.watcher_service import watch_segments, segment_index
+from app.services.whisper_engine import get_whisper_engine
+from app.workers.background_tasks import OrderedStage
+from app.variables import (
+    MEDIA_DIR,
+    PLAYLIST_WINDOW_SIZE,
+    RETENTION_SECONDS,
+    CHUNK_DURATION,
+    LL_HLS,
+    LL_HLS_PART_DURATION,
+    LL_HLS_KEYFRAME_INTERVAL,
+    STT_CONCURRENCY,
+    TRANSLATION_CONCURRENCY,
+    AUDIO_PIPE,
+    PERSIST_AUDIO,
+    PCM_BUFFER_SECONDS,
+    STT_BACKENDS,
+    STT_TIMEOUT,
+    SHUTDOWN_TIMEOUT,
+    VAD_ENABLED,
+    STREAMING_STT,
+    STREAMING_STT_INTERVAL,
+    STREAMING_STT_STABILITY,
+    STREAMING_STT_MAX_WINDOW,
+    STITCH_MAX_HOLD,
+    TARGET_LANGUAGES,
+)
+
+# Empty WebVTT segment listed in the subtitle playlists for stretches without subtitles
+EMPTY_SUBTITLE_FILE = "empty.vtt"
+
+# Names of the published segment files; FFmpeg's own playlist and the files still being written are not served
+CHUNK_FILE_PATTERN = re.compile(rf"video_\d+\.(?:ts|m4s)|{re.escape(INIT_SEGMENT_FILE)}")
+SUBTITLE_FILE_PATTERN = re.compile(rf"(?:audio|stitched)_\d+\.vtt|{re.escape(EMPTY_SUBTITLE_FILE)}")
+
+# Display names of common subtitle languages in the master playlist; other codes are shown as they are
+LANGUAGE_NAMES = {
+    "vi": "Vietnamese",
+    "th": "Thai",
+    "en": "English",
+    "ko": "Korean",
+    "ja": "Japanese",
+    "zh": "Chinese",
+    "id": "Indonesian",
+    "ms": "Malay",
+    "tl": "Filipino",
+    "es": "Spanish",
+    "fr": "French",
+    "de": "German",
+}
+
+# Stream served by the original single-stream endpoints
+DEFAULT_STREAM_ID = "default"
+API_PREFIX = "/api/v1/streaming"
+
+
+class LiveStream:
+    """
+    Processing pipeline of a single input stream.
+
+    Each stream has its own directory namespace under `MEDIA_DIR/streams/<stream_id>`, its own playlists
+    and its own FFmpeg process and workers, so it can be stopped and cleaned up without affecting others.
+
+    The pipeline runs as asyncio tasks on the server's event loop. Chunks flow through bounded queues
+    between the stages: segment (FFmpeg) -> STT -> translation -> publish. When a stage falls behind its
+    input queue fills up and the stages before it wait, down to FFmpeg's stdout. Blocking STT and
+    translation calls run on a thread pool of the stream sized for the concurrency of all stages.
+
+    Every target language has its own translation stage and publisher, fed by a task that hands each
+    transcript to all of them, so the subtitles of one language never wait for another language. A
+    language that keeps falling behind fills its input queue and eventually holds up the others.
+
+    With streaming STT the STT stage is replaced by a single task that re-transcribes a sliding window of
+    the piped audio as it is read and queues each finalized stretch of speech for translation.
+
+    With sentence stitching, a task between STT and translation moves the unfinished last sentence of
+    every transcript to the next one, so sentences cut by a chunk boundary are translated whole.
+
+    Args:
+        stream_id (str): Identifier of the stream.
+        stream_url (str): Input URL of the stream.
+        url_prefix (str): URL prefix of the stream's playlists; its chunks and subtitles are served under
+                          `<url_prefix>/runs/<run_id>`, so their URLs are never reused by a restarted stream.
+        languages (list): Codes of the subtitle languages (default: TARGET_LANGUAGES).
+    """
+
+    def __init__(self, stream_id: str, stream_url: str, url_prefix: str, languages: list = None):
+        self.stream_id = stream_id
+        self.stream_url = stream_url
+        self.url_prefix = url_prefix
+        # Segment URLs are unique to this run of the stream, so they can be cached as immutable
+        self.run_id = uuid.uuid4().hex[:8]
+        self.media_prefix = f"{url_prefix}/runs/{self.run_id}"
+        self.languages = {code: LANGUAGE_NAMES.get(code, code) for code in languages or TARGET_LANGUAGES}
+
+        # Media directories of this stream
+        self.base_dir = os.path.join(MEDIA_DIR, "streams", stream_id)
+        self.video_dir = os.path.join(self.base_dir, "chunks")
+        self.audio_dir = os.path.join(self.base_dir, "audio")
+        self.subtitle_dir = os.path.join(self.base_dir, "subtitles")
+        self.translation_dir = os.path.join(self.base_dir, "translations")
+        self.playlist_dir = os.path.join(self.base_dir, "playlists")
+
+        # In-memory playlists, created when the stream starts
+        self.master_playlist = None
+        self.video_playlist = None
+        self.subtitle_playlists = {}
+        # Finalized cues pushed to WebSocket and SSE subscribers, per language
+        self.broadcaster = None
+
+        # Files of the stream on disk, deleted once they fall out of the retention window
+        self.retention = None
+        # Timing spans of the chunks and queue depths, created when the stream starts
+        self.metrics = None
+
+        # Stream time (start, end) of every audio segment until its subtitles are published, and the
+        # end of the time covered by each subtitle playlist so far
+        self.segment_spans = {}
+        self.subtitle_ends = {}
+        # Speech segments from voice activity detection are up to 1.5 chunks long, finalized streaming
+        # transcripts up to the streaming window
+        self.streaming = STREAMING_STT and AUDIO_PIPE
+        self.vad = VAD_ENABLED and AUDIO_PIPE and not self.streaming
+        if self.streaming:
+            self.subtitle_target_duration = math.ceil(STREAMING_STT_MAX_WINDOW)
+        elif self.vad:
+            self.subtitle_target_duration = math.ceil(CHUNK_DURATION * 1.5 + FRAME_DURATION)
+        else:
+            self.subtitle_target_duration = CHUNK_DURATION
+
+        # Queues between the pipeline stages, created on the event loop when the stream starts:
+        # (sequence, audio segment) -> STT -> (sequence, transcript file) -> [stitching -> (sequence, stitched
+        # transcript file)] -> per language: translation -> (sequence, subtitle file)
+        self.audio_segments = None
+        self.transcripts = None
+        self.stitched = None
+        self.translation_inputs = {}
+        self.translations = {}
+        # Number of languages each chunk still has to be published in
+        self.unpublished = {}
+        self.pcm_buffer = None
+        # LL-HLS: the fMP4 video is cut into parts and segments as FFmpeg writes it; a segment ends on the
+        # first keyframe after CHUNK_DURATION, so it can be up to a keyframe interval longer
+        self.video_segmenter = None
+        self.video_target_duration = math.ceil(CHUNK_DURATION + LL_HLS_KEYFRAME_INTERVAL)
+        self.video_end = 0.0
+        # Streaming STT: the transcriber, an event set when more audio has been read or the audio ended,
+        # and the latest interim hypothesis ({"start", "text"}), which may still change
+        self.transcriber = None
+        self.audio_ready = None
+        self.audio_closed = False
+        self.interim = None
+        self.streaming_task = None
+        # Sentence stitching: the stitcher and the task that marks the end of the transcripts for it
+        self.stitcher = SentenceStitcher(STITCH_MAX_HOLD) if STITCH_MAX_HOLD > 0 else None
+        self.closing_task = None
+
+        self.executor = None
+        self.stt_stage = None
+        self.translation_stages = {}
+        self.process = None
+        self.ingest_task = None
+        self.video_task = None
+        self.tasks = []
+        self.stop_event = None
+
+    # Automatically create the media directories of the stream
+    def setup_media_directories(self):
+        # remove the files of a previous run of this stream before proceeding with other steps
+        if os.path.exists(self.base_dir):
+            shutil.rmtree(self.base_dir)
 
-        media_sequence = int(os.path.splitext(os.path.basename(chunk_files[0]))[0].split('_')[1])
+        os.makedirs(self.video_dir, exist_ok=True)
+        os.makedirs(self.playlist_dir, exist_ok=True)
+        os.makedirs(self.audio_dir, exist_ok=True)
+        os.makedirs(self.subtitle_dir, exist_ok=True)
+        os.makedirs(self.translation_dir, exist_ok=True)
 
-        m3u8_content = "#EXTM3U\n"
-        m3u8_content += "#EXT-X-PLAYLIST-TYPE:LIVE\n"
-        m3u8_content += f"#EXT-X-TARGETDURATION:{CHUNK_DURATION}\n"
-        m3u8_content += f"#EXT-X-MEDIA-SEQUENCE:{media_sequence}\n\n"
+    # Create the master, video and subtitle playlists
+    def setup_output_files(self):
+        # index output
+        self.master_playlist = MasterPlaylist(
+            os.path.join(self.playlist_dir, "index.m3u8"),
+            self.languages,
+            video_uri=f"{self.url_prefix}/playlist.m3u8",
+            subtitle_uri=f"{self.url_prefix}/subtitles/{{language}}",
+        )
+        self.master_playlist.write()
 
-        for chunk_file in chunk_files:
+        print(f"Finished writing the master output file of stream {self.stream_id}.")
+
+        if LL_HLS:
+            self.video_playlist = LowLatencyPlaylist(
+                os.path.join(self.playlist_dir, "playlist.m3u8"),
+                self.video_target_duration,
+                LL_HLS_PART_DURATION,
+                f"{self.media_prefix}/chunks/{INIT_SEGMENT_FILE}",
+                window_size=PLAYLIST_WINDOW_SIZE,
+                window_duration=RETENTION_SECONDS,
+            )
+        else:
+            self.video_playlist = HLSPlaylist(
+                os.path.join(self.playlist_dir, "playlist.m3u8"),
+                CHUNK_DURATION,
+                window_size=PLAYLIST_WINDOW_SIZE,
+                playlist_type="LIVE",
+                window_duration=RETENTION_SECONDS,
+            )
+        self.video_playlist.write()
+
+        self.subtitle_playlists = {}
+        self.broadcaster = SubtitleBroadcaster(self.languages, self.run_id)
+        for language in self.languages:
+            self.subtitle_playlists[language] = HLSPlaylist(
+                os.path.join(self.playlist_dir, f"{language}_sub.m3u8"),
+                self.subtitle_target_duration,
+                window_size=PLAYLIST_WINDOW_SIZE,
+                playlist_type="VOD",
+                window_duration=RETENTION_SECONDS,
+            )
+            self.subtitle_playlists[language].write()
+            self.subtitle_ends[language] = 0.0
+
+            os.makedirs(os.path.join(self.translation_dir, language), exist_ok=True)
+            with open(os.path.join(self.translation_dir, language, EMPTY_SUBTITLE_FILE), "w", encoding="utf-8") as file:
+                file.write("WEBVTT\n\n")
+
+    # Create the queues and the transcription and translation stages of the pipeline
+    def setup_pipeline(self):
+        # In pipe mode the queued audio segments are views into the PCM ring buffer, so at most one waits
+        self.audio_segments = asyncio.Queue(maxsize=1 if AUDIO_PIPE else STT_CONCURRENCY)
+        self.transcripts = asyncio.Queue(maxsize=TRANSLATION_CONCURRENCY)
+        # Without stitching the transcripts go straight to translation
+        self.stitched = asyncio.Queue(maxsize=TRANSLATION_CONCURRENCY) if self.stitcher else self.transcripts
+        self.stt_stage = OrderedStage(
+            f"{self.stream_id}-stt", self.transcribe, self.audio_segments, self.transcripts, STT_CONCURRENCY
+        )
+        for language in self.languages:
+            self.translation_inputs[language] = asyncio.Queue(maxsize=TRANSLATION_CONCURRENCY)
+            self.translations[language] = asyncio.Queue(maxsize=TRANSLATION_CONCURRENCY)
+            self.translation_stages[language] = OrderedStage(
+                f"{self.stream_id}-translation-{language}",
+                functools.partial(self.translate, language),
+                self.translation_inputs[language],
+                self.translations[language],
+                TRANSLATION_CONCURRENCY,
+            )
+        # Translation awaits the XL8 client on the event loop, only the blocking STT calls need threads
+        self.executor = ThreadPoolExecutor(max_workers=STT_CONCURRENCY, thread_name_prefix=self.stream_id)
+
+    # Function to append a new video chunk ending at stream time `end` to the m3u8 playlist
+    def update_m3u8_playlist(self, chunk_file: str, duration: float = CHUNK_DURATION, end: float = None):
+        try:
             chunk_filename = os.path.basename(chunk_file)
-            m3u8_content += f'#EXTINF:{CHUNK_DURATION}\n/api/v1/streaming/chunks/{chunk_filename}\n'
-
-        with open(PLAYLIST_FILE, "w") as f:
-            f.write(m3u8_content)
-        print(f"Updated m3u8 file with {len(chunk_files)} chunks.")
-        
-
-    except Exception as e:
-        print(f"Error updating m3u8 file: {e}")
-
-# Continuously monitors and processes new video files, updating the .m3u8 file
-def process_video_files():
-    processed_files = set()
-    while True:
-        files = sorted(glob.glob(f"{VIDEO_OUTPUT}/video_*.ts"), key=os.path.getctime)
-        new_files = [file for file in files if file not in processed_files]
-        if new_files:
-            for file in new_files:
-                processed_files.add(file)
-                print(f"New chunk detected: {file}")
-            update_m3u8_playlist()
-        time.sleep(1)
-
-
-# Monitors and processes audio files, call the translation and update the .m3u8 file
-def process_audio_files():
-    def is_file_stable(file_path, wait_time=6):
-        initial_size = os.path.getsize(file_path)
-        time.sleep(wait_time)
-        final_size = os.path.getsize(file_path)
-        return initial_size == final_size
-    
-    processed_files = set()
-  
-    while True:
-        files = sorted(glob.glob(f"{AUDIO_OUTPUT}/audio_*.wav"), key=os.path.getctime) # make sure they should order the videos by time
-        new_files = [file for file in files if file not in processed_files]
-        if new_files:
-            for file in new_files:
-                if is_file_stable(file):
-                    processed_files.add(file)
-                    print(f"New audio file detected: {file}")
-                    # transcribe something
-                    transcribe_audio(file)
-
-        time.sleep(1)
-
-# Monitors and processes subtitle files, call the translation service, and update the translation .m3u8 file
-def process_translation_files():
-    def is_file_stable(file_path, wait_time=4):
-        initial_size = os.path.getsize(file_path)
-        time.sleep(wait_time)
-        final_size = os.path.getsize(file_path)
-        return initial_size == final_size and initial_size > 0
-
-    processed_files = set()
-    while True:
-        files = sorted(glob.glob(f"{SUBTITLE_OUTPUT}/audio_*.txt"), key=os.path.getctime)
-        new_files = [file for file in files if file not in processed_files]
-        if new_files:
-            for file in new_files:
-                if is_file_stable(file):
-                    processed_files.add(file)
-                    print(f"New subtitle file detected: {file}")
-                    translate_file(file)
+            segment_cache.add_file(chunk_file)
+            self.video_playlist.add_segment(f"{self.media_prefix}/chunks/{chunk_filename}", duration)
+            print(f"Updated m3u8 file of stream {self.stream_id} with chunk {chunk_filename}.")
+
+            # The latest video segment is the stream clock of the retention window
+            if end is None:
+                end = (segment_index(chunk_file) + 1) * CHUNK_DURATION
+            self.retention.register("video", end, [chunk_file])
+            deleted = self.retention.collect(end)
+            if deleted:
+                print(f"Deleted {deleted} expired files of stream {self.stream_id}.")
+
+        except Exception as e:
+            print(f"Error updating m3u8 file: {e}")
+
+    # Append a translated subtitle chunk covering stream time up to `end` to the .m3u8 playlist of its language
+    def generate_subtitle_playlist(self, language: str, subtitle_file: str, start: float, end: float):
+        filename = os.path.basename(subtitle_file)
+        segment_cache.add_file(subtitle_file)
+        playlist = self.subtitle_playlists[language]
+
+        # Skipped silence and chunks without subtitles are covered with empty segments, so the subtitle
+        # timeline stays aligned with the video and no segment exceeds the target duration
+        empty_uri = f"{self.media_prefix}/{language}/{EMPTY_SUBTITLE_FILE}"
+        while end - self.subtitle_ends[language] > playlist.target_duration and start > self.subtitle_ends[language]:
+            gap = min(playlist.target_duration, start - self.subtitle_ends[language])
+            playlist.add_segment(empty_uri, gap)
+            self.subtitle_ends[language] += gap
+
+        playlist.add_segment(f"{self.media_prefix}/{language}/{filename}", end - self.subtitle_ends[language])
+        self.subtitle_ends[language] = end
+        print(f"Updated {language} subtitle m3u8 file of stream {self.stream_id} with chunk {filename}.")
+
+    # Continuously monitors and processes new video files, updating the .m3u8 file
+    async def process_video_files(self):
+        async for file in watch_segments(self.video_dir, "video", ".ts", stop_event=self.stop_event):
+            print(f"New chunk detected: {file}")
+            # Caching the chunk, writing the playlist and deleting expired files all touch the disk
+            await asyncio.to_thread(self.update_m3u8_playlist, file)
+
+    # List a complete LL-HLS part and hint the next one
+    async def publish_video_part(self, part):
+        await asyncio.to_thread(
+            self.video_playlist.add_part,
+            f"{self.media_prefix}/parts/{part.filename}",
+            part.duration,
+            part.independent,
+            f"{self.media_prefix}/parts/part_{part.number + 1}.m4s",
+        )
+
+    # List a complete LL-HLS segment, with its actual duration as it is cut on keyframes
+    async def publish_video_segment(self, segment_file: str, sequence: int, duration: float):
+        self.video_end += duration
+        await asyncio.to_thread(self.update_m3u8_playlist, segment_file, duration, self.video_end)
+
+    # Sequence number of an audio segment (AudioFile or AudioChunk)
+    def segment_sequence(self, segment) -> int:
+        return segment.index if isinstance(segment, AudioChunk) else segment_index(segment.path)
+
+    # Queue a closed audio segment (AudioFile or AudioChunk) for transcription, waiting while the queue is full
+    async def publish_audio_segment(self, segment):
+        sequence = self.segment_sequence(segment)
+        self.metrics.mark(sequence, "closed")
+        if isinstance(segment, AudioChunk):
+            self.segment_spans[sequence] = (segment.start, segment.start + len(segment.samples) / SAMPLE_RATE)
+        else:
+            self.segment_spans[sequence] = (segment.start, segment.end)
+        # Stamped before queueing: time spent waiting for room in the queue counts as STT queueing, and the
+        # STT worker can take the segment before this task runs again
+        self.metrics.mark(sequence, "detected")
+        await self.audio_segments.put((sequence, segment))
+
+    # Streaming STT: wake the transcriber; it always works on the latest audio, so reading never waits for it
+    async def publish_audio_window(self, chunk: AudioChunk):
+        self.audio_ready.set()
+
+    # Keep the FFmpeg process of the stream, for its PID
+    def register_process(self, process):
+        self.process = process
+
+    # Run FFmpeg until the source ends or the stream is stopped
+    async def run_ingest(self):
+        try:
+            # One FFmpeg process pulls the stream once and segments both the video and the audio
+            returncode = await segment_stream(
+                self.stream_url,
+                CHUNK_DURATION,
+                self.video_dir,
+                self.audio_dir,
+                self.publish_audio_window if self.streaming else self.publish_audio_segment,
+                self.register_process,
+                pcm_buffer=self.pcm_buffer,
+                vad=self.vad,
+                video_segmenter=self.video_segmenter,
+                part_duration=LL_HLS_PART_DURATION,
+                audio_interval=STREAMING_STT_INTERVAL if self.streaming else None,
+            )
+            # Not restarted: a new FFmpeg process would number segments and time chunks from zero again
+            print(f"Stream segmentation of stream {self.stream_id} ended with exit code {returncode}.")
+        except Exception as e:
+            print(f"Error segmenting stream {self.stream_id}: {e}")
+        finally:
+            # The streaming transcriber finalizes the rest of the window once the audio has ended
+            if self.streaming:
+                self.audio_closed = True
+                self.audio_ready.set()
+
+    # Run a blocking STT call on the stream's threads
+    async def run_blocking(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def transcribe(self, sequence: int, segment):
+        return await self.run_blocking(self.transcribe_segment, segment)
+
+    async def translate(self, language: str, sequence: int, transcript_file: str):
+        return await self.translate_transcript(language, sequence, transcript_file, self.segment_spans[sequence])
+
+    # Hand every transcript, in chunk order, to the translation stage of each language without waiting for any;
+    # a language whose queue is full is skipped for the chunk, which then has no subtitles in that language
+    async def distribute_transcripts(self):
+        while True:
+            sequence, transcript_file = await self.stitched.get()
+            self.unpublished[sequence] = len(self.languages)
+            for language, language_queue in self.translation_inputs.items():
+                try:
+                    language_queue.put_nowait((sequence, transcript_file))
+                except asyncio.QueueFull:
+                    print(f"Translation of stream {self.stream_id} into {language} is behind, dropping chunk {sequence}")
+                    self.metrics.drop(language)
+                    await self.translation_stages[language].skip(sequence)
+            self.stitched.task_done()
+
+    # Publish the translated chunks of a language to its subtitle playlist; its translation stage hands them
+    # over in chunk order
+    async def process_translations(self, language: str):
+        language_queue = self.translations[language]
+        while True:
+            sequence, output_file = await language_queue.get()
+            try:
+                await self.publish_translation(language, sequence, output_file)
+            except Exception as e:
+                print(f"Error publishing chunk {sequence} of stream {self.stream_id} in {language}: {e}")
+            finally:
+                language_queue.task_done()
+
+    # Streaming STT: transcribe the window whenever audio was read and queue the finalized transcripts in order
+    async def process_streaming_transcripts(self):
+        sequence = 0
+        opened = False
+        while True:
+            await self.audio_ready.wait()
+            self.audio_ready.clear()
+            flush = self.audio_closed
+            if not opened:
+                # The chunk of the next finalized transcript starts with the first pass that can include it
+                self.metrics.mark(sequence, "closed")
+                self.metrics.mark(sequence, "detected")
+                opened = True
+            self.metrics.mark(sequence, "stt_start")
+            try:
+                hypothesis = await self.run_blocking(self.transcriber.hypothesize, flush)
+            except Exception as e:
+                print(f"Streaming transcription error on stream {self.stream_id}: {e}")
+                return
+
+            if hypothesis.final:
+                self.metrics.mark(sequence, "stt_end")
+                self.segment_spans[sequence] = (hypothesis.start, hypothesis.end)
+                text = " ".join(segment["text"] for segment in hypothesis.final)
+                print(f"Final transcript {sequence} of stream {self.stream_id}: {text}")
+                transcript_file = save_transcript(f"audio_{sequence}.wav", text, hypothesis.final, self.subtitle_dir)
+                await self.transcripts.put((sequence, transcript_file))
+                sequence += 1
+                opened = False
+            self.interim = {"start": hypothesis.end, "text": hypothesis.interim} if hypothesis.interim else None
+            if hypothesis.interim:
+                print(f"Interim transcript of stream {self.stream_id}: {hypothesis.interim}")
+
+            if flush and self.transcriber.window_start >= self.pcm_buffer.end:
+                return
+            # Keep going without waiting for new audio while the window could not cover all of it, or to flush
+            if flush or self.pcm_buffer.end > self.transcriber.window_end:
+                self.audio_ready.set()
+
+    # Sentence stitching: rewrite every transcript, in order, with the sentence held from the previous one
+    # and without its own unfinished last sentence; None marks the end of the transcripts
+    async def stitch_transcripts(self):
+        sequence = -1
+        while True:
+            item = await self.transcripts.get()
+            try:
+                if item is None:
+                    # The sentence still held at the end of the stream is published as a chunk of its own
+                    stitched = self.stitcher.flush()
+                    if stitched is None:
+                        continue
+                    sequence += 1
+                    sentences, span = stitched
                 else:
-                    # Wait additional 2 seconds and check again
-                    time.sleep(1)
-                    if is_file_stable(file, wait_time=2):
-                        processed_files.add(file)
-                        print(f"New subtitle file detected after additional wait: {file}")
-                        translate_file(file)
-                    else:
-                        print(f"Skipping empty subtitle file: {file}")
-        time.sleep(1)
-
-# Main function to start processing the video and audio streams
-def process_stream(stream_url: str):
-    # remove the media file before proceeding with other steps
-    if os.path.exists(MEDIA_DIR):
-        shutil.rmtree(MEDIA_DIR)
-
-    # setup
-    setup_media_directories()   
-    # set up file & translation files
-    setup_output_files()
-
-    try:
-        # Submit tasks for video and audio segmentation to the executor
-        executor.submit(segment_video, stream_url, CHUNK_DURATION)
-        executor.submit(segment_audio, stream_url, CHUNK_DURATION)
-        
-        # Start background thread to process video files, audio files, subtitle files, and translation files
-        executor.submit(process_video_files)
-        executor.submit(process_audio_files)
-        executor.submit(process_translation_files)
-        
-        print(f"Processing started for {stream_url}")
-    except Exception as e:
-        print(f"Error processing video: {e}")
+                    sequence, transcript_file = item
+                    start, end = self.segment_spans[sequence]
+                    segments = transcript_segments(transcript_file, end - start)
+                    sentences, span = self.stitcher.stitch(segments, start, end)
+                text = " ".join(sentence["text"] for sentence in sentences)
+                # Saved next to the STT transcript, which stays as it was returned
+                stitched_file = await asyncio.to_thread(
+                    save_transcript, f"stitched_{sequence}.txt", text, sentences, self.subtitle_dir
+                )
+                self.segment_spans[sequence] = span
+                await self.stitched.put((sequence, stitched_file))
+            except Exception as e:
+                print(f"Error stitching transcript of chunk {sequence} of stream {self.stream_id}: {e}")
+            finally:
+                self.transcripts.task_done()
+
+    # Sentence stitching: mark the end of the transcripts once the source has ended and every chunk read was transcribed
+    async def close_transcripts(self):
+        await asyncio.wait([task for task in (self.ingest_task, self.streaming_task) if task])
+        await self.audio_segments.join()
+        await self.transcripts.put(None)
+
+    def transcribe_segment(self, segment):
+        sequence = self.segment_sequence(segment)
+        self.metrics.mark(sequence, "stt_start")
+        try:
+            if isinstance(segment, AudioChunk):
+                if PERSIST_AUDIO:
+                    with open(os.path.join(self.audio_dir, f"audio_{segment.index}.wav"), "wb") as wav_file:
+                        wav_file.write(pcm_to_wav(segment.samples))
+                return transcribe_pcm(segment, output_dir=self.subtitle_dir)
+            return transcribe_audio(segment.path, output_dir=self.subtitle_dir)
+        finally:
+            self.metrics.mark(sequence, "stt_end")
+
+    # Translate a finished transcript into one language; empty transcripts produce no subtitles
+    async def translate_transcript(self, language: str, sequence: int, transcript_file: str, span: tuple):
+        start, end = span
+        if not transcript_file or await asyncio.to_thread(os.path.getsize, transcript_file) == 0:
+            print(f"Skipping empty subtitle file: {transcript_file}")
+            return None
+        print(f"New subtitle file detected: {transcript_file}")
+        # The translation of a chunk spans from its first language starting to its last language finishing
+        self.metrics.mark(sequence, "translate_start", first=True)
+        try:
+            output_files = await translate_file(
+                transcript_file,
+                target_languages=[language],
+                output_dir=self.translation_dir,
+                start_time=start,
+                duration=end - start,
+            )
+            return output_files.get(language)
+        finally:
+            self.metrics.mark(sequence, "translate_end")
+
+    # Add the subtitles of a translated chunk to the playlist of its language; once the chunk is published
+    # in every language, hand its files to the retention window
+    async def publish_translation(self, language: str, sequence: int, output_file: str):
+        start, end = self.segment_spans[sequence]
+        if output_file:
+            await asyncio.to_thread(self.generate_subtitle_playlist, language, output_file, start, end)
+            await self.broadcaster.publish_file(language, output_file, sequence)
+            self.retention.register("subtitles", end, [output_file])
+
+        self.unpublished[sequence] -= 1
+        if self.unpublished[sequence] > 0:
+            return
+        del self.unpublished[sequence]
+        del self.segment_spans[sequence]
+        self.metrics.finish(sequence, end - start)
+        self.retention.register("audio", end, [os.path.join(self.audio_dir, f"audio_{sequence}.wav")])
+        self.retention.register("transcripts", end, [
+            os.path.join(self.subtitle_dir, f"{name}_{sequence}.{extension}")
+            for name in (["audio", "stitched"] if self.stitcher else ["audio"])
+            for extension in ("txt", "json")
+        ])
+
+    async def start(self):
+        """Set up the stream and start its pipeline tasks on the running event loop."""
+        # setup
+        self.setup_media_directories()
+        # set up file & translation files
+        self.setup_output_files()
+        self.setup_pipeline()
+        # Files are kept one playlist length after they leave the playlists, as HLS requires
+        self.retention = RetentionManager(
+            self.base_dir, RETENTION_SECONDS, grace=RETENTION_SECONDS + CHUNK_DURATION, on_delete=segment_cache.discard
+        )
+        self.metrics = StreamMetrics(self.stream_id)
+        self.metrics.watch_queue("audio", self.audio_segments.qsize)
+        self.metrics.watch_queue("stt", lambda: 0 if self.streaming else self.stt_stage.pending)
+        # Chunks waiting for or going through translation in the language furthest behind
+        self.metrics.watch_queue("translation", lambda: self.stitched.qsize() + max(
+            self.translation_inputs[language].qsize() + stage.pending for language, stage in self.translation_stages.items()
+        ))
+        self.metrics.watch_disk_usage(self.retention.total_bytes)
+        if self.streaming:
+            # Room for the longest window plus the audio read while a pass of it times out
+            self.pcm_buffer = PcmRingBuffer(max(PCM_BUFFER_SECONDS, 2 * STREAMING_STT_MAX_WINDOW + STT_TIMEOUT))
+            self.transcriber = StreamingTranscriber(
+                self.pcm_buffer, stt_router.call, STREAMING_STT_STABILITY, STREAMING_STT_MAX_WINDOW
+            )
+            self.audio_ready = asyncio.Event()
+        elif AUDIO_PIPE:
+            # Room for every chunk that can be waiting for or going through transcription, plus the one being read
+            buffer_chunks = self.stt_stage.max_pending + 4
+            chunk_length = self.subtitle_target_duration
+            self.pcm_buffer = PcmRingBuffer(max(PCM_BUFFER_SECONDS, buffer_chunks * chunk_length))
+
+        self.stop_event = asyncio.Event()
+        if LL_HLS:
+            # The segmenter publishes the video as it reads it, there are no segment files to watch
+            self.video_segmenter = CmafSegmenter(
+                self.video_dir,
+                CHUNK_DURATION,
+                on_part=self.publish_video_part,
+                on_segment=self.publish_video_segment,
+                max_duration=self.video_target_duration,
+            )
+        self.ingest_task = asyncio.create_task(self.run_ingest(), name=f"{self.stream_id}-ingest")
+        if not LL_HLS:
+            self.video_task = asyncio.create_task(self.process_video_files(), name=f"{self.stream_id}-video")
+        if self.streaming:
+            self.streaming_task = asyncio.create_task(self.process_streaming_transcripts(), name=f"{self.stream_id}-stt")
+        if self.stitcher:
+            self.closing_task = asyncio.create_task(self.close_transcripts(), name=f"{self.stream_id}-close")
+        self.tasks = [
+            self.ingest_task,
+            *([self.video_task] if self.video_task else []),
+            *([self.streaming_task] if self.streaming_task else self.stt_stage.start()),
+            *([
+                asyncio.create_task(self.stitch_transcripts(), name=f"{self.stream_id}-stitch"),
+                self.closing_task,
+            ] if self.stitcher else []),
+            asyncio.create_task(self.distribute_transcripts(), name=f"{self.stream_id}-distribute"),
+        ]
+        for language, stage in self.translation_stages.items():
+            self.tasks += [
+                *stage.start(),
+                asyncio.create_task(self.process_translations(language), name=f"{self.stream_id}-publish-{language}"),
+            ]
+        print(f"Processing started for {self.stream_url} as stream {self.stream_id}")
+
+    # Wait until every chunk that entered the pipeline has been published
+    async def drain(self):
+        if self.streaming_task is not None:
+            # The transcriber finalizes the rest of the audio once ingest has ended
+            await self.streaming_task
+        if self.closing_task is not None:
+            # The stitcher publishes the sentence it holds once the last transcript has been stitched
+            await self.closing_task
+        for stage_queue in (self.audio_segments, self.transcripts, self.stitched):
+            await stage_queue.join()
+        for stage_queues in (self.translation_inputs, self.translations):
+            for stage_queue in stage_queues.values():
+                await stage_queue.join()
+
+    async def stop(self, cleanup: bool = True, drain: bool = False):
+        """
+        Stop the stream: terminate FFmpeg, cancel the pipeline tasks and optionally delete its files.
+
+        With `drain`, the chunks already read from the source are transcribed, translated and published
+        first, for up to `SHUTDOWN_TIMEOUT` seconds.
+        """
+        # Stop pulling the source first; cancelling the ingest task terminates FFmpeg. The video watcher is
+        # stopped with its event rather than cancelled, so its watch thread has exited when it returns
+        if self.ingest_task is not None:
+            self.stop_event.set()
+            self.ingest_task.cancel()
+            await asyncio.gather(*[task for task in (self.ingest_task, self.video_task) if task], return_exceptions=True)
+
+        if drain and self.tasks:
+            try:
+                await asyncio.wait_for(self.drain(), SHUTDOWN_TIMEOUT)
+            except asyncio.TimeoutError:
+                print(f"Stream {self.stream_id} did not drain within {SHUTDOWN_TIMEOUT}s, dropping {len(self.segment_spans)} chunks.")
+
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        # Subscribers receive the cues published so far, then their connections are closed
+        if self.broadcaster is not None:
+            self.broadcaster.close()
+        # Let in-flight API calls finish before the files go away
+        if self.executor is not None:
+            await asyncio.to_thread(self.executor.shutdown, wait=True, cancel_futures=True)
+
+        if self.metrics is not None:
+            self.metrics.close()
+        # A stream started again under the same ID writes new files to the same paths
+        segment_cache.discard_directory(self.base_dir)
+        if cleanup and os.path.exists(self.base_dir):
+            await asyncio.to_thread(shutil.rmtree, self.base_dir)
+        print(f"Stream {self.stream_id} stopped.")
+
+    def info(self) -> dict:
+        return {
+            "stream_id": self.stream_id,
+            "stream_url": self.stream_url,
+            "index_url": f"{self.url_prefix}/index.m3u8",
+            "playlist_url": f"{self.url_prefix}/playlist.m3u8",
+            "subtitle_urls": {language: f"{self.url_prefix}/subtitles/{language}" for language in self.languages},
+            "cue_urls": {language: f"{self.url_prefix}/cues/{language}" for language in self.languages},
+            "storage": self.retention.stats() if self.retention else {},
+        }
+
+    def status(self) -> dict:
+        """Pipeline latency, queue depths and backlog of the stream, with its disk usage, cue subscribers, the STT backend health and the content cache hits."""
+        return {
+            "stream_id": self.stream_id,
+            "running": self.ingest_task is not None and not self.ingest_task.done(),
+            "segments_published": self.video_playlist.next_sequence if self.video_playlist else 0,
+            **({"interim_transcript": self.interim} if self.streaming else {}),
+            **(self.metrics.status() if self.metrics else {}),
+            "storage": self.retention.stats() if self.retention else {},
+            "cue_subscribers": self.broadcaster.stats() if self.broadcaster else {},
+            "stt_backends": stt_router.stats(),
+            "content_cache": content_cache.stats(),
+        }
+
+
+# Registry of the running streams
+streams = {}
+streams_lock = threading.Lock()
+# Starting and stopping streams are serialized, so a stream ID is never started twice at once or stopped
+# while it is starting; the lock belongs to the event loop it was created on
+streams_changing = None
+streams_changing_loop = None
+
+
+def get_streams_changing_lock() -> asyncio.Lock:
+    """Return the lock serializing stream starts and stops, creating it on the running event loop."""
+    global streams_changing, streams_changing_loop
+    loop = asyncio.get_running_loop()
+    if streams_changing_loop is not loop:
+        streams_changing, streams_changing_loop = asyncio.Lock(), loop
+    return streams_changing
+
+
+# Give the STT router a thread for every call the running streams can make at once, so no call waits for
+# a thread while its hedging delay runs out
+def resize_stt_router():
+    with streams_lock:
+        running = len(streams)
+    stt_router.resize(STT_CONCURRENCY * running)
+
+
+async def start_stream(stream_url: str, stream_id: str = None, languages: list = None) -> LiveStream:
+    """Start processing a stream with subtitles in `languages` (default: TARGET_LANGUAGES), replacing a running stream with the same ID."""
+    stream_id = stream_id or uuid.uuid4().hex[:12]
+    url_prefix = API_PREFIX if stream_id == DEFAULT_STREAM_ID else f"{API_PREFIX}/streams/{stream_id}"
+    stream = LiveStream(stream_id, stream_url, url_prefix, languages)
+    if "local" in STT_BACKENDS:
+        # Load the model before the first chunk arrives rather than on it
+        await asyncio.to_thread(get_whisper_engine)
+
+    async with get_streams_changing_lock():
+        with streams_lock:
+            previous = streams.pop(stream_id, None)
+        if previous is not None:
+            await previous.stop(cleanup=False)
+
+        await stream.start()
+        with streams_lock:
+            streams[stream_id] = stream
+        resize_stt_router()
+    return stream
+
+
+async def stop_stream(stream_id: str, cleanup: bool = True) -> bool:
+    """Stop a stream and remove it from the registry; returns False if it is not running."""
+    async with get_streams_changing_lock():
+        with streams_lock:
+            stream = streams.pop(stream_id, None)
+        if stream is None:
+            return False
+        resize_stt_router()
+        await stream.stop(cleanup=cleanup)
+    return True
+
+
+async def stop_all_streams():
+    """Stop every stream on server shutdown, publishing the chunks already in their pipelines; files are kept."""
+    async with get_streams_changing_lock():
+        with streams_lock:
+            running = list(streams.values())
+            streams.clear()
+        await asyncio.gather(*(stream.stop(cleanup=False, drain=True) for stream in running))
+
+
+def get_stream(stream_id: str):
+    with streams_lock:
+        return streams.get(stream_id)
+
+
+def list_streams() -> list:
+    with streams_lock:
+        return list(streams.values())
+
+
+# Main function to start processing the video and audio streams on the original single-stream endpoints
+async def process_stream(stream_url: str):
+    await start_stream(stream_url, DEFAULT_STREAM_ID)
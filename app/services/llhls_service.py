@@ -0,0 +1,364 @@
+# service/llhls_service.py
+import asyncio
+import os
+import re
+import struct
+from collections import OrderedDict
+
+# tfhd flags
+TFHD_BASE_DATA_OFFSET = 0x01
+TFHD_SAMPLE_DESCRIPTION_INDEX = 0x02
+TFHD_DEFAULT_SAMPLE_DURATION = 0x08
+TFHD_DEFAULT_SAMPLE_SIZE = 0x10
+TFHD_DEFAULT_SAMPLE_FLAGS = 0x20
+# trun flags
+TRUN_DATA_OFFSET = 0x01
+TRUN_FIRST_SAMPLE_FLAGS = 0x04
+TRUN_SAMPLE_DURATION = 0x100
+TRUN_SAMPLE_SIZE = 0x200
+TRUN_SAMPLE_FLAGS = 0x400
+TRUN_SAMPLE_COMPOSITION_TIME_OFFSET = 0x800
+# Sample flag of samples that are not sync samples (keyframes)
+SAMPLE_IS_NON_SYNC = 0x10000
+
+READ_CHUNK_SIZE = 64 * 1024
+INIT_SEGMENT_FILE = "init.mp4"
+PART_FILE_PATTERN = re.compile(r"^part_(\d+)\.m4s$")
+
+
+# Iterate over the boxes of an ISO BMFF byte range as (type, payload start, box end)
+def iter_boxes(data: bytes, start: int = 0, end: int = None):
+    end = len(data) if end is None else end
+    while start + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, start)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, start + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - start
+        if size < header:
+            return
+        yield box_type.decode("latin-1"), start + header, min(start + size, end)
+        start += size
+
+
+# Find the first child box of a given type
+def find_box(data: bytes, box_type: str, start: int, end: int):
+    for child_type, payload, child_end in iter_boxes(data, start, end):
+        if child_type == box_type:
+            return payload, child_end
+    return None
+
+
+# Read the video track of an init segment (`moov`): its ID, timescale and the defaults from `trex`
+def parse_init_segment(moov: bytes) -> dict:
+    tracks = {}
+    for box_type, payload, end in iter_boxes(moov):
+        if box_type == "trak":
+            tkhd = find_box(moov, "tkhd", payload, end)
+            mdia = find_box(moov, "mdia", payload, end)
+            if tkhd is None or mdia is None:
+                continue
+            version = moov[tkhd[0]]
+            track_id = struct.unpack_from(">I", moov, tkhd[0] + (20 if version == 1 else 12))[0]
+            mdhd = find_box(moov, "mdhd", *mdia)
+            hdlr = find_box(moov, "hdlr", *mdia)
+            version = moov[mdhd[0]]
+            timescale = struct.unpack_from(">I", moov, mdhd[0] + (20 if version == 1 else 12))[0]
+            handler = moov[hdlr[0] + 8:hdlr[0] + 12].decode("latin-1")
+            tracks[track_id] = {"track_id": track_id, "timescale": timescale, "handler": handler}
+        elif box_type == "mvex":
+            for child_type, child, _ in iter_boxes(moov, payload, end):
+                if child_type == "trex":
+                    track_id, _, duration, _, flags = struct.unpack_from(">IIIII", moov, child + 4)
+                    tracks.setdefault(track_id, {"track_id": track_id}).update(
+                        default_sample_duration=duration, default_sample_flags=flags
+                    )
+
+    for track in tracks.values():
+        if track.get("handler") == "vide":
+            return track
+    raise ValueError("The fragmented MP4 stream has no video track")
+
+
+# Duration (in track timescale units) of a fragment's video samples and whether it starts with a keyframe
+def parse_fragment(moof: bytes, track: dict) -> tuple:
+    for box_type, payload, end in iter_boxes(moof):
+        if box_type != "traf":
+            continue
+        tfhd = find_box(moof, "tfhd", payload, end)
+        flags = int.from_bytes(moof[tfhd[0] + 1:tfhd[0] + 4], "big")
+        if struct.unpack_from(">I", moof, tfhd[0] + 4)[0] != track["track_id"]:
+            continue
+
+        offset = tfhd[0] + 8
+        offset += 8 if flags & TFHD_BASE_DATA_OFFSET else 0
+        offset += 4 if flags & TFHD_SAMPLE_DESCRIPTION_INDEX else 0
+        default_duration = track.get("default_sample_duration", 0)
+        default_flags = track.get("default_sample_flags", 0)
+        if flags & TFHD_DEFAULT_SAMPLE_DURATION:
+            default_duration = struct.unpack_from(">I", moof, offset)[0]
+            offset += 4
+        offset += 4 if flags & TFHD_DEFAULT_SAMPLE_SIZE else 0
+        if flags & TFHD_DEFAULT_SAMPLE_FLAGS:
+            default_flags = struct.unpack_from(">I", moof, offset)[0]
+
+        duration = 0
+        first_flags = None
+        for child_type, child, _ in iter_boxes(moof, payload, end):
+            if child_type != "trun":
+                continue
+            flags = int.from_bytes(moof[child + 1:child + 4], "big")
+            sample_count = struct.unpack_from(">I", moof, child + 4)[0]
+            offset = child + 8
+            offset += 4 if flags & TRUN_DATA_OFFSET else 0
+            trun_first_flags = None
+            if flags & TRUN_FIRST_SAMPLE_FLAGS:
+                trun_first_flags = struct.unpack_from(">I", moof, offset)[0]
+                offset += 4
+            for index in range(sample_count):
+                sample_duration, sample_flags = default_duration, default_flags
+                if flags & TRUN_SAMPLE_DURATION:
+                    sample_duration = struct.unpack_from(">I", moof, offset)[0]
+                    offset += 4
+                offset += 4 if flags & TRUN_SAMPLE_SIZE else 0
+                if flags & TRUN_SAMPLE_FLAGS:
+                    sample_flags = struct.unpack_from(">I", moof, offset)[0]
+                    offset += 4
+                offset += 4 if flags & TRUN_SAMPLE_COMPOSITION_TIME_OFFSET else 0
+                if index == 0 and trun_first_flags is not None:
+                    sample_flags = trun_first_flags
+                if first_flags is None:
+                    first_flags = sample_flags
+                duration += sample_duration
+        return duration, first_flags is not None and not first_flags & SAMPLE_IS_NON_SYNC
+    return 0, False
+
+
+# Close a complete segment file and rename it to its final name
+def close_and_rename(file, path: str):
+    file.close()
+    os.replace(file.name, path)
+
+
+class CmafPart:
+    """A partial segment (one `moof` + `mdat` fragment), filled as FFmpeg writes it."""
+
+    def __init__(self, number: int, sequence: int, independent: bool, duration: float):
+        self.number = number
+        self.sequence = sequence
+        self.independent = independent
+        self.duration = duration
+        self.data = bytearray()
+        self.complete = False
+
+    @property
+    def filename(self) -> str:
+        return f"part_{self.number}.m4s"
+
+
+class CmafSegmenter:
+    """
+    Cut the fragmented MP4 output of FFmpeg into LL-HLS partial segments and full segments.
+
+    FFmpeg writes an init segment (`ftyp` + `moov`) and then one fragment (`moof` + `mdat`) per part.
+    Every fragment becomes a part as soon as its `moof` has been read; the bytes of its `mdat` are
+    appended as they arrive, so a player that requested the part from the preload hint receives it
+    while it is still being written. A new segment starts at the first part beginning with a keyframe
+    once the current segment has reached `segment_duration`; the parts of a segment are concatenated
+    into `video_N.m4s` for players that do not load parts. With `max_duration`, a segment that has not
+    reached a keyframe by then is cut before the part that would make it longer, so no segment exceeds
+    the playlist's target duration. Files are written on a worker thread.
+
+    Parts are kept in memory for the last `part_segments` segments, the ones listed with their parts
+    in the playlist. Parts are numbered across segments, so the preload hint can name the next part
+    before it is known which segment it belongs to.
+
+    Args:
+        video_dir (str): Directory of the init segment and the full segments.
+        segment_duration (float): Minimum duration of a segment in seconds.
+        on_part (callable): Coroutine function awaited with every complete `CmafPart`.
+        on_segment (callable): Coroutine function awaited with (path, sequence, duration) of every complete segment.
+        part_segments (int): Number of recent segments whose parts are kept.
+        max_duration (float): Longest duration of a segment in seconds (no limit when None).
+    """
+
+    def __init__(
+        self,
+        video_dir: str,
+        segment_duration: float,
+        on_part=None,
+        on_segment=None,
+        part_segments: int = 4,
+        max_duration: float = None,
+    ):
+        self.video_dir = video_dir
+        self.segment_duration = segment_duration
+        self.max_duration = max_duration
+        self.on_part = on_part
+        self.on_segment = on_segment
+        self.part_segments = part_segments
+        self.init = b""
+        self.track = None
+        self.closed = False
+        self.parts = OrderedDict()
+        self.next_part = 0
+        self.sequence = 0
+        self.duration = 0.0
+        self.segment_file = None
+        self.changed = asyncio.Condition()
+
+    @property
+    def init_path(self) -> str:
+        return os.path.join(self.video_dir, INIT_SEGMENT_FILE)
+
+    async def run(self, stream: asyncio.StreamReader):
+        """Read the fragmented MP4 stream until it ends."""
+        try:
+            part = None
+            while True:
+                box = await self.read_box_header(stream)
+                if box is None:
+                    break
+                box_type, header, size = box
+                if box_type == "moof":
+                    moof = header + await stream.readexactly(size - len(header))
+                    part = await self.start_part(moof, len(header))
+                elif box_type == "mdat" and part is not None:
+                    await self.append(part, header)
+                    remaining = size - len(header)
+                    while remaining:
+                        data = await stream.read(min(remaining, READ_CHUNK_SIZE))
+                        if not data:
+                            raise asyncio.IncompleteReadError(b"", remaining)
+                        remaining -= len(data)
+                        await self.append(part, data)
+                    await self.finish_part(part)
+                    part = None
+                else:
+                    content = header + await stream.readexactly(size - len(header))
+                    if box_type == "ftyp":
+                        self.init = content
+                    elif box_type == "moov":
+                        self.track = parse_init_segment(content[len(header):])
+                        await asyncio.to_thread(self.write_init, self.init + content)
+        except asyncio.IncompleteReadError:
+            print("Fragmented MP4 stream ended in the middle of a box")
+        finally:
+            await self.close()
+
+    def write_init(self, content: bytes):
+        with open(self.init_path, "wb") as init_file:
+            init_file.write(content)
+
+    async def read_box_header(self, stream: asyncio.StreamReader):
+        try:
+            header = await stream.readexactly(8)
+        except asyncio.IncompleteReadError:
+            return None
+        size, box_type = struct.unpack(">I4s", header)
+        if size == 1:
+            header += await stream.readexactly(8)
+            size = struct.unpack_from(">Q", header, 8)[0]
+        return box_type.decode("latin-1"), header, size
+
+    async def start_part(self, moof: bytes, header_size: int) -> CmafPart:
+        duration, independent = parse_fragment(moof[header_size:], self.track)
+        duration /= self.track["timescale"]
+        # Segments start on a keyframe, so every segment can be decoded on its own, unless the source has
+        # no keyframe before the segment would exceed the target duration
+        if self.segment_file is not None and (
+            (independent and self.duration >= self.segment_duration - 1e-3)
+            or (self.max_duration and self.duration + duration > self.max_duration + 1e-3)
+        ):
+            if not independent:
+                print(f"No keyframe within {self.max_duration}s, cutting segment {self.sequence} between keyframes")
+            await self.finish_segment()
+        if self.segment_file is None:
+            path = os.path.join(self.video_dir, f"video_{self.sequence}.m4s.tmp")
+            self.segment_file = await asyncio.to_thread(open, path, "wb")
+
+        part = CmafPart(self.next_part, self.sequence, independent, duration)
+        self.next_part += 1
+        self.duration += duration
+        self.parts[part.number] = part
+        await self.append(part, moof)
+        return part
+
+    async def append(self, part: CmafPart, data: bytes):
+        part.data += data
+        async with self.changed:
+            self.changed.notify_all()
+
+    async def finish_part(self, part: CmafPart):
+        part.complete = True
+        await asyncio.to_thread(self.segment_file.write, part.data)
+        async with self.changed:
+            self.changed.notify_all()
+        if self.on_part:
+            await self.on_part(part)
+
+    async def finish_segment(self):
+        path = self.segment_file.name[:-len(".tmp")]
+        await asyncio.to_thread(close_and_rename, self.segment_file, path)
+        self.segment_file = None
+        if self.on_segment:
+            await self.on_segment(path, self.sequence, self.duration)
+
+        self.sequence += 1
+        self.duration = 0.0
+        # Only the parts listed in the playlist are kept
+        while self.parts and next(iter(self.parts.values())).sequence <= self.sequence - self.part_segments:
+            self.parts.popitem(last=False)
+
+    async def close(self):
+        """Publish the last segment and release the requests waiting for parts."""
+        for part in self.parts.values():
+            part.complete = True
+        if self.segment_file is not None:
+            await self.finish_segment()
+        self.closed = True
+        async with self.changed:
+            self.changed.notify_all()
+
+    async def wait_for_part(self, filename: str, timeout: float):
+        """
+        Return a part by filename, waiting for it if it is the next one (the preload hint).
+
+        Returns:
+            CmafPart: The part, possibly still being written; None if it is unknown or did not start in time.
+        """
+        match = PART_FILE_PATTERN.match(filename)
+        if match is None:
+            return None
+        number = int(match.group(1))
+        if number > self.next_part:
+            return None
+        async with self.changed:
+            try:
+                await asyncio.wait_for(
+                    self.changed.wait_for(lambda: number < self.next_part or self.closed), timeout
+                )
+            except asyncio.TimeoutError:
+                return None
+        return self.parts.get(number)
+
+    async def iter_part(self, part: CmafPart, timeout: float):
+        """Yield the bytes of a part as they are written, until it is complete."""
+        offset = 0
+        while True:
+            if offset < len(part.data):
+                data = bytes(part.data[offset:])
+                offset += len(data)
+                yield data
+            elif part.complete:
+                return
+            else:
+                async with self.changed:
+                    try:
+                        await asyncio.wait_for(
+                            self.changed.wait_for(lambda: offset < len(part.data) or part.complete), timeout
+                        )
+                    except asyncio.TimeoutError:
+                        return
@@ -0,0 +1,178 @@
+# service/metrics_service.py
+import threading
+import time
+from collections import deque
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Pipeline events of a chunk, in order
+CHUNK_EVENTS = ["closed", "detected", "stt_start", "stt_end", "translate_start", "translate_end", "published"]
+
+# Stages between two consecutive events
+CHUNK_STAGES = {
+    "detect": ("closed", "detected"),
+    "stt_queue": ("detected", "stt_start"),
+    "stt": ("stt_start", "stt_end"),
+    "translation_queue": ("stt_end", "translate_start"),
+    "translation": ("translate_start", "translate_end"),
+    "publish": ("translate_end", "published"),
+    "total": ("closed", "published"),
+}
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 7.5, 10, 15, 20, 30, 45, 60, 120)
+
+STAGE_SECONDS = Histogram(
+    "pipeline_stage_seconds",
+    "Time a chunk spent in each stage of the subtitle pipeline",
+    ["stream", "stage"],
+    buckets=LATENCY_BUCKETS,
+)
+SUBTITLE_LATENCY_SECONDS = Histogram(
+    "glass_to_subtitle_seconds",
+    "Time from the start of a chunk's audio arriving to its subtitles being published",
+    ["stream"],
+    buckets=LATENCY_BUCKETS,
+)
+QUEUE_DEPTH = Gauge("pipeline_queue_depth", "Chunks waiting in a queue of the pipeline", ["stream", "queue"])
+BACKLOG = Gauge("pipeline_backlog_chunks", "Chunks closed but not yet published", ["stream"])
+DISK_BYTES = Gauge("stream_disk_bytes", "Size of the media files of a stream on disk", ["stream"])
+API_REQUEST_SECONDS = Histogram(
+    "api_request_seconds",
+    "Latency of requests to the STT and translation APIs",
+    ["service", "backend", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+DROPPED_CHUNKS = Counter(
+    "translation_dropped_chunks_total",
+    "Chunks left without subtitles in a language because its translation stage was full",
+    ["stream", "language"],
+)
+CONTENT_CACHE_LOOKUPS = Counter(
+    "content_cache_lookups_total",
+    "Lookups of transcripts and translations in the content cache",
+    ["namespace", "result"],
+)
+
+
+# Record the latency of an API request (an STT backend call, an XL8 request)
+def observe_api_request(service: str, backend: str, seconds: float, success: bool):
+    API_REQUEST_SECONDS.labels(service, backend, "success" if success else "error").observe(seconds)
+
+
+# Percentile of a list of durations, or None when it is empty
+def percentile(values: list, fraction: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class StreamMetrics:
+    """
+    Timing spans of the chunks of one stream, exported to Prometheus and summarized for the status API.
+
+    Every pipeline event of a chunk (see `CHUNK_EVENTS`) is stamped with the wall clock as it happens.
+    Once the chunk is published, the time spent in each stage is observed in the `pipeline_stage_seconds`
+    histogram and its glass-to-subtitle latency, from the first sample of its audio arriving to the
+    subtitles being listed in the playlists, in `glass_to_subtitle_seconds`. The spans of the most
+    recent chunks are kept for the status API.
+
+    Args:
+        stream_id (str): Identifier of the stream, used as the `stream` label.
+        window (int): Number of recent chunks the status percentiles are computed on.
+    """
+
+    def __init__(self, stream_id: str, window: int = 100):
+        self.stream_id = stream_id
+        self.chunks = {}
+        self.recent = deque(maxlen=window)
+        self.queues = []
+        self.published = 0
+        self.dropped = {}
+        self.lock = threading.Lock()
+        BACKLOG.labels(stream_id).set_function(lambda: len(self.chunks))
+
+    def watch_queue(self, name: str, depth):
+        """Export the depth of a queue, read with `depth()` at scrape time."""
+        self.queues.append((name, depth))
+        QUEUE_DEPTH.labels(self.stream_id, name).set_function(depth)
+
+    def watch_disk_usage(self, total_bytes):
+        """Export the disk usage of the stream, read with `total_bytes()` at scrape time."""
+        DISK_BYTES.labels(self.stream_id).set_function(total_bytes)
+
+    def mark(self, sequence: int, event: str, first: bool = False):
+        """Stamp a pipeline event of a chunk with the current time; with `first`, an earlier stamp is kept."""
+        with self.lock:
+            events = self.chunks.setdefault(sequence, {})
+            if not (first and event in events):
+                events[event] = time.time()
+
+    def drop(self, language: str):
+        """Count a chunk dropped from the translation of a language."""
+        with self.lock:
+            self.dropped[language] = self.dropped.get(language, 0) + 1
+        DROPPED_CHUNKS.labels(self.stream_id, language).inc()
+
+    def finish(self, sequence: int, audio_duration: float):
+        """Stamp the publication of a chunk and record its spans."""
+        with self.lock:
+            events = self.chunks.pop(sequence, {})
+            events["published"] = time.time()
+            spans = {
+                stage: events[end] - events[start]
+                for stage, (start, end) in CHUNK_STAGES.items()
+                if start in events and end in events
+            }
+            # Chunks without speech have no subtitles to wait for
+            if "total" in spans and "translate_end" in events:
+                spans["glass_to_subtitle"] = spans["total"] + audio_duration
+            self.recent.append({"sequence": sequence, **spans})
+            self.published += 1
+
+        for stage, seconds in spans.items():
+            if stage == "glass_to_subtitle":
+                SUBTITLE_LATENCY_SECONDS.labels(self.stream_id).observe(seconds)
+            else:
+                STAGE_SECONDS.labels(self.stream_id, stage).observe(seconds)
+
+    def status(self) -> dict:
+        """Return the queue depths, the backlog, the dropped chunks and the p50/p95 of every stage over the recent chunks."""
+        with self.lock:
+            recent = list(self.recent)
+            backlog = len(self.chunks)
+            published = self.published
+            dropped = dict(self.dropped)
+        stages = {}
+        for stage in [*CHUNK_STAGES, "glass_to_subtitle"]:
+            values = [chunk[stage] for chunk in recent if stage in chunk]
+            stages[stage] = {"p50": percentile(values, 0.5), "p95": percentile(values, 0.95)}
+        return {
+            "published_chunks": published,
+            "backlog_chunks": backlog,
+            "dropped_chunks": dropped,
+            "queue_depth": {name: depth() for name, depth in self.queues},
+            "stage_seconds": stages,
+            "last_chunk": recent[-1] if recent else None,
+        }
+
+    def close(self):
+        """Remove the metrics of the stream from the Prometheus registry."""
+        BACKLOG.remove(self.stream_id)
+        try:
+            DISK_BYTES.remove(self.stream_id)
+        except KeyError:
+            pass
+        for name, _ in self.queues:
+            QUEUE_DEPTH.remove(self.stream_id, name)
+        for language in self.dropped:
+            DROPPED_CHUNKS.remove(self.stream_id, language)
+        for stage in CHUNK_STAGES:
+            try:
+                STAGE_SECONDS.remove(self.stream_id, stage)
+            except KeyError:
+                pass
+        try:
+            SUBTITLE_LATENCY_SECONDS.remove(self.stream_id)
+        except KeyError:
+            pass
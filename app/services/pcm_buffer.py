@@ -0,0 +1,91 @@
+# service/pcm_buffer.py
+import asyncio
+import io
+import wave
+from typing import NamedTuple
+
+import numpy as np
+
+# Format of the PCM audio handed to STT: 16 kHz mono signed 16-bit little-endian
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+
+
+class AudioChunk(NamedTuple):
+    """A chunk of PCM audio cut from the stream."""
+
+    index: int          # Sequence number of the chunk
+    start: float        # Offset of the first sample from the start of the stream, in seconds
+    samples: memoryview  # int16 samples, a view into the ring buffer
+
+
+class PcmRingBuffer:
+    """
+    NumPy-backed ring buffer of the PCM audio read from FFmpeg's stdout.
+
+    FFmpeg's output is copied into the array as it arrives, and chunks are handed out as memoryviews of
+    it, so audio reaches the STT engine without temporary files or further copies. Positions are absolute sample
+    counts since the start of the stream; a view stays valid until the writer wraps around to it, so the
+    buffer must be sized to hold every chunk still waiting for transcription.
+
+    Args:
+        capacity_seconds (float): Duration of audio kept in the buffer.
+        sample_rate (int): Sample rate of the audio.
+    """
+
+    def __init__(self, capacity_seconds: float, sample_rate: int = SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.capacity = int(capacity_seconds * sample_rate)
+        self.samples = np.zeros(self.capacity, dtype=np.int16)
+        self.data = memoryview(self.samples).cast("B")
+        self.bytes_written = 0
+
+    @property
+    def end(self) -> int:
+        """Absolute position of the first sample not written yet."""
+        return self.bytes_written // SAMPLE_WIDTH
+
+    async def fill_from(self, stream: asyncio.StreamReader, until: int) -> int:
+        """Read from the stream into the buffer, up to absolute sample `until`; returns the number of bytes read (0 at EOF)."""
+        offset = self.bytes_written % len(self.data)
+        size = min(len(self.data) - offset, until * SAMPLE_WIDTH - self.bytes_written)
+        data = await stream.read(size)
+        self.data[offset:offset + len(data)] = data
+        self.bytes_written += len(data)
+        return len(data)
+
+    def view(self, start: int, end: int) -> memoryview:
+        """Return the samples between two absolute positions; only copies when the range wraps around."""
+        if start < self.end - self.capacity or end > self.end or start > end:
+            raise ValueError(f"Samples {start}-{end} are not in the buffer")
+        offset = start % self.capacity
+        if offset + (end - start) <= self.capacity:
+            return memoryview(self.samples[offset:offset + end - start])
+        return memoryview(np.concatenate((self.samples[offset:], self.samples[:(end % self.capacity)])))
+
+
+# Cut the PCM output of FFmpeg into fixed-length chunks as soon as enough audio has been read
+async def read_pcm_chunks(stream: asyncio.StreamReader, buffer: PcmRingBuffer, chunk_duration: float):
+    chunk_samples = int(chunk_duration * buffer.sample_rate)
+    index = 0
+    start = 0
+    while await buffer.fill_from(stream, start + chunk_samples):
+        if buffer.end == start + chunk_samples:
+            yield AudioChunk(index, start / buffer.sample_rate, buffer.view(start, start + chunk_samples))
+            index += 1
+            start += chunk_samples
+
+    # The end of the stream closes the last, shorter chunk
+    if buffer.end > start:
+        yield AudioChunk(index, start / buffer.sample_rate, buffer.view(start, buffer.end))
+
+
+# Wrap PCM samples in a WAV container in memory, for the APIs that expect an audio file
+def pcm_to_wav(samples: memoryview, sample_rate: int = SAMPLE_RATE) -> bytes:
+    output = io.BytesIO()
+    with wave.open(output, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(SAMPLE_WIDTH)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(samples)
+    return output.getvalue()
@@ -0,0 +1,275 @@
+# service/playlist_service.py
+import asyncio
+import hashlib
+import os
+import threading
+from collections import deque
+
+
+# Strong ETag for a playlist version
+def make_etag(version: int, content: bytes) -> str:
+    return f'"{version}-{hashlib.sha1(content).hexdigest()[:16]}"'
+
+
+# Resolve a blocking playlist request; runs on the event loop that is waiting for it
+def resolve_waiter(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class HLSPlaylist:
+    """
+    Live HLS media playlist kept in memory and updated one segment at a time.
+
+    Every new segment appends a single entry instead of rebuilding the playlist from the directory.
+    With a `window_size` (a number of segments) or a `window_duration` (seconds), only the latest segments
+    are listed and `#EXT-X-MEDIA-SEQUENCE` moves forward as old entries drop out, so the playlist size
+    stays bounded on long streams.
+
+    The rendered playlist is cached with a version number and an ETag so it can be served to players
+    without touching the disk, and requests can block until a given media sequence number is published.
+    Updates are thread-safe and wake blocked requests on their own event loop, so a playlist can be
+    updated and written from a worker thread.
+
+    Args:
+        file_path (str): Path where the playlist is written.
+        target_duration (int): Value of `#EXT-X-TARGETDURATION`.
+        window_size (int): Number of segments to keep in the playlist (0 keeps all of them).
+        playlist_type (str): Optional `#EXT-X-PLAYLIST-TYPE`, only written when the window is unbounded.
+        window_duration (float): Total duration of the segments to keep in the playlist (0 keeps all of them).
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        target_duration: int,
+        window_size: int = 0,
+        playlist_type: str = None,
+        window_duration: float = 0,
+    ):
+        self.file_path = file_path
+        self.target_duration = target_duration
+        self.window_size = window_size
+        self.window_duration = window_duration
+        self.playlist_type = playlist_type
+        self.media_sequence = 0
+        self.segments = deque()
+        self.duration = 0.0
+        self.lock = threading.Lock()
+        self.waiters = []
+        self.version = 0
+        self.content = b""
+        self.etag = ""
+        self.refresh()
+
+    @property
+    def next_sequence(self) -> int:
+        """Media sequence number of the next segment to be added."""
+        return self.media_sequence + len(self.segments)
+
+    def add_segment(self, uri: str, duration: float):
+        """Append a segment, slide the window if needed, wake up blocked requests and write the playlist."""
+        self.update(self.append_segment, uri, duration)
+
+    def update(self, change, *args):
+        """Apply `change(*args)` under the lock, then re-render, wake up blocked requests and write the playlist."""
+        with self.lock:
+            change(*args)
+            self.refresh()
+            waiters, self.waiters = self.waiters, []
+
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(resolve_waiter, future)
+        self.write()
+
+    def append_segment(self, uri: str, duration: float):
+        """Append a segment entry and slide the window; the caller holds the lock."""
+        self.segments.append((duration, f"#EXTINF:{round(duration, 3):g},\n{uri}\n"))
+        self.duration += duration
+        while len(self.segments) > 1 and (
+            (self.window_size and len(self.segments) > self.window_size)
+            or (self.window_duration and self.duration - self.segments[0][0] >= self.window_duration)
+        ):
+            dropped, _ = self.segments.popleft()
+            self.duration -= dropped
+            self.media_sequence += 1
+
+    def render(self) -> str:
+        """Return the playlist content."""
+        header = "#EXTM3U\n"
+        header += "#EXT-X-VERSION:3\n"
+        # EVENT and VOD playlists must not drop segments, so the type only applies without a window
+        if self.playlist_type and not self.window_size and not self.window_duration:
+            header += f"#EXT-X-PLAYLIST-TYPE:{self.playlist_type}\n"
+        header += f"#EXT-X-TARGETDURATION:{self.target_duration}\n"
+        # Players may block on `_HLS_msn` instead of polling for the next segment
+        header += "#EXT-X-SERVER-CONTROL:CAN-BLOCK-RELOAD=YES\n"
+        header += f"#EXT-X-MEDIA-SEQUENCE:{self.media_sequence}\n\n"
+        return header + "".join(entry for _, entry in self.segments)
+
+    def refresh(self):
+        """Re-render the cached content and bump the version; the caller holds the lock."""
+        self.version += 1
+        self.content = self.render().encode()
+        self.etag = make_etag(self.version, self.content)
+
+    def snapshot(self) -> tuple:
+        """Return the cached (content, etag) pair of the current version."""
+        with self.lock:
+            return self.content, self.etag
+
+    def is_available(self, msn: int, part: int = None) -> bool:
+        """Whether the segment `msn` is in the playlist; the caller holds the lock."""
+        return msn < self.next_sequence
+
+    async def wait_for_segment(self, msn: int, timeout: float, part: int = None) -> bool:
+        """
+        Wait until the segment with media sequence number `msn` (or part `part` of it) is in the playlist.
+
+        Returns:
+            bool: True when the segment is available, False if the timeout expired first.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            with self.lock:
+                if self.is_available(msn, part):
+                    return True
+                future = loop.create_future()
+                self.waiters.append((loop, future))
+
+            try:
+                await asyncio.wait_for(future, max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                with self.lock:
+                    if (loop, future) in self.waiters:
+                        self.waiters.remove((loop, future))
+                    return self.is_available(msn, part)
+
+    def write(self):
+        """Write the playlist to a temp file and rename it, so readers never see a partial playlist."""
+        content, _ = self.snapshot()
+        temp_file_path = f"{self.file_path}.tmp"
+        with open(temp_file_path, "wb") as f:
+            f.write(content)
+        os.replace(temp_file_path, self.file_path)
+
+
+class LowLatencyPlaylist(HLSPlaylist):
+    """
+    LL-HLS media playlist of fMP4 segments announced part by part.
+
+    The parts of the segment being written are listed with `#EXT-X-PART` as they complete, followed by an
+    `#EXT-X-PRELOAD-HINT` for the next one, so players can request it before it exists. The parts of the
+    last `part_segments` complete segments stay listed before their `#EXTINF`. Blocking reloads can wait
+    for a part with `_HLS_msn` and `_HLS_part`.
+
+    Args:
+        file_path (str): Path where the playlist is written.
+        target_duration (int): Value of `#EXT-X-TARGETDURATION`.
+        part_target (float): Value of `PART-TARGET`; every part is at most this long.
+        map_uri (str): URI of the init segment (`#EXT-X-MAP`).
+        window_size (int): Number of segments to keep in the playlist (0 keeps all of them).
+        window_duration (float): Total duration of the segments to keep in the playlist (0 keeps all of them).
+        part_segments (int): Number of complete segments whose parts stay listed.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        target_duration: int,
+        part_target: float,
+        map_uri: str,
+        window_size: int = 0,
+        window_duration: float = 0,
+        part_segments: int = 3,
+    ):
+        self.part_target = part_target
+        self.map_uri = map_uri
+        self.part_segments = part_segments
+        self.segment_parts = {}
+        self.parts = []
+        self.preload_hint = None
+        super().__init__(file_path, target_duration, window_size=window_size, window_duration=window_duration)
+
+    def add_part(self, uri: str, duration: float, independent: bool, next_uri: str):
+        """Append a complete part of the segment being written and hint the next one."""
+        self.update(self.append_part, uri, duration, independent, next_uri)
+
+    def append_part(self, uri: str, duration: float, independent: bool, next_uri: str):
+        independent = ",INDEPENDENT=YES" if independent else ""
+        self.parts.append(f'#EXT-X-PART:DURATION={round(duration, 5):g},URI="{uri}"{independent}\n')
+        self.preload_hint = f'#EXT-X-PRELOAD-HINT:TYPE=PART,URI="{next_uri}"\n'
+
+    def append_segment(self, uri: str, duration: float):
+        # The parts of the segment move in front of its entry; older segments are listed without parts
+        self.segment_parts[self.next_sequence] = self.parts
+        self.parts = []
+        super().append_segment(uri, duration)
+        for sequence in [sequence for sequence in self.segment_parts if sequence < self.next_sequence - self.part_segments]:
+            del self.segment_parts[sequence]
+
+    def is_available(self, msn: int, part: int = None) -> bool:
+        if part is not None and msn == self.next_sequence:
+            return part < len(self.parts)
+        return msn < self.next_sequence
+
+    def render(self) -> str:
+        """Return the playlist content."""
+        header = "#EXTM3U\n"
+        header += "#EXT-X-VERSION:6\n"
+        header += f"#EXT-X-TARGETDURATION:{self.target_duration}\n"
+        # Players start three parts behind the live edge, as the LL-HLS specification recommends
+        header += f"#EXT-X-SERVER-CONTROL:CAN-BLOCK-RELOAD=YES,PART-HOLD-BACK={round(3 * self.part_target, 3):g}\n"
+        header += f"#EXT-X-PART-INF:PART-TARGET={round(self.part_target, 3):g}\n"
+        header += f"#EXT-X-MEDIA-SEQUENCE:{self.media_sequence}\n"
+        header += f'#EXT-X-MAP:URI="{self.map_uri}"\n\n'
+        entries = []
+        for offset, (_, entry) in enumerate(self.segments):
+            entries += self.segment_parts.get(self.media_sequence + offset, [])
+            entries.append(entry)
+        entries += self.parts
+        if self.preload_hint:
+            entries.append(self.preload_hint)
+        return header + "".join(entries)
+
+
+class MasterPlaylist:
+    """
+    HLS master playlist listing the video variant and one subtitle rendition per language.
+
+    Args:
+        file_path (str): Path where the playlist is written.
+        languages (dict): Language codes mapped to their display names.
+        video_uri (str): URI of the video media playlist.
+        subtitle_uri (str): URI template of the subtitle playlists, with a `{language}` placeholder.
+    """
+
+    def __init__(self, file_path: str, languages: dict, video_uri: str, subtitle_uri: str):
+        self.file_path = file_path
+        self.languages = languages
+        self.video_uri = video_uri
+        self.subtitle_uri = subtitle_uri
+        self.content = self.render().encode()
+        self.etag = make_etag(1, self.content)
+
+    def render(self) -> str:
+        """Return the playlist content."""
+        m3u8_content = "#EXTM3U\n"
+        m3u8_content += "#EXT-X-VERSION:3\n"
+
+        for key, name in self.languages.items():
+            uri = self.subtitle_uri.format(language=key)
+            m3u8_content += f'#EXT-X-MEDIA:TYPE=SUBTITLES,GROUP-ID="subs",NAME="{name}",FORCED=NO,AUTOSELECT=YES,URI="{uri}",LANGUAGE="{key}"\n'
+
+        m3u8_content += f'\n#EXT-X-STREAM-INF:SUBTITLES="subs"\n{self.video_uri}'
+        return m3u8_content
+
+    def snapshot(self) -> tuple:
+        """Return the (content, etag) pair; the master playlist never changes once created."""
+        return self.content, self.etag
+
+    def write(self):
+        """Write the playlist to disk."""
+        with open(self.file_path, "wb") as f:
+            f.write(self.content)
@@ -0,0 +1,97 @@
+# service/retention_service.py
+import heapq
+import os
+import shutil
+import threading
+
+
+class RetentionManager:
+    """
+    Rolling retention (DVR window) of the media files of a stream, with disk-usage accounting.
+
+    Every file the stream publishes (video segments, audio, transcripts, subtitles) is registered with
+    the stream time its content ends at. Once the stream has moved `retention` seconds past that time,
+    plus a `grace` period, the file is deleted. Files come off a heap ordered by end time, so a
+    collection only looks at expired files and never lists the media directories.
+
+    The size of the registered files is counted per category as they are added and removed, so the
+    disk usage of the stream is known without scanning it.
+
+    Args:
+        base_dir (str): Media directory of the stream, used for the free space of its filesystem.
+        retention (float): Seconds of stream time to keep; 0 keeps every file.
+        grace (float): Extra seconds a file stays on disk after it left the retention window, so players
+                       that loaded an older playlist can still fetch it.
+        on_delete (callable): Called with the path of every deleted file.
+    """
+
+    def __init__(self, base_dir: str, retention: float, grace: float = 0.0, on_delete=None):
+        self.base_dir = base_dir
+        self.retention = retention
+        self.grace = grace
+        self.on_delete = on_delete
+        self.expiry = []
+        self.files = {}
+        self.bytes = {}
+        self.deleted_files = 0
+        self.deleted_bytes = 0
+        self.lock = threading.Lock()
+
+    def register(self, category: str, end: float, paths: list):
+        """Account for the files of one segment ending at stream time `end`; missing files are ignored."""
+        with self.lock:
+            for path in paths:
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    continue
+                self.files[category] = self.files.get(category, 0) + 1
+                self.bytes[category] = self.bytes.get(category, 0) + size
+                if self.retention:
+                    heapq.heappush(self.expiry, (end, path, category, size))
+
+    def collect(self, now: float) -> int:
+        """Delete the files that ended more than `retention + grace` seconds before stream time `now`."""
+        if not self.retention:
+            return 0
+        cutoff = now - self.retention - self.grace
+        expired = []
+        with self.lock:
+            while self.expiry and self.expiry[0][0] < cutoff:
+                expired.append(heapq.heappop(self.expiry))
+            for _, _, category, size in expired:
+                self.files[category] -= 1
+                self.bytes[category] -= size
+                self.deleted_files += 1
+                self.deleted_bytes += size
+
+        for _, path, _, _ in expired:
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"Error deleting expired file {path}: {e}")
+            if self.on_delete:
+                self.on_delete(path)
+        return len(expired)
+
+    def total_bytes(self) -> int:
+        """Size of the registered files that are still on disk."""
+        with self.lock:
+            return sum(self.bytes.values())
+
+    def stats(self) -> dict:
+        """Return the disk usage of the stream per category and of its filesystem."""
+        with self.lock:
+            stats = {
+                "retention_seconds": self.retention,
+                "files": dict(self.files),
+                "bytes": dict(self.bytes),
+                "total_bytes": sum(self.bytes.values()),
+                "deleted_files": self.deleted_files,
+                "deleted_bytes": self.deleted_bytes,
+            }
+        try:
+            stats["disk_free_bytes"] = shutil.disk_usage(self.base_dir).free
+        except OSError:
+            stats["disk_free_bytes"] = None
+        return stats
@@ -0,0 +1,195 @@
+# service/segment_service.py
+import os
+import threading
+from collections import OrderedDict
+
+import anyio
+from starlette.responses import Response
+
+from app.variables import SEGMENT_CACHE_SIZE_MB
+
+# Closed segments never change under their run-scoped URL, so players and CDNs may keep them for good
+SEGMENT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Unversioned segment URLs are reused when a stream restarts, so they have to be revalidated
+UNVERSIONED_CACHE_CONTROL = "no-cache"
+READ_CHUNK_SIZE = 64 * 1024
+
+
+# Strong ETag of a closed segment, derived from its inode, size and modification time
+def segment_etag(stat: os.stat_result) -> str:
+    return f'"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+class SegmentCache:
+    """
+    Small LRU of recently published segments, so the live edge is served without touching the disk.
+
+    Args:
+        max_bytes (int): Total size of the cached segments; 0 disables the cache.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, file_path: str):
+        """Return the cached (content, etag) pair of a segment, or None."""
+        with self.lock:
+            entry = self.entries.get(file_path)
+            if entry is not None:
+                self.entries.move_to_end(file_path)
+            return entry
+
+    def add_file(self, file_path: str):
+        """Load a closed segment into the cache, evicting the least recently used ones."""
+        if not self.max_bytes:
+            return
+        try:
+            with open(file_path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                content = f.read()
+        except OSError as e:
+            print(f"Error caching segment {file_path}: {e}")
+            return
+        if len(content) > self.max_bytes:
+            return
+
+        with self.lock:
+            previous = self.entries.pop(file_path, None)
+            if previous is not None:
+                self.size -= len(previous[0])
+            self.entries[file_path] = (content, segment_etag(stat))
+            self.size += len(content)
+            while self.size > self.max_bytes:
+                _, (evicted, _) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def discard(self, file_path: str):
+        """Drop a segment from the cache, e.g. once it has been deleted."""
+        with self.lock:
+            entry = self.entries.pop(file_path, None)
+            if entry is not None:
+                self.size -= len(entry[0])
+
+    def discard_directory(self, directory: str):
+        """Drop every cached segment under a directory, e.g. the files of a stopped stream."""
+        prefix = os.path.join(directory, "")
+        with self.lock:
+            for file_path in [path for path in self.entries if path.startswith(prefix)]:
+                self.size -= len(self.entries.pop(file_path)[0])
+
+
+segment_cache = SegmentCache(SEGMENT_CACHE_SIZE_MB * 1024 * 1024)
+
+
+# Parse a single "bytes=start-end" range; returns None to serve the full segment, raises ValueError if unsatisfiable
+def parse_range(range_header: str, size: int):
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in ranges:
+        return None
+    start, _, end = ranges.strip().partition("-")
+    try:
+        if start:
+            start, end = int(start), int(end) if end else size - 1
+        else:
+            start, end = size - int(end), size - 1
+    except ValueError:
+        return None
+    start, end = max(start, 0), min(end, size - 1)
+    if start > end:
+        raise ValueError(f"Range {range_header} is not satisfiable")
+    return start, end
+
+
+class SegmentFileResponse(Response):
+    """
+    Send a byte range of a segment file.
+
+    When the server supports the ASGI `http.response.zerocopysend` extension the file descriptor is handed
+    over for sendfile; otherwise the file is streamed in chunks from a worker thread.
+    """
+
+    def __init__(self, file_path: str, start: int, end: int, status_code: int, headers: dict, media_type: str):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.file_path = file_path
+        self.start = start
+        self.count = end - start + 1
+        self.headers["content-length"] = str(self.count)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.file_path, "rb") as f:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f.fileno(),
+                    "offset": self.start,
+                    "count": self.count,
+                    "more_body": False,
+                })
+            return
+
+        async with await anyio.open_file(self.file_path, "rb") as f:
+            await f.seek(self.start)
+            remaining = self.count
+            while remaining > 0:
+                chunk = await f.read(min(READ_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def serve_segment(file_path: str, media_type: str, request_headers, immutable: bool = True) -> Response:
+    """
+    Build the response for a closed segment, with immutable caching, strong ETags and Range support.
+
+    Recently published segments are answered from memory; everything else is sent from the file.
+
+    Args:
+        file_path (str): Path of the segment file; it must exist.
+        media_type (str): MIME type of the segment.
+        request_headers: Headers of the incoming request.
+        immutable (bool): Whether the URL is unique to this file; otherwise players have to revalidate it.
+    """
+    cached = segment_cache.get(file_path)
+    if cached is not None:
+        content, etag = cached
+        size = len(content)
+    else:
+        content = None
+        stat = os.stat(file_path)
+        etag = segment_etag(stat)
+        size = stat.st_size
+
+    cache_control = SEGMENT_CACHE_CONTROL if immutable else UNVERSIONED_CACHE_CONTROL
+    headers = {"Cache-Control": cache_control, "ETag": etag, "Accept-Ranges": "bytes"}
+    if request_headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    # Only honour the range if the client still has the same segment (If-Range)
+    byte_range = None
+    range_header = request_headers.get("range")
+    if range_header and request_headers.get("if-range", etag) == etag and size:
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    status_code = 200
+    start, end = 0, size - 1
+    if byte_range is not None:
+        status_code = 206
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    if content is not None:
+        return Response(content=content[start:end + 1], status_code=status_code, headers=headers, media_type=media_type)
+    return SegmentFileResponse(file_path, start, end, status_code, headers, media_type)
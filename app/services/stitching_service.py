@@ -0,0 +1,106 @@
+# service/stitching_service.py
+import re
+
+from app.services.translation_service import load_segments, split_sentences, calculate_time_intervals
+
+# Sentence-ending punctuation, optionally followed by closing quotes or brackets
+SENTENCE_END = re.compile(r"[.!?…。！？][\"'”’)\]]*$")
+
+
+# Timed segments of a transcript relative to the start of its chunk; transcripts without timestamps are
+# split into sentences spread over the chunk in proportion to their length
+def transcript_segments(transcript_file: str, duration: float) -> list:
+    if not transcript_file:
+        return []
+    segments = load_segments(transcript_file)
+    if segments:
+        return segments
+    try:
+        with open(transcript_file, "r", encoding="utf-8") as file:
+            text = file.read().strip()
+    except IOError:
+        return []
+    sentences = split_sentences(text)
+    return [
+        {"start": start, "end": end, "text": sentence}
+        for start, end, sentence in calculate_time_intervals(sentences, 0.0, duration)
+    ]
+
+
+# Join consecutive segments into one sentence spanning all of them
+def merge_segments(segments: list) -> dict:
+    return {
+        "start": segments[0]["start"],
+        "end": segments[-1]["end"],
+        "text": " ".join(segment["text"] for segment in segments),
+    }
+
+
+class SentenceStitcher:
+    """
+    Carries the unfinished last sentence of a chunk over to the next chunk, so it is translated whole.
+
+    Chunks are cut at fixed times (or at pauses), not at sentence ends. The segments of every chunk are
+    joined into sentences at sentence-ending punctuation; segments after the last one are held back and
+    prepended to the next chunk. The chunk's span ends where the held sentence starts and the next
+    chunk's span starts there, so the sentence's cue keeps its real time across the chunk boundary.
+
+    A sentence is only held while the next chunk is expected to end within `max_hold` seconds of the
+    sentence's start, which bounds the delay holding adds to its subtitle; otherwise it is published as is.
+
+    Chunks have to be stitched in order.
+
+    Args:
+        max_hold (float): Longest stretch of stream time from the start of a held sentence to the end of
+                          the chunk it is published with, in seconds.
+    """
+
+    def __init__(self, max_hold: float):
+        self.max_hold = max_hold
+        self.held = []
+
+    def stitch(self, segments: list, start: float, end: float) -> tuple:
+        """
+        Stitch the segments of the next chunk (times relative to `start`) to the sentence held from the
+        previous one. Returns the complete sentences, with times relative to the start of the returned
+        (start, end) stream time span of the chunk.
+        """
+        pending = self.held + [
+            {"start": start + segment["start"], "end": start + segment["end"], "text": segment["text"]}
+            for segment in segments
+        ]
+        span_start = self.held[0]["start"] if self.held else start
+
+        sentences = []
+        current = []
+        for segment in pending:
+            current.append(segment)
+            if SENTENCE_END.search(segment["text"]):
+                sentences.append(merge_segments(current))
+                current = []
+
+        # The next chunk is assumed to be as long as this one
+        self.held = []
+        if current and end + (end - start) - current[0]["start"] <= self.max_hold:
+            self.held = current
+            span_end = max(current[0]["start"], span_start)
+        else:
+            if current:
+                sentences.append(merge_segments(current))
+            span_end = end
+        return self.relative(sentences, span_start), (span_start, span_end)
+
+    def flush(self) -> tuple:
+        """Release the held sentence at the end of the stream, as (sentences, span) like `stitch`, or None."""
+        if not self.held:
+            return None
+        sentence = merge_segments(self.held)
+        self.held = []
+        return self.relative([sentence], sentence["start"]), (sentence["start"], sentence["end"])
+
+    @staticmethod
+    def relative(sentences: list, offset: float) -> list:
+        return [
+            {"start": max(sentence["start"] - offset, 0.0), "end": max(sentence["end"] - offset, 0.0), "text": sentence["text"]}
+            for sentence in sentences
+        ]
@@ -0,0 +1,98 @@
+# service/streaming_stt_service.py
+from typing import NamedTuple
+
+from app.services.pcm_buffer import PcmRingBuffer
+
+
+class Hypothesis(NamedTuple):
+    """Result of one pass of the streaming transcriber over its window."""
+
+    final: list     # Finalized segments ({"start", "end", "text"}, relative to `start`), empty if nothing settled
+    start: float    # Stream time of the finalized audio, in seconds
+    end: float      # Stream time the finalized audio ends at (the window moves there)
+    interim: str    # Text of the segments that may still change
+
+
+class StreamingTranscriber:
+    """
+    Continuous transcription over a sliding window of the PCM ring buffer.
+
+    Every pass transcribes the audio from the start of the window to the latest sample read. Segments
+    that end at least `stability` seconds before the end of the window are unlikely to change with
+    more audio, so they are finalized and the window moves past them; the rest is returned as the
+    interim hypothesis and transcribed again on the next pass with more context. When nothing settles
+    within `max_window` seconds, everything but the last segment is finalized (all of it when there is
+    only one), so a finalized chunk is never longer than the window. Silence is dropped from the window
+    once it is older than `stability` seconds.
+
+    Passes call `transcribe(filename, samples) -> (text, segments)` (the STT backend router) and block,
+    so they run on a worker thread. The window is only read by one pass at a time.
+
+    Args:
+        buffer (PcmRingBuffer): Ring buffer the audio is read into.
+        transcribe (callable): Blocking STT function returning the text and timed segments of the samples.
+        stability (float): Seconds of audio after a segment before it is finalized.
+        max_window (float): Longest stretch of audio transcribed in one pass, in seconds.
+    """
+
+    def __init__(self, buffer: PcmRingBuffer, transcribe, stability: float, max_window: float):
+        self.buffer = buffer
+        self.transcribe = transcribe
+        self.stability = stability
+        self.max_window = max_window
+        self.window_start = 0
+        self.passes = 0
+
+    @property
+    def window_end(self) -> int:
+        """Absolute position of the last sample the next pass can cover."""
+        return min(self.buffer.end, self.window_start + int(self.max_window * self.buffer.sample_rate))
+
+    def hypothesize(self, flush: bool = False) -> Hypothesis:
+        """Transcribe the current window; with `flush` (end of the stream) every segment is finalized."""
+        sample_rate = self.buffer.sample_rate
+        # A pass that fell behind the ring buffer skips the audio that was overwritten
+        oldest = self.buffer.end - self.buffer.capacity + sample_rate
+        if self.window_start < oldest:
+            print(f"Streaming STT fell {(oldest - self.window_start) / sample_rate:.1f}s behind, skipping audio")
+            self.window_start = oldest
+
+        start, end = self.window_start, self.window_end
+        duration = (end - start) / sample_rate
+        if end <= start:
+            return Hypothesis([], start / sample_rate, start / sample_rate, "")
+
+        self.passes += 1
+        try:
+            text, segments = self.transcribe(f"stream_{self.passes}.wav", self.buffer.view(start, end))
+        except RuntimeError as e:
+            print(f"Streaming transcription pass failed: {e}")
+            # The window is retried on the next pass, unless it cannot grow any more
+            if flush or duration >= self.max_window:
+                self.window_start = end
+            return Hypothesis([], start / sample_rate, self.window_start / sample_rate, "")
+        if segments is None:
+            segments = [{"start": 0.0, "end": duration, "text": text.strip()}] if text.strip() else []
+
+        # Segments are finalized in order, so the finalized text is always a prefix of the hypothesis
+        settled = 0
+        while settled < len(segments) and segments[settled]["end"] <= duration - self.stability:
+            settled += 1
+        if flush:
+            settled = len(segments)
+        elif not settled and segments and duration >= self.max_window:
+            settled = max(len(segments) - 1, 1)
+        final = segments[:settled]
+        interim = " ".join(segment["text"] for segment in segments[settled:])
+
+        if flush:
+            cut = duration
+        elif final:
+            cut = min(final[-1]["end"], duration)
+        elif not segments:
+            # Silence: keep only the tail, in case speech is starting
+            cut = max(duration - self.stability, 0.0)
+        else:
+            cut = 0.0
+        self.window_start = start + int(cut * sample_rate)
+        return Hypothesis(final, start / sample_rate, self.window_start / sample_rate, interim)
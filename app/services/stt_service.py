@@ -1,11 +1,23 @@
+import io
+import json
 import os
 import time
-import torch
-import whisper
+import wave
 import openai
 from groq import Groq
 from dotenv import load_dotenv
-from app.variables import SUBTITLE_OUTPUT
+from app.services.backend_router import Backend, BackendRouter
+from app.services.cache_service import content_cache, content_hash
+from app.services.pcm_buffer import AudioChunk, pcm_to_wav
+from app.services.whisper_engine import get_whisper_engine
+from app.variables import (
+    SUBTITLE_OUTPUT,
+    STT_BACKENDS,
+    STT_TIMEOUT,
+    STT_HEDGE_DELAY,
+    STT_BREAKER_FAILURES,
+    STT_BREAKER_COOLDOWN,
+)
 
 # Load the OPENAI_API_KEY from the .env file
 env_path = os.path.join(os.path.dirname(__file__), "../../.env")
@@ -13,86 +25,156 @@ load_dotenv(env_path, override=True)
 api_key = os.getenv("OPENAI_API_KEY")
 groq_api_key = os.getenv("GROQ_API_KEY")
 
-# Initialize the OpenAI client
-client = openai.OpenAI(api_key=api_key)
+# Initialize the OpenAI client; retries and fallback are left to the backend router
+client = openai.OpenAI(api_key=api_key, timeout=STT_TIMEOUT, max_retries=0)
 
 # Initialize the Groq client
 groq_client = Groq(api_key=groq_api_key)
 
-# Function to transcribe audio file with fallback to Groq after 3 OpenAI failures
-def transcribe_audio(audio_file_path: str):
-    """Transcribe a wav audio file to text and save to the file, with fallback to Groq"""
-    max_retries = 3
-    retries = 0
-    transcription_text = ""
-
+# Function to transcribe audio file through the STT backend router
+def transcribe_audio(audio_file_path: str, output_dir: str = SUBTITLE_OUTPUT):
+    """Transcribe a wav audio file to text and save to the file in `output_dir`, falling back over the STT backends. Returns the transcript path."""
     # Ensure the audio file exists
     if not os.path.exists(audio_file_path):
         print(f"Audio file does not exist: {audio_file_path}")
-        return
-
-    # Try transcribing with OpenAI API
-    while retries < max_retries:
-        try:
-            with open(audio_file_path, "rb") as audio_file:
-                transcription = client.audio.transcriptions.create(
-                    model="whisper-1", file=audio_file
-                )
-            transcription_text = transcription.text or " "
-            print("Extract text: ", transcription_text)
-            break
-        except openai.OpenAIError as e:
-            retries += 1
-            print(f"OpenAI API error (attempt {retries}) during transcription of {audio_file_path}: {e}")
-        except Exception as e:
-            retries += 1
-            print(f"Unexpected error (attempt {retries}) during transcription of {audio_file_path}: {e}")
-
-    # If OpenAI fails after retries, fallback to Groq
-    if retries == max_retries:
-        print("Falling back to Groq API for transcription.")
-        transcription_text = transcribe_audio_with_groq(audio_file_path)
+        return None
 
-    # Define the transcription file path
-    transcription_file_path = (
-        f"{SUBTITLE_OUTPUT}/{os.path.splitext(os.path.basename(audio_file_path))[0]}.txt"
+    with open(audio_file_path, "rb") as audio_file:
+        audio_data = audio_file.read()
+    return transcribe_samples(os.path.basename(audio_file_path), wav_samples(audio_data), output_dir)
+
+# Function to transcribe a chunk of PCM audio read from the ring buffer, without going through a file
+def transcribe_pcm(chunk: AudioChunk, output_dir: str = SUBTITLE_OUTPUT):
+    """Transcribe an `AudioChunk` and save the text to `audio_<index>.txt` in `output_dir`. Returns the transcript path."""
+    return transcribe_samples(f"audio_{chunk.index}.wav", chunk.samples, output_dir)
+
+# Transcribe 16 kHz mono PCM samples, served from the content cache when the same audio was transcribed before
+def transcribe_samples(filename: str, samples, output_dir: str = SUBTITLE_OUTPUT) -> str:
+    key = content_hash(",".join(STT_BACKENDS), samples)
+    cached = content_cache.get("transcript", key)
+    if cached is not None:
+        print(f"Transcript of {filename} served from the cache")
+        return save_transcript(filename, cached["text"], cached["segments"], output_dir)
+
+    try:
+        transcription_text, segments = stt_router.call(filename, samples)
+        print("Extract text: ", transcription_text)
+    except RuntimeError as e:
+        print(f"Transcription of {filename} failed: {e}")
+        transcription_text, segments = "", None
+    # Failed transcriptions come back empty and are not cached
+    if transcription_text.strip():
+        content_cache.set("transcript", key, {"text": transcription_text, "segments": segments})
+    return save_transcript(filename, transcription_text, segments, output_dir)
+
+# The PCM samples of a WAV file, so a chunk hashes the same whether it came from a file or the pipe
+def wav_samples(audio_data: bytes) -> bytes:
+    try:
+        with wave.open(io.BytesIO(audio_data), "rb") as wav_file:
+            return wav_file.readframes(wav_file.getnframes())
+    except (wave.Error, EOFError):
+        return audio_data
+
+# STT backends: each one transcribes (filename, PCM samples) into (text, segments) and raises on failure
+def transcribe_with_openai(filename: str, samples) -> tuple:
+    transcription = client.audio.transcriptions.create(
+        model="whisper-1",
+        file=(filename, pcm_to_wav(samples)),
+        response_format="verbose_json",
+        timestamp_granularities=["segment"],
+    )
+    return transcription.text or " ", timed_segments(getattr(transcription, "segments", None))
+
+def transcribe_with_groq(filename: str, samples) -> tuple:
+    transcription = groq_client.audio.transcriptions.create(
+        file=(filename, pcm_to_wav(samples)),
+        model="whisper-large-v3-turbo",
+        response_format="verbose_json",
+        timeout=STT_TIMEOUT,
     )
+    return transcription.text or " ", timed_segments(getattr(transcription, "segments", None))
 
-    # Save the transcription to a .txt file
-    with open(transcription_file_path, "w", encoding="utf-8") as txt_file:
+def transcribe_with_local_whisper(filename: str, samples) -> tuple:
+    # The local engine reads the samples straight from the ring buffer
+    result = get_whisper_engine().transcribe(samples)
+    return result["text"] or " ", timed_segments(result["segments"])
+
+STT_BACKEND_FUNCTIONS = {
+    "openai": transcribe_with_openai,
+    "groq": transcribe_with_groq,
+    "local": transcribe_with_local_whisper,
+}
+
+# Router over the configured backends, in order of preference
+stt_router = BackendRouter(
+    "stt",
+    [
+        Backend(name, STT_BACKEND_FUNCTIONS[name], STT_BREAKER_FAILURES, STT_BREAKER_COOLDOWN)
+        for name in STT_BACKENDS
+    ],
+    hedge_delay=STT_HEDGE_DELAY,
+)
+
+# Normalize the timed segments of a verbose transcription to a list of {"start", "end", "text"} dicts
+def timed_segments(segments) -> list:
+    if not segments:
+        return None
+    normalized = []
+    for segment in segments:
+        fields = segment if isinstance(segment, dict) else vars(segment)
+        text = (fields.get("text") or "").strip()
+        if text:
+            normalized.append({"start": float(fields["start"]), "end": float(fields["end"]), "text": text})
+    return normalized or None
+
+# Path of the segment timestamps saved next to a transcript
+def segments_file_path(transcription_file_path: str) -> str:
+    return f"{os.path.splitext(transcription_file_path)[0]}.json"
+
+# Save the transcript of an audio file to `<name>.txt` in `output_dir` and return its path.
+# The timed segments, relative to the start of the audio, are saved next to it in `<name>.json`.
+def save_transcript(filename: str, transcription_text: str, segments: list = None, output_dir: str = SUBTITLE_OUTPUT) -> str:
+    # Define the transcription file path
+    transcription_file_path = f"{output_dir}/{os.path.splitext(filename)[0]}.txt"
+
+    # The segments are written first, so they are in place once the transcript appears
+    if segments:
+        segments_path = segments_file_path(transcription_file_path)
+        with open(f"{segments_path}.tmp", "w", encoding="utf-8") as json_file:
+            json.dump(segments, json_file, ensure_ascii=False)
+        os.replace(f"{segments_path}.tmp", segments_path)
+
+    # Save the transcription to a .txt file, renaming it into place so readers never see a partial file
+    temp_file_path = f"{transcription_file_path}.tmp"
+    with open(temp_file_path, "w", encoding="utf-8") as txt_file:
         txt_file.write(transcription_text.strip())
+    os.replace(temp_file_path, transcription_file_path)
+    return transcription_file_path
 
 # Additional functions to support the STT services for other use cases
 # Function to transcribe an audio file using Groq API with the whisper large model
 def transcribe_audio_with_groq(audio_file: str) -> str:
     try:
         with open(audio_file, "rb") as file:
-            transcription = groq_client.audio.transcriptions.create(
-                file=(audio_file, file.read()),
-                model="whisper-large-v3-turbo",
-                response_format="verbose_json",
-            )
+            audio_data = file.read()
+    except OSError as e:
+        print(f"An error occurred: {e}")
+        return ""
+    try:
+        transcription = groq_client.audio.transcriptions.create(
+            file=(audio_file, audio_data),
+            model="whisper-large-v3-turbo",
+            response_format="verbose_json",
+        )
         return transcription.text
     except Exception as e:
         print(f"An error occurred: {e}")
         return ""
     
-# Function to transcribe an audio file using Whisper model running locally
+# Function to transcribe an audio file using Whisper model running locally; the model is loaded once and kept warm
 def transcribe_audio_with_whisper_local(audio_file: str) -> str:
     try:
-        # Check for CUDA availability, otherwise fallback to CPU
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        print(f"Using device: {device}")
-
-        # Load the Whisper large model - turbo version is optimized for speed
-        model = whisper.load_model("turbo", device=device)
-
-        # Perform transcription
-        if(device == "cpu"):
-            result = model.transcribe(audio_file, fp16=False)
-        else:
-            result = model.transcribe(audio_file, fp16=True)
-        return result["text"]
+        return get_whisper_engine().transcribe_file(audio_file)["text"]
     except Exception as e:
         print(f"An error occurred: {e}")
         return ""
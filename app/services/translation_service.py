@@ -1,11 +1,11 @@
-import glob
+import asyncio
+import json
 import re
 import os
-import re
-import requests
-import json
 from dotenv import load_dotenv
-from app.variables import PLAYLIST_OUTPUT, TRANSLATION_OUTPUT, CHUNK_DURATION
+from app.services.cache_service import content_cache, content_hash
+from app.services.xl8_client import XL8Batcher, XL8Client
+from app.variables import TRANSLATION_OUTPUT, CHUNK_DURATION, TARGET_LANGUAGES, TRANSLATION_BATCH_SIZE, TRANSLATION_BATCH_LATENCY
 
 # Load the XL8_API_KEY from the .env file
 env_path = os.path.join(os.path.dirname(__file__), "../../.env")
@@ -15,83 +15,128 @@ api_key = os.getenv("XL8_API_KEY")
 if not api_key:
     raise ValueError("API key not found. Please check your .env file.")
 
+# Shared client of the server's event loop, so every chunk reuses the same keep-alive connections, with
+# optional batching of chunks that are waiting for translation at the same time; created on first use
+xl8_client = None
+xl8_batcher = None
+
+
+def get_translator():
+    """Return the XL8 batcher, or the client without batching, creating them on the running event loop."""
+    global xl8_client, xl8_batcher
+    if xl8_client is None:
+        xl8_client = XL8Client(api_key)
+        if TRANSLATION_BATCH_SIZE > 1:
+            xl8_batcher = XL8Batcher(xl8_client, TRANSLATION_BATCH_SIZE, TRANSLATION_BATCH_LATENCY)
+    return xl8_batcher or xl8_client
+
 
-def translate_text(
+async def close_translator():
+    """Close the connections of the XL8 client; the next translation opens a new one."""
+    global xl8_client, xl8_batcher
+    if xl8_client is not None:
+        client, xl8_client, xl8_batcher = xl8_client, None, None
+        await client.aclose()
+
+
+async def translate_text(
     input_text: str,
     source_language: str = "ko",
-    target_languages: list = ["vi", "th"],
+    target_languages: list = TARGET_LANGUAGES,
     formality: str = "HAEYO",
 ) -> dict:
     """
     Translates text into one or more target languages using the XL8 API.
+    All target languages are requested concurrently over the pooled XL8 client. With TRANSLATION_BATCH_SIZE
+    above 1, chunks translated at the same time are sent together in one request per language.
 
     Args:
         input_text (str): The text to translate.
         source_language (str): The source language code (default is "ko").
-        target_languages (list): A list of target language codes.
+        target_languages (list): A list of target language codes (default: TARGET_LANGUAGES).
         formality (str): Formality level for translation ("HAEYO" or others).
 
     Returns:
         dict: A dictionary with target languages as keys and their translations as values.
     """
-    url = "https://api.xl8.ai/v1/trans/request/rt"
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-    translations = {}
-
-    for target_language in target_languages:
-        # Prepare the request payload
-        data = {
-            "source_language": source_language,
-            "target_language": target_language,
-            "sentences": [input_text],
-            "options": {"formality": [formality]},
-        }
+    translations = await translate_sentences([input_text], source_language, target_languages, formality)
+    return {language: sentences[0] for language, sentences in translations.items()}
 
-        try:
-            # Send the POST request
-            response = requests.post(url, headers=headers, data=json.dumps(data))
-            response.raise_for_status()  # Raise HTTPError for bad responses (4xx and 5xx)
-
-            # Process the response
-            response_data = response.json()
-            translated_sentences = response_data.get("sentences", [])
-            if translated_sentences:
-                translations[target_language] = translated_sentences[
-                    0
-                ]  # Fetch the first translated sentence
-            else:
-                print(f"Warning: No translation found for {target_language}")
-                translations[target_language] = ""
-        except requests.exceptions.RequestException as e:
-            print(f"Error while translating to {target_language}: {e}")
-            translations[target_language] = ""
 
-    return translations
+# Cached translations of every sentence key, None where a sentence was never translated
+def lookup_translations(keys: dict) -> dict:
+    return {language: [content_cache.get("translation", key) for key in language_keys] for language, language_keys in keys.items()}
+
 
-  
-def generate_subtitle_playlist(language: str):
-    """Generate .m3u8 playlist for translated subtitles."""
-    subtitle_file = f"{PLAYLIST_OUTPUT}/{language}_sub.m3u8"
-
-    subtitle_files = sorted(
-        glob.glob(f"{TRANSLATION_OUTPUT}/{language}/audio_*.vtt"),
-        key=os.path.getctime,
-    )
-    m3u8_content = "#EXTM3U\n"
-    m3u8_content += "#EXT-X-PLAYLIST-TYPE:VOD\n"
-    m3u8_content += f"#EXT-X-TARGETDURATION:{CHUNK_DURATION}\n"
-    m3u8_content += f"#EXT-X-VERSION:3\n"
-    m3u8_content += "#EXT-X-MEDIA-SEQUENCE:0\n\n"
-
-    for file in subtitle_files:
-        filename = os.path.basename(file)
-        m3u8_content += (
-            f"#EXTINF:{CHUNK_DURATION},\n/api/v1/streaming/{language}/{filename}\n"
+# Store new translations in the content cache
+def store_translations(entries: list):
+    for key, translation in entries:
+        content_cache.set("translation", key, translation)
+
+
+async def translate_sentences(
+    sentences: list,
+    source_language: str = "ko",
+    target_languages: list = TARGET_LANGUAGES,
+    formality: str = "HAEYO",
+) -> dict:
+    """
+    Translates a list of sentences into one or more target languages, keeping one translation per sentence.
+    Sentences translated before are served from the content cache; only the others are sent to XL8, awaited
+    on the running event loop. The SQLite cache is read and written on a worker thread.
+
+    Returns:
+        dict: Target languages mapped to the list of translated sentences, in the same order.
+    """
+    keys = {
+        language: [content_hash(sentence, source_language, language, formality) for sentence in sentences]
+        for language in target_languages
+    }
+    translations = await asyncio.to_thread(lookup_translations, keys)
+
+    # One request for every sentence that is missing in at least one language
+    missing_languages = [language for language in target_languages if None in translations[language]]
+    missing = sorted({i for language in missing_languages for i, value in enumerate(translations[language]) if value is None})
+    if missing:
+        results = await get_translator().translate_segments(
+            [sentences[i] for i in missing], source_language, missing_languages, formality
         )
+        entries = []
+        for language in missing_languages:
+            for i, translation in zip(missing, results[language]):
+                if translations[language][i] is None:
+                    translations[language][i] = translation
+                    # Failed translations come back empty and are not cached
+                    if translation:
+                        entries.append((keys[language][i], translation))
+        if entries:
+            await asyncio.to_thread(store_translations, entries)
+    return translations
 
-    with open(subtitle_file, "w") as f:
-        f.write(m3u8_content)
-    print(f"Updated {language} subtitle m3u8 file with {len(subtitle_files)} chunks.")
+
+# Load the timed segments saved next to a transcript by the STT service, if any
+def load_segments(input_file: str) -> list:
+    segments_file = f"{os.path.splitext(input_file)[0]}.json"
+    try:
+        with open(segments_file, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (IOError, ValueError):
+        return None
+
+
+# Read a transcript and its timed segments, if any
+def read_transcript(input_file: str) -> tuple:
+    with open(input_file, "r", encoding="utf-8") as file:
+        input_text = file.read().strip()
+    return input_text, load_segments(input_file)
+
+
+# Write a subtitle file; subtitle segments are served as immutable, so only the complete file is renamed into place
+def write_subtitles(output_file: str, vtt_content: str):
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    with open(f"{output_file}.tmp", "w", encoding="utf-8") as file:
+        file.write(vtt_content)
+    os.replace(f"{output_file}.tmp", output_file)
 
 
 def split_sentences(text, lang="default"):
@@ -143,6 +188,21 @@ def calculate_time_intervals(sentences, start_time_offset, chunk_duration):
     return time_intervals
 
 
+def segment_time_intervals(segments, translations, start_time_offset, chunk_duration):
+    """
+    Place the translation of every STT segment at the segment's own time, offset by the chunk start.
+    Times are kept inside the chunk, and segments without a translation are left out.
+    """
+    time_intervals = []
+    for segment, sentence in zip(segments, translations):
+        if not sentence:
+            continue
+        start = min(max(segment["start"], 0.0), chunk_duration)
+        end = min(max(segment["end"], start), chunk_duration)
+        time_intervals.append((start_time_offset + start, start_time_offset + end, sentence))
+    return time_intervals
+
+
 def format_time(seconds):
     """Format time in H:MM:SS.mmm format."""
     hours = int(seconds // 3600)
@@ -151,34 +211,56 @@ def format_time(seconds):
     return f"{hours:02d}:{minutes:02d}:{secs:06.3f}"
 
 
-def translate_file(
+async def translate_file(
     input_file: str,
     source_language: str = "ko",
-    target_languages: list = ["vi", "th"],
+    target_languages: list = TARGET_LANGUAGES,
     formality: str = "HAEYO",
-) -> None:
+    output_dir: str = TRANSLATION_OUTPUT,
+    start_time: float = None,
+    duration: float = None,
+) -> dict:
     """
     Translates the content of a text file and saves the translations to .vtt files.
 
+    When the STT service saved timed segments next to the transcript, every segment is translated on
+    its own and its cue uses the real start and end time from STT. Otherwise the translation is split
+    into sentences spread over the chunk in proportion to their length. The files are read and written on
+    a worker thread.
+
     Args:
         input_file (str): Path to the input text file.
         source_language (str): The source language code (default is "ko").
-        target_languages (list): A list of target language codes.
+        target_languages (list): A list of target language codes (default: TARGET_LANGUAGES).
         formality (str): Formality level for translation ("HAEYO" or others).
+        output_dir (str): Directory of the .vtt files, with one sub folder per language.
+        start_time (float): Offset of the chunk in the stream in seconds (default: index * CHUNK_DURATION).
+        duration (float): Duration of the chunk in seconds (default: CHUNK_DURATION).
+
+    Returns:
+        dict: Target languages mapped to the .vtt file written for them, ready to publish.
     """
+    output_files = {}
     try:
-        with open(input_file, "r", encoding="utf-8") as file:
-            input_text = file.read().strip()
+        input_text, segments = await asyncio.to_thread(read_transcript, input_file)
     except IOError as e:
         print(f"Error reading from file {input_file}: {e}")
-        return
-
-    translations = translate_text(
-        input_text,
-        source_language=source_language,
-        target_languages=target_languages,
-        formality=formality,
-    )
+        return output_files
+
+    if segments:
+        translations = await translate_sentences(
+            [segment["text"] for segment in segments],
+            source_language=source_language,
+            target_languages=target_languages,
+            formality=formality,
+        )
+    else:
+        translations = await translate_text(
+            input_text,
+            source_language=source_language,
+            target_languages=target_languages,
+            formality=formality,
+        )
 
     # export the translation to its corresponding file
     for lang, translation in translations.items():
@@ -192,10 +274,13 @@ def translate_file(
             index = 0  # Default to 0 if parsing fails
 
         # Calculate start and end times
-        start_time_offset = index * CHUNK_DURATION
-        chunk_duration = CHUNK_DURATION
-        sentences = split_sentences(translation, lang=lang)
-        time_intervals = calculate_time_intervals(sentences, start_time_offset, chunk_duration)
+        start_time_offset = index * CHUNK_DURATION if start_time is None else start_time
+        chunk_duration = CHUNK_DURATION if duration is None else duration
+        if segments:
+            time_intervals = segment_time_intervals(segments, translation, start_time_offset, chunk_duration)
+        else:
+            sentences = split_sentences(translation, lang=lang)
+            time_intervals = calculate_time_intervals(sentences, start_time_offset, chunk_duration)
 
         vtt_content = "WEBVTT\n\n"
         for start, end, sentence in time_intervals:
@@ -203,17 +288,14 @@ def translate_file(
             vtt_content += f"{sentence}\n\n"
 
         output_file = os.path.join(
-            TRANSLATION_OUTPUT,
+            output_dir,
             f"{lang}/{base_name}.vtt"
         )
-        os.makedirs(os.path.dirname(output_file), exist_ok=True)
         try:
-            with open(output_file, "w", encoding="utf-8") as file:
-                file.write(vtt_content)
+            await asyncio.to_thread(write_subtitles, output_file, vtt_content)
             print(f"Translation saved to {output_file}")
+            output_files[lang] = output_file
         except IOError as e:
             print(f"Error writing to file {output_file}: {e}")
 
-    # update the subtitle playlist
-    for lang in target_languages:
-        generate_subtitle_playlist(language=lang)
+    return output_files
@@ -0,0 +1,151 @@
+# service/vad_service.py
+import asyncio
+
+import numpy as np
+
+from app.services.pcm_buffer import AudioChunk, PcmRingBuffer
+from app.variables import VAD_THRESHOLD_DB, VAD_MIN_PAUSE, VAD_MAX_SILENCE, VAD_MIN_SPEECH
+
+# Length of the frames the energy is measured on, in seconds
+FRAME_DURATION = 0.03
+# Audio kept before the first and after the last speech frame of a segment, in seconds
+SPEECH_PADDING = 0.2
+
+
+# Loudness of a frame of int16 samples in dBFS
+def frame_energy(samples: np.ndarray) -> float:
+    rms = np.sqrt(np.mean(np.square(samples, dtype=np.float64)))
+    return 20 * np.log10(max(rms, 1.0) / 32768.0)
+
+
+class VoiceActivitySegmenter:
+    """
+    Energy-based voice activity detection that turns PCM audio into speech segments for STT.
+
+    The audio is measured in 30 ms frames; frames louder than `threshold_db` are speech. Silence longer
+    than `max_silence` closes the current segment and is skipped, so it never reaches the STT API. A
+    segment that reaches `target_duration` is cut at the next pause of at least `min_pause`; if none comes
+    before `max_duration`, it is cut at the quietest frame of its second half, so words are not split.
+    Segments with less than `min_speech` seconds of speech are dropped.
+
+    Args:
+        sample_rate (int): Sample rate of the audio.
+        target_duration (float): Preferred segment length in seconds.
+        max_duration (float): Maximum segment length in seconds.
+        threshold_db (float): Loudness above which a frame is speech, in dBFS.
+        min_pause (float): Shortest silence a segment is cut at once it is long enough, in seconds.
+        max_silence (float): Silence that always ends a segment, in seconds.
+        min_speech (float): Shortest amount of speech worth transcribing, in seconds.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        target_duration: float,
+        max_duration: float = None,
+        threshold_db: float = VAD_THRESHOLD_DB,
+        min_pause: float = VAD_MIN_PAUSE,
+        max_silence: float = VAD_MAX_SILENCE,
+        min_speech: float = VAD_MIN_SPEECH,
+    ):
+        self.frame_samples = int(FRAME_DURATION * sample_rate)
+        self.padding = int(SPEECH_PADDING * sample_rate)
+        self.target_samples = int(target_duration * sample_rate)
+        self.max_samples = int((max_duration or target_duration * 1.5) * sample_rate)
+        self.threshold_db = threshold_db
+        self.min_pause_frames = max(1, int(min_pause / FRAME_DURATION))
+        self.max_silence_frames = max(1, int(max_silence / FRAME_DURATION))
+        self.min_speech_frames = max(1, int(min_speech / FRAME_DURATION))
+
+        self.segment_start = None   # Start of the open segment, None while in silence
+        self.speech_end = 0         # End of the last speech frame
+        self.silent_frames = 0      # Silent frames since the last speech frame
+        self.frames = []            # (end, energy) of the frames of the open segment
+        self.last_end = 0           # End of the last emitted segment
+
+    def process_frame(self, end: int, samples: np.ndarray):
+        """
+        Classify the frame ending at absolute sample `end`.
+
+        Returns:
+            tuple: (start, end) of a segment that is complete, or None.
+        """
+        energy = frame_energy(samples)
+        is_speech = energy > self.threshold_db
+
+        if self.segment_start is None:
+            if not is_speech:
+                return None
+            frame_start = end - len(samples)
+            self.segment_start = max(self.last_end, frame_start - self.padding)
+            self.frames = []
+
+        self.frames.append((end, energy))
+        if is_speech:
+            self.silent_frames = 0
+            self.speech_end = end
+        else:
+            self.silent_frames += 1
+
+        length = end - self.segment_start
+        if self.silent_frames >= self.max_silence_frames:
+            # Long silence: the segment ends shortly after the last speech and the rest is skipped
+            return self.close(min(self.speech_end + self.padding, end), reopen=False)
+        if length >= self.target_samples and self.silent_frames >= self.min_pause_frames:
+            # Long enough and in a pause: cut in the middle of the pause
+            return self.close(end - self.silent_frames * self.frame_samples // 2, reopen=True)
+        if length >= self.max_samples:
+            # No pause came: cut at the quietest frame of the second half, the latest one on a tie
+            half = self.segment_start + self.target_samples // 2
+            candidates = [frame for frame in self.frames if frame[0] >= half] or self.frames
+            return self.close(min(reversed(candidates), key=lambda frame: frame[1])[0], reopen=True)
+        return None
+
+    def close(self, cut: int, reopen: bool):
+        segment = (self.segment_start, cut)
+        speech_frames = sum(1 for frame_end, energy in self.frames if frame_end <= cut and energy > self.threshold_db)
+
+        # Frames after the cut start the next segment if they contain speech
+        remaining = [frame for frame in self.frames if frame[0] > cut]
+        self.last_end = cut
+        if reopen and any(energy > self.threshold_db for _, energy in remaining):
+            self.segment_start = cut
+            self.frames = remaining
+        else:
+            self.segment_start = None
+            self.frames = []
+            self.silent_frames = 0
+
+        if speech_frames < self.min_speech_frames:
+            return None
+        return segment
+
+    def flush(self, end: int):
+        """Close the open segment at the end of the stream."""
+        if self.segment_start is None:
+            return None
+        return self.close(min(self.speech_end + self.padding, end), reopen=False)
+
+
+# Cut the PCM output of FFmpeg into speech segments, skipping silence
+async def read_speech_segments(stream: asyncio.StreamReader, buffer: PcmRingBuffer, chunk_duration: float):
+    segmenter = VoiceActivitySegmenter(buffer.sample_rate, chunk_duration)
+    frame_samples = segmenter.frame_samples
+    index = 0
+    frame_end = frame_samples
+
+    while await buffer.fill_from(stream, frame_end):
+        if buffer.end < frame_end:
+            continue
+        samples = np.frombuffer(buffer.view(frame_end - frame_samples, frame_end), dtype=np.int16)
+        segment = segmenter.process_frame(frame_end, samples)
+        if segment is not None:
+            start, end = segment
+            yield AudioChunk(index, start / buffer.sample_rate, buffer.view(start, end))
+            index += 1
+        frame_end += frame_samples
+
+    segment = segmenter.flush(buffer.end)
+    if segment is not None:
+        start, end = segment
+        yield AudioChunk(index, start / buffer.sample_rate, buffer.view(start, end))
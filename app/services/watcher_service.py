@@ -0,0 +1,58 @@
+# service/watcher_service.py
+import os
+import re
+from watchfiles import awatch, Change
+
+
+# Extract the sequence number from a segment filename (e.g. "audio_12.wav" -> 12)
+def segment_index(file_path: str) -> int:
+    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    try:
+        return int(base_name.rsplit("_", 1)[1])
+    except (IndexError, ValueError):
+        return -1
+
+
+async def watch_segments(directory: str, prefix: str, extension: str, stop_event=None):
+    """
+    Yield segment files (e.g. `video_N.ts`) from a directory as soon as they appear, in sequence order.
+
+    The directory is watched with inotify (through watchfiles), so only files created since the last
+    event are looked at and the cost per event does not depend on how many segments are already on disk.
+    Files that already exist when the watcher starts are yielded first. Only the last sequence number
+    yielded is remembered, so memory stays constant however long the stream runs.
+
+    Args:
+        directory (str): Directory to watch.
+        prefix (str): Segment filename prefix, e.g. "audio".
+        extension (str): Segment file extension including the dot, e.g. ".wav".
+        stop_event (asyncio.Event): Optional event that ends the generator when set, once the watch
+                                    thread has exited (cancelling the consuming task does not wait for it).
+    """
+    pattern = re.compile(rf"^{re.escape(prefix)}_\d+{re.escape(extension)}$")
+    os.makedirs(directory, exist_ok=True)
+    directory = os.path.abspath(directory)
+    last_index = -1
+
+    def is_segment(change: Change, path: str) -> bool:
+        return change == Change.added and bool(pattern.match(os.path.basename(path)))
+
+    scanned = False
+    async for changes in awatch(
+        directory, watch_filter=is_segment, stop_event=stop_event, rust_timeout=1000, yield_on_timeout=True
+    ):
+        new_files = {path for _, path in changes}
+
+        # The first iteration runs once the watcher is active, so scanning here cannot miss a file
+        if not scanned:
+            scanned = True
+            new_files.update(
+                os.path.join(directory, name) for name in os.listdir(directory) if pattern.match(name)
+            )
+
+        for file in sorted(new_files, key=segment_index):
+            # Segments are created in order, so anything at or below the last one was already yielded
+            if segment_index(file) <= last_index:
+                continue
+            last_index = segment_index(file)
+            yield file
@@ -0,0 +1,161 @@
+# service/whisper_engine.py
+import queue
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+import torch
+import whisper
+
+from app.variables import WHISPER_MODEL, WHISPER_BATCH_SIZE, WHISPER_THREADS, WHISPER_LANGUAGE
+
+# Resolution of Whisper's timestamp tokens, in seconds
+TIME_PRECISION = 0.02
+
+
+class LocalWhisperEngine:
+    """
+    Long-lived local Whisper model that transcribes queued audio in batches.
+
+    The model is loaded once and kept warm. A single worker thread owns it: it takes every request
+    queued while the previous batch was running (up to `max_batch_size`), pads each one to Whisper's
+    30-second window and decodes all of them in one forward pass. Callers block on their own result, so
+    the STT worker pool submitting chunks concurrently is what fills the batches.
+
+    Args:
+        model_name (str): Whisper model to load, e.g. "turbo" or "small".
+        device (str): Torch device; defaults to CUDA when available, otherwise CPU.
+        max_batch_size (int): Maximum number of chunks decoded together.
+        num_threads (int): Torch CPU threads (0 keeps the torch default).
+        language (str): Spoken language, or None to detect it for every chunk.
+    """
+
+    def __init__(
+        self,
+        model_name: str = WHISPER_MODEL,
+        device: str = None,
+        max_batch_size: int = WHISPER_BATCH_SIZE,
+        num_threads: int = WHISPER_THREADS,
+        language: str = WHISPER_LANGUAGE,
+    ):
+        self.model_name = model_name
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.max_batch_size = max(1, max_batch_size)
+        self.num_threads = num_threads
+        self.language = language or None
+        self.model = None
+        self.requests = queue.Queue()
+        self.thread = None
+
+    def start(self):
+        """Load the model and start the worker thread."""
+        if self.num_threads > 0:
+            torch.set_num_threads(self.num_threads)
+        print(f"Loading Whisper model {self.model_name} on {self.device}")
+        self.model = whisper.load_model(self.model_name, device=self.device)
+        self.thread = threading.Thread(target=self.run, name="whisper-engine", daemon=True)
+        self.thread.start()
+
+    def transcribe(self, audio) -> dict:
+        """
+        Transcribe 16 kHz mono audio (int16 samples, e.g. a ring buffer memoryview, or float32 in [-1, 1]).
+
+        Returns:
+            dict: The "text" and its timed "segments" ({"start", "end", "text"}, in seconds from the start of the audio).
+        """
+        future = Future()
+        self.requests.put((to_float_audio(audio), future))
+        return future.result()
+
+    def transcribe_file(self, audio_file: str) -> dict:
+        """Transcribe an audio file of any format FFmpeg can read."""
+        return self.transcribe(whisper.load_audio(audio_file))
+
+    def run(self):
+        while True:
+            batch = [self.requests.get()]
+            # Everything that queued up during the previous batch goes into this one
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self.requests.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                results = self.decode([audio for audio, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def decode(self, batch: list) -> list:
+        fp16 = self.device != "cpu"
+        # Audio longer than one window cannot share a padded batch; it goes through the sliding-window transcribe
+        long_audio = {i for i, audio in enumerate(batch) if len(audio) > whisper.audio.N_SAMPLES}
+        outputs = {i: self.model.transcribe(batch[i], fp16=fp16, language=self.language) for i in long_audio}
+
+        short_indices = [i for i in range(len(batch)) if i not in long_audio]
+        if short_indices:
+            mels = torch.stack([
+                whisper.log_mel_spectrogram(
+                    whisper.pad_or_trim(torch.from_numpy(batch[i])), n_mels=self.model.dims.n_mels
+                )
+                for i in short_indices
+            ]).to(self.device)
+            options = whisper.DecodingOptions(language=self.language, fp16=fp16)
+            with torch.no_grad():
+                results = whisper.decode(self.model, mels, options)
+            if len(short_indices) > 1:
+                print(f"Transcribed a batch of {len(short_indices)} chunks locally")
+            for i, result in zip(short_indices, results):
+                duration = len(batch[i]) / whisper.audio.SAMPLE_RATE
+                outputs[i] = {"text": result.text, "segments": self.timed_segments(result, duration)}
+        return [outputs[i] for i in range(len(batch))]
+
+    def timed_segments(self, result, duration: float) -> list:
+        """Split decoded tokens into segments at Whisper's timestamp tokens (`<|0.00|> text <|2.40|>`)."""
+        tokenizer = whisper.tokenizer.get_tokenizer(
+            self.model.is_multilingual, num_languages=self.model.num_languages, language=result.language, task="transcribe"
+        )
+        segments = []
+        start = None
+        text_tokens = []
+        for token in result.tokens:
+            if token < tokenizer.timestamp_begin:
+                text_tokens.append(token)
+                continue
+            time = min((token - tokenizer.timestamp_begin) * TIME_PRECISION, duration)
+            if start is not None and text_tokens:
+                segments.append({"start": start, "end": time, "text": tokenizer.decode(text_tokens).strip()})
+                text_tokens = []
+                start = None
+            else:
+                start = time
+        # Text after the last timestamp runs to the end of the audio
+        if text_tokens:
+            segments.append({"start": start or 0.0, "end": duration, "text": tokenizer.decode(text_tokens).strip()})
+        return [segment for segment in segments if segment["text"]]
+
+
+# Convert PCM samples to the float32 waveform Whisper expects
+def to_float_audio(audio) -> np.ndarray:
+    if isinstance(audio, np.ndarray) and audio.dtype == np.float32:
+        return audio
+    return np.frombuffer(audio, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+# Engine shared by every stream, loaded on first use
+engine = None
+engine_lock = threading.Lock()
+
+
+def get_whisper_engine() -> LocalWhisperEngine:
+    """Return the shared local Whisper engine, loading the model on first use."""
+    global engine
+    with engine_lock:
+        if engine is None:
+            engine = LocalWhisperEngine()
+            engine.start()
+        return engine
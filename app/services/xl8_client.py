@@ -0,0 +1,211 @@
+# service/xl8_client.py
+import asyncio
+import random
+import time
+
+import httpx
+
+from app.services.metrics_service import observe_api_request
+from app.variables import XL8_API_URL, XL8_TIMEOUT, XL8_MAX_RETRIES, XL8_MAX_CONNECTIONS
+
+
+class XL8Client:
+    """
+    Asynchronous XL8 translation client.
+
+    A single `httpx.AsyncClient` keeps pooled keep-alive connections to the API, so requests after the
+    first one skip the TCP and TLS handshakes. All target languages of a chunk are requested concurrently,
+    so translating a chunk takes as long as the slowest language instead of the sum of all of them.
+
+    Args:
+        api_key (str): XL8 API key.
+        url (str): Real-time translation endpoint.
+        timeout (float): Timeout of a single request in seconds.
+        max_retries (int): Number of retries after a failed request.
+        backoff (float): Base delay of the exponential backoff between retries, in seconds.
+        max_connections (int): Size of the connection pool.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        url: str = XL8_API_URL,
+        timeout: float = XL8_TIMEOUT,
+        max_retries: int = XL8_MAX_RETRIES,
+        backoff: float = 0.5,
+        max_connections: int = XL8_MAX_CONNECTIONS,
+    ):
+        self.url = url
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.client = httpx.AsyncClient(
+            headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 5.0)),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def translate_sentences(
+        self, sentences: list, source_language: str, target_language: str, formality: str
+    ) -> list:
+        """
+        Translate a list of sentences into one target language, retrying with exponential backoff.
+
+        Returns:
+            list: The translated sentences, in the same order.
+        """
+        data = {
+            "source_language": source_language,
+            "target_language": target_language,
+            "sentences": sentences,
+            "options": {"formality": [formality]},
+        }
+
+        for attempt in range(self.max_retries + 1):
+            start = time.monotonic()
+            try:
+                response = await self.client.post(self.url, json=data)
+            except httpx.TransportError as e:
+                observe_api_request("translation", "xl8", time.monotonic() - start, success=False)
+                error = e
+            else:
+                observe_api_request("translation", "xl8", time.monotonic() - start, success=response.status_code < 400)
+                # Rate limits and server errors are worth another try, other client errors are not
+                if response.status_code != 429 and response.status_code < 500:
+                    response.raise_for_status()
+                    return response.json().get("sentences", [])
+                error = httpx.HTTPStatusError(
+                    f"XL8 returned status {response.status_code}", request=response.request, response=response
+                )
+
+            if attempt < self.max_retries:
+                delay = self.backoff * 2 ** attempt
+                print(f"XL8 request to {target_language} failed ({error}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay * (1 + random.random() * 0.1))
+        raise error
+
+    async def translate(self, input_text: str, source_language: str, target_languages: list, formality: str) -> dict:
+        """
+        Translate a text into all target languages concurrently.
+
+        Returns:
+            dict: Target languages mapped to their translation ("" when a language failed).
+        """
+        translations = await self.translate_segments([input_text], source_language, target_languages, formality)
+        return {language: sentences[0] for language, sentences in translations.items()}
+
+    async def translate_segments(
+        self, sentences: list, source_language: str, target_languages: list, formality: str
+    ) -> dict:
+        """
+        Translate a list of sentences into all target languages concurrently, one request per language.
+
+        Returns:
+            dict: Target languages mapped to the list of translated sentences, in the same order
+                  ("" for every sentence of a language that failed).
+        """
+
+        async def translate_one(target_language: str) -> list:
+            try:
+                translated_sentences = await self.translate_sentences(
+                    sentences, source_language, target_language, formality
+                )
+            except (httpx.HTTPError, ValueError) as e:
+                print(f"Error while translating to {target_language}: {e}")
+                return [""] * len(sentences)
+            return fit_translations(translated_sentences, len(sentences), target_language)
+
+        results = await asyncio.gather(*(translate_one(language) for language in target_languages))
+        return dict(zip(target_languages, results))
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class XL8Batcher:
+    """
+    Combine the pending translation requests of several chunks into one XL8 request per language.
+
+    A request goes out right away when nothing is in flight, so a pipeline that keeps up pays no extra
+    latency. When chunks pile up behind an in-flight request, they are collected and sent together as
+    soon as the batch is full, the oldest one has waited `max_latency` seconds, or the previous batch is
+    done. The XL8 `sentences` list carries the sentences of every chunk, and the responses are split
+    back per chunk.
+
+    All methods run on the event loop of the client.
+
+    Args:
+        client (XL8Client): Client used to send the batches.
+        max_batch_size (int): Maximum number of chunks per request.
+        max_latency (float): Maximum time a chunk waits for its batch to fill, in seconds.
+    """
+
+    def __init__(self, client: XL8Client, max_batch_size: int, max_latency: float):
+        self.client = client
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.pending = {}
+        self.in_flight = {}
+        self.timers = {}
+
+    async def translate(self, input_text: str, source_language: str, target_languages: list, formality: str) -> dict:
+        """Queue a text for the next batch and wait for its translations (same result as XL8Client.translate)."""
+        translations = await self.translate_segments([input_text], source_language, target_languages, formality)
+        return {language: sentences[0] for language, sentences in translations.items()}
+
+    async def translate_segments(
+        self, sentences: list, source_language: str, target_languages: list, formality: str
+    ) -> dict:
+        """Queue sentences for the next batch and wait for their translations (same result as XL8Client.translate_segments)."""
+        key = (source_language, tuple(target_languages), formality)
+        future = asyncio.get_running_loop().create_future()
+        batch = self.pending.setdefault(key, [])
+        batch.append((list(sentences), future))
+
+        if len(batch) >= self.max_batch_size or not self.in_flight.get(key):
+            self.flush(key)
+        elif key not in self.timers:
+            self.timers[key] = asyncio.get_running_loop().call_later(self.max_latency, self.flush, key)
+        return await future
+
+    def flush(self, key: tuple):
+        timer = self.timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self.pending.pop(key, [])
+        if batch:
+            self.in_flight[key] = self.in_flight.get(key, 0) + 1
+            asyncio.ensure_future(self.send(key, batch))
+
+    async def send(self, key: tuple, batch: list):
+        source_language, target_languages, formality = key
+        # The sentences of all chunks go out in one list and are split back by position
+        texts = [text for sentences, _ in batch for text in sentences]
+        if len(batch) > 1:
+            print(f"Translating a batch of {len(batch)} chunks")
+
+        try:
+            results = await self.client.translate_segments(texts, source_language, list(target_languages), formality)
+            offset = 0
+            for sentences, future in batch:
+                if not future.done():
+                    future.set_result(
+                        {language: results[language][offset:offset + len(sentences)] for language in target_languages}
+                    )
+                offset += len(sentences)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self.in_flight[key] -= 1
+            # Chunks that queued up behind this batch go out now instead of waiting for their timer
+            if self.pending.get(key) and not self.in_flight[key]:
+                self.flush(key)
+
+
+# Match the translated sentences to the number of sentences sent, padding missing ones with ""
+def fit_translations(translated_sentences: list, count: int, target_language: str) -> list:
+    if len(translated_sentences) != count:
+        print(f"Warning: Expected {count} translations for {target_language}, got {len(translated_sentences)}")
+    return (list(translated_sentences) + [""] * count)[:count]
+
@@ -13,8 +13,87 @@ PLAYLIST_FILE = f"{PLAYLIST_OUTPUT}/playlist.m3u8"
 MEDIA_DIR = os.getenv("MEDIA_DIR")
 LIVESTREAM_OUTPUT = f"{MEDIA_DIR}/index.m3u8"
 
-VIET_WEBVTT_FILE = os.path.join(PLAYLIST_OUTPUT, "viet_sub.m3u8")
-THAI_WEBVTT_FILE = os.path.join(PLAYLIST_OUTPUT, "thai_sub.m3u8")
+# Subtitle languages of a stream that does not choose its own (language codes)
+TARGET_LANGUAGES = [code.strip() for code in os.getenv("TARGET_LANGUAGES", "vi,th").split(",") if code.strip()]
 
 # Configurable chunk duration in seconds
 CHUNK_DURATION = int(os.getenv("CHUNK_DURATION"))
+
+# Low-Latency HLS: fMP4 video announced in parts of LL_HLS_PART_DURATION seconds, with preload hints
+LL_HLS = os.getenv("LL_HLS", "false").lower() == "true"
+LL_HLS_PART_DURATION = float(os.getenv("LL_HLS_PART_DURATION", "0.5"))
+# Longest keyframe interval of the source in seconds; LL-HLS segments end on the first keyframe after
+# CHUNK_DURATION, so the target duration leaves room for it
+LL_HLS_KEYFRAME_INTERVAL = float(os.getenv("LL_HLS_KEYFRAME_INTERVAL", "2"))
+
+# Number of segments listed in the live playlists (0 keeps every segment)
+PLAYLIST_WINDOW_SIZE = int(os.getenv("PLAYLIST_WINDOW_SIZE", "0"))
+
+# Seconds of the stream kept on disk and listed in the live playlists (DVR depth, 0 keeps everything);
+# expired files stay one more window so players holding an older playlist can still fetch them
+RETENTION_SECONDS = int(os.getenv("RETENTION_SECONDS", "0"))
+
+# Memory used to keep recently published segments for serving (0 disables the cache)
+SEGMENT_CACHE_SIZE_MB = int(os.getenv("SEGMENT_CACHE_SIZE_MB", "0"))
+
+# Number of chunks transcribed and translated concurrently
+STT_CONCURRENCY = int(os.getenv("STT_CONCURRENCY", "4"))
+TRANSLATION_CONCURRENCY = int(os.getenv("TRANSLATION_CONCURRENCY", "4"))
+# Seconds a shutting-down server waits for chunks already in the pipeline to be published
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "30"))
+
+# XL8 translation API
+XL8_API_URL = os.getenv("XL8_API_URL", "https://api.xl8.ai/v1/trans/request/rt")
+XL8_TIMEOUT = float(os.getenv("XL8_TIMEOUT", "10"))
+XL8_MAX_RETRIES = int(os.getenv("XL8_MAX_RETRIES", "3"))
+XL8_MAX_CONNECTIONS = int(os.getenv("XL8_MAX_CONNECTIONS", "20"))
+
+# Translation batching when chunks pile up: maximum chunks per request (1 disables it) and maximum wait in seconds
+TRANSLATION_BATCH_SIZE = int(os.getenv("TRANSLATION_BATCH_SIZE", "1"))
+TRANSLATION_BATCH_LATENCY = float(os.getenv("TRANSLATION_BATCH_LATENCY", "1.0"))
+
+# Read the STT audio as raw PCM from FFmpeg's stdout into memory instead of WAV files on disk
+AUDIO_PIPE = os.getenv("AUDIO_PIPE", "false").lower() == "true"
+# Also write the piped audio chunks to WAV files
+PERSIST_AUDIO = os.getenv("PERSIST_AUDIO", "false").lower() == "true"
+# Seconds of piped audio kept in memory (raised automatically to cover the chunks waiting for STT)
+PCM_BUFFER_SECONDS = int(os.getenv("PCM_BUFFER_SECONDS", "120"))
+
+# Speech-to-text backends in order of preference: "openai", "groq" and "local" (Whisper running on this machine)
+STT_BACKENDS = [name.strip() for name in os.getenv("STT_BACKENDS", "openai,groq").split(",") if name.strip()]
+# Timeout of a single STT call, delay before a hedged call until a backend's p95 latency is known,
+# and consecutive failures that open a backend's circuit breaker for the cooldown in seconds
+STT_TIMEOUT = float(os.getenv("STT_TIMEOUT", "30"))
+STT_HEDGE_DELAY = float(os.getenv("STT_HEDGE_DELAY", "5"))
+STT_BREAKER_FAILURES = int(os.getenv("STT_BREAKER_FAILURES", "5"))
+STT_BREAKER_COOLDOWN = float(os.getenv("STT_BREAKER_COOLDOWN", "30"))
+# Local Whisper: model, maximum chunks decoded together, torch CPU threads (0 keeps the default) and spoken language
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "turbo")
+WHISPER_BATCH_SIZE = int(os.getenv("WHISPER_BATCH_SIZE", "4"))
+WHISPER_THREADS = int(os.getenv("WHISPER_THREADS", "0"))
+WHISPER_LANGUAGE = os.getenv("WHISPER_LANGUAGE", "ko")
+
+# Voice activity detection on the piped audio: skip silence and cut STT segments at pauses (requires AUDIO_PIPE)
+VAD_ENABLED = os.getenv("VAD_ENABLED", "false").lower() == "true"
+# Loudness above which audio counts as speech (dBFS), shortest pause a segment is cut at, silence that
+# always ends a segment and shortest speech worth transcribing, in seconds
+VAD_THRESHOLD_DB = float(os.getenv("VAD_THRESHOLD_DB", "-40"))
+VAD_MIN_PAUSE = float(os.getenv("VAD_MIN_PAUSE", "0.2"))
+VAD_MAX_SILENCE = float(os.getenv("VAD_MAX_SILENCE", "1.0"))
+VAD_MIN_SPEECH = float(os.getenv("VAD_MIN_SPEECH", "0.3"))
+
+# Streaming STT on the piped audio: re-transcribe a sliding window every STREAMING_STT_INTERVAL seconds and
+# finalize the sentences that ended STREAMING_STT_STABILITY seconds before its end (requires AUDIO_PIPE,
+# replaces chunking and VAD); STREAMING_STT_MAX_WINDOW bounds the audio transcribed in one pass
+STREAMING_STT = os.getenv("STREAMING_STT", "false").lower() == "true"
+STREAMING_STT_INTERVAL = float(os.getenv("STREAMING_STT_INTERVAL", "1.0"))
+STREAMING_STT_STABILITY = float(os.getenv("STREAMING_STT_STABILITY", "1.0"))
+STREAMING_STT_MAX_WINDOW = float(os.getenv("STREAMING_STT_MAX_WINDOW", "8"))
+
+# Seconds of stream time an unfinished sentence at the end of a chunk may be held back to be translated
+# together with the next chunk, counted from its start to the end of that chunk (0 disables stitching)
+STITCH_MAX_HOLD = float(os.getenv("STITCH_MAX_HOLD", "0"))
+
+# Persistent cache of transcripts and translations keyed by a hash of their input (size 0 disables it)
+CONTENT_CACHE_PATH = os.getenv("CONTENT_CACHE_PATH", f"{MEDIA_DIR}/cache/content.sqlite3")
+CONTENT_CACHE_SIZE_MB = int(os.getenv("CONTENT_CACHE_SIZE_MB", "0"))
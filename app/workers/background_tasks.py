@@ -0,0 +1,99 @@
+# workers/background_tasks.py
+import asyncio
+
+
+class OrderedStage:
+    """
+    Stage of the asyncio pipeline that processes chunks concurrently and passes results on in sequence order.
+
+    `concurrency` worker tasks take `(sequence, item)` pairs from the input queue and await
+    `worker(sequence, item)`. Results that finish early are held back until every earlier sequence number
+    is done, then put on the output queue in order, so a slow call delays the next stage for later chunks
+    but not their processing.
+
+    At most `max_pending` items are taken from the input queue and not yet passed on. When the limit is
+    reached, or the output queue is full, the workers stop taking items and the input queue fills up, so
+    backpressure travels upstream to the producer. An input item is marked done (`task_done`) once its
+    result is on the output queue, so `input_queue.join()` waits for the stage to drain.
+
+    Every sequence number from `start_sequence` on has to be queued exactly once; a job that has nothing
+    to do should return None rather than being skipped. A producer that cannot queue a job without waiting
+    may drop it with `skip`, which passes None on in its place.
+
+    Args:
+        name (str): Name of the stage, used for task names and logs.
+        worker (callable): Coroutine function called with (sequence, item); its return value is the result.
+        input_queue (asyncio.Queue): Queue of (sequence, item) pairs.
+        output_queue (asyncio.Queue): Queue receiving (sequence, result) pairs in sequence order.
+        concurrency (int): Number of items processed concurrently.
+        max_pending (int): Number of items taken from the input queue but not yet passed on.
+        start_sequence (int): Sequence number of the first chunk.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        worker,
+        input_queue: asyncio.Queue,
+        output_queue: asyncio.Queue,
+        concurrency: int,
+        max_pending: int = None,
+        start_sequence: int = 0,
+    ):
+        self.name = name
+        self.worker = worker
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.concurrency = concurrency
+        self.max_pending = max_pending or concurrency * 4
+        self.slots = asyncio.Semaphore(self.max_pending)
+        self.release_lock = asyncio.Lock()
+        self.results = {}
+        self.skipped = set()
+        self.next_sequence = start_sequence
+        self.pending = 0
+        self.tasks = []
+
+    def start(self) -> list:
+        """Start the worker tasks on the running event loop and return them."""
+        self.tasks = [asyncio.create_task(self.work(), name=f"{self.name}-{i}") for i in range(self.concurrency)]
+        return self.tasks
+
+    async def work(self):
+        while True:
+            await self.slots.acquire()
+            sequence, item = await self.input_queue.get()
+            self.pending += 1
+            try:
+                result = await self.worker(sequence, item)
+            except Exception as e:
+                print(f"{self.name} worker error on chunk {sequence}: {e}")
+                result = None
+            self.results[sequence] = result
+            await self.release()
+
+    async def skip(self, sequence: int):
+        """Pass None on for a sequence number instead of queuing its job, once every earlier result is out."""
+        self.skipped.add(sequence)
+        self.results[sequence] = None
+        await self.release()
+
+    async def release(self):
+        # One worker at a time passes results on, so they leave the stage strictly in order
+        async with self.release_lock:
+            while self.next_sequence in self.results:
+                sequence = self.next_sequence
+                await self.output_queue.put((sequence, self.results.pop(sequence)))
+                self.next_sequence += 1
+                # Skipped sequence numbers never went through the input queue
+                if sequence in self.skipped:
+                    self.skipped.discard(sequence)
+                    continue
+                self.pending -= 1
+                self.input_queue.task_done()
+                self.slots.release()
+
+    def cancel(self):
+        """Cancel the worker tasks; items in flight are dropped."""
+        for task in self.tasks:
+            task.cancel()
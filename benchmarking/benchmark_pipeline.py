@@ -0,0 +1,391 @@
+"""
+End-to-end latency and throughput benchmark of the live subtitle pipeline, without any external service.
+
+The benchmark:
+1. Publishes a live HLS test stream generated by FFmpeg (`testsrc2` video and a `sine` tone) and serves it
+   over a local HTTP server.
+2. Starts the mock STT and translation APIs (`mock_services.py`) with the configured latency and
+   failure distributions, and points the OpenAI, Groq and XL8 clients at them.
+3. Feeds the stream through `process_stream` (plus `start_stream` for every extra stream), waits for a
+   warm-up period and measures for `--duration` seconds.
+4. Reports the glass-to-subtitle lag percentiles, the chunks published per second and the CPU and
+   memory used per stream (the server process shared between the streams, plus each stream's FFmpeg).
+5. Compares the results with a baseline and exits with status 1 when one of them regressed by more than
+   `--tolerance`.
+
+Pipeline settings (`AUDIO_PIPE`, `VAD_ENABLED`, `STT_CONCURRENCY`, ...) are read from the environment as usual.
+They are recorded with the results together with the CPU count, and results are only compared with a baseline
+recorded with the same ones.
+
+Usage (from the repository root):
+    python benchmarking/benchmark_pipeline.py --streams 2 --duration 60
+    python benchmarking/benchmark_pipeline.py --update-baseline
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import psutil
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarking", "results")
+
+# Results where a higher value is a regression, and where a lower value is
+LOWER_IS_BETTER = ["lag_p50", "lag_p95", "lag_max", "cpu_percent_per_stream", "memory_mb_per_stream"]
+HIGHER_IS_BETTER = ["chunks_per_second"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the live subtitle pipeline")
+    parser.add_argument("--streams", type=int, default=1, help="Number of streams processed at the same time")
+    parser.add_argument("--duration", type=float, default=60, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=15, help="Seconds before the measurement starts")
+    parser.add_argument("--chunk-duration", type=int, default=2, help="CHUNK_DURATION of the pipeline")
+    parser.add_argument("--stt-latency", type=float, default=0.8, help="Median latency of the mock STT API")
+    parser.add_argument("--stt-sigma", type=float, default=0.3, help="Log-normal spread of the STT latency")
+    parser.add_argument("--stt-failure-rate", type=float, default=0.0)
+    parser.add_argument("--translation-latency", type=float, default=0.3, help="Median latency of the mock XL8 API")
+    parser.add_argument("--translation-sigma", type=float, default=0.3)
+    parser.add_argument("--translation-failure-rate", type=float, default=0.0)
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "pipeline_benchmark.json"))
+    parser.add_argument("--baseline", default=os.path.join(RESULTS_DIR, "pipeline_baseline.json"))
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression against the baseline")
+    parser.add_argument("--update-baseline", action="store_true", help="Save the results as the new baseline")
+    return parser.parse_args()
+
+
+# A free TCP port on the loopback interface
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# Wait until an HTTP server accepts connections
+def wait_for_port(port: int, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nothing is listening on port {port}")
+
+
+def start_test_stream(source_dir: str, port: int) -> list:
+    """Publish a live HLS test stream from FFmpeg's lavfi sources and serve it on `port`."""
+    publisher = subprocess.Popen(
+        [
+            "ffmpeg", "-hide_banner", "-loglevel", "error",
+            # Produce both sources in real time, like a live channel
+            "-re", "-f", "lavfi", "-i", "testsrc2=size=640x360:rate=25",
+            "-re", "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=48000",
+            "-c:v", "libx264", "-preset", "veryfast", "-tune", "zerolatency", "-pix_fmt", "yuv420p",
+            "-g", "25",                                        # One keyframe per second, so every chunk length can be cut
+            "-c:a", "aac", "-b:a", "96k",
+            "-f", "hls", "-hls_time", "1", "-hls_list_size", "10", "-hls_segment_type", "fmp4",
+            "-hls_flags", "delete_segments+temp_file",
+            os.path.join(source_dir, "live.m3u8"),
+        ],
+        stdin=subprocess.DEVNULL,
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "http.server", str(port), "--bind", "127.0.0.1", "--directory", source_dir],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    wait_for_port(port)
+    # Let a few segments build up, as on a live channel
+    deadline = time.monotonic() + 15
+    while not os.path.exists(os.path.join(source_dir, "live.m3u8")) and time.monotonic() < deadline:
+        time.sleep(0.2)
+    time.sleep(3)
+    return [publisher, server]
+
+
+def start_mock_services(args, port: int) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [
+            sys.executable, os.path.join(REPO_ROOT, "benchmarking", "mock_services.py"),
+            "--port", str(port),
+            "--stt-latency", str(args.stt_latency),
+            "--stt-sigma", str(args.stt_sigma),
+            "--stt-failure-rate", str(args.stt_failure_rate),
+            "--translation-latency", str(args.translation_latency),
+            "--translation-sigma", str(args.translation_sigma),
+            "--translation-failure-rate", str(args.translation_failure_rate),
+        ]
+    )
+    wait_for_port(port)
+    return process
+
+
+def configure_pipeline(args, media_dir: str, mock_url: str):
+    """Point the pipeline at the mock services; must run before the app modules are imported."""
+    os.environ.update({
+        "OPENAI_API_KEY": "benchmark",
+        "GROQ_API_KEY": "benchmark",
+        "XL8_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": f"{mock_url}/v1",
+        "GROQ_BASE_URL": mock_url,
+        "XL8_API_URL": f"{mock_url}/xl8",
+        "MEDIA_DIR": media_dir,
+        "AUDIO_OUTPUT": os.path.join(media_dir, "audio"),
+        "VIDEO_OUTPUT": os.path.join(media_dir, "chunks"),
+        "SUBTITLE_OUTPUT": os.path.join(media_dir, "subtitles"),
+        "TRANSLATION_OUTPUT": os.path.join(media_dir, "translations"),
+        "PLAYLIST_OUTPUT": os.path.join(media_dir, "playlists"),
+        "CHUNK_DURATION": str(args.chunk_duration),
+        # Every chunk must reach the mock APIs, not the content cache
+        "CONTENT_CACHE_SIZE_MB": "0",
+    })
+    os.environ.setdefault("STT_BACKENDS", "openai,groq")
+    sys.path.insert(0, REPO_ROOT)
+
+
+# Percentile of a list of values, or None when it is empty
+def percentile(values: list, fraction: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class ResourceSampler:
+    """CPU time and memory of the server process and of the FFmpeg processes of every stream."""
+
+    def __init__(self, streams: list):
+        self.streams = streams
+        self.server = psutil.Process()
+        self.memory = {"server": [], **{stream.stream_id: [] for stream in streams}}
+        self.cpu_start = self.cpu_times()
+
+    def stream_processes(self, stream) -> list:
+        try:
+            return [psutil.Process(stream.process.pid)] if stream.process else []
+        except psutil.NoSuchProcess:
+            return []
+
+    def cpu_times(self) -> dict:
+        def total(process):
+            try:
+                times = process.cpu_times()
+                return times.user + times.system
+            except psutil.NoSuchProcess:
+                return 0.0
+
+        times = {"server": total(self.server)}
+        for stream in self.streams:
+            times[stream.stream_id] = sum(total(process) for process in self.stream_processes(stream))
+        return times
+
+    def sample_memory(self):
+        self.memory["server"].append(self.server.memory_info().rss)
+        for stream in self.streams:
+            rss = 0
+            for process in self.stream_processes(stream):
+                try:
+                    rss += process.memory_info().rss
+                except psutil.NoSuchProcess:
+                    pass
+            self.memory[stream.stream_id].append(rss)
+
+    def results(self, elapsed: float) -> dict:
+        cpu_end = self.cpu_times()
+        cpu = {name: (cpu_end[name] - self.cpu_start[name]) / elapsed * 100 for name in cpu_end}
+        memory = {name: sum(samples) / len(samples) / 2**20 if samples else 0.0 for name, samples in self.memory.items()}
+        # The server process is shared: every stream is charged an equal part of it
+        count = len(self.streams)
+        per_stream = {
+            stream.stream_id: {
+                "cpu_percent": cpu["server"] / count + cpu[stream.stream_id],
+                "memory_mb": memory["server"] / count + memory[stream.stream_id],
+            }
+            for stream in self.streams
+        }
+        return {"server": {"cpu_percent": cpu["server"], "memory_mb": memory["server"]}, "streams": per_stream}
+
+
+def recent_chunks(stream) -> list:
+    with stream.metrics.lock:
+        return list(stream.metrics.recent)
+
+
+async def run_benchmark(args, live_stream_service, source_url: str) -> dict:
+    from app import variables
+
+    await live_stream_service.process_stream(source_url)
+    streams = [live_stream_service.get_stream(live_stream_service.DEFAULT_STREAM_ID)]
+    streams += [await live_stream_service.start_stream(source_url, f"bench-{i}") for i in range(1, args.streams)]
+    try:
+        print(f"Warming up for {args.warmup:.0f}s")
+        await asyncio.sleep(args.warmup)
+
+        # Chunks published during the warm-up are not measured
+        seen = {stream.stream_id: {chunk["sequence"] for chunk in recent_chunks(stream)} for stream in streams}
+        measured = {stream.stream_id: [] for stream in streams}
+        sampler = ResourceSampler(streams)
+        start = time.monotonic()
+        print(f"Measuring for {args.duration:.0f}s")
+        while time.monotonic() - start < args.duration:
+            await asyncio.sleep(1)
+            sampler.sample_memory()
+            for stream in streams:
+                for chunk in recent_chunks(stream):
+                    if chunk["sequence"] not in seen[stream.stream_id]:
+                        seen[stream.stream_id].add(chunk["sequence"])
+                        measured[stream.stream_id].append(chunk)
+        elapsed = time.monotonic() - start
+        resources = sampler.results(elapsed)
+    finally:
+        for stream in streams:
+            await live_stream_service.stop_stream(stream.stream_id)
+
+    chunks = [chunk for stream_chunks in measured.values() for chunk in stream_chunks]
+    lags = [chunk["glass_to_subtitle"] for chunk in chunks if "glass_to_subtitle" in chunk]
+    stages = {}
+    for stage in ["stt_queue", "stt", "translation_queue", "translation", "total"]:
+        values = [chunk[stage] for chunk in chunks if stage in chunk]
+        stages[stage] = {"p50": percentile(values, 0.5), "p95": percentile(values, 0.95)}
+
+    per_stream = resources["streams"]
+    return {
+        "config": {
+            "streams": args.streams,
+            "chunk_duration": args.chunk_duration,
+            "stt_latency": args.stt_latency,
+            "stt_sigma": args.stt_sigma,
+            "stt_failure_rate": args.stt_failure_rate,
+            "translation_latency": args.translation_latency,
+            "translation_sigma": args.translation_sigma,
+            "translation_failure_rate": args.translation_failure_rate,
+            # Pipeline settings that change the results, as the pipeline read them
+            "audio_pipe": variables.AUDIO_PIPE,
+            "vad_enabled": variables.VAD_ENABLED,
+            "streaming_stt": variables.STREAMING_STT,
+            "ll_hls": variables.LL_HLS,
+            "stt_concurrency": variables.STT_CONCURRENCY,
+            "translation_batch_size": variables.TRANSLATION_BATCH_SIZE,
+            "target_languages": variables.TARGET_LANGUAGES,
+            "stitch_max_hold": variables.STITCH_MAX_HOLD,
+            "cpu_count": os.cpu_count(),
+        },
+        "measured_seconds": elapsed,
+        "chunks": len(chunks),
+        "chunks_without_subtitles": len(chunks) - len(lags),
+        "chunks_per_second": len(chunks) / elapsed,
+        "lag_p50": percentile(lags, 0.5),
+        "lag_p95": percentile(lags, 0.95),
+        "lag_max": max(lags) if lags else None,
+        "cpu_percent_per_stream": sum(s["cpu_percent"] for s in per_stream.values()) / len(per_stream),
+        "memory_mb_per_stream": sum(s["memory_mb"] for s in per_stream.values()) / len(per_stream),
+        "stage_seconds": stages,
+        "resources": resources,
+        "machine": {"cpu_count": os.cpu_count(), "platform": sys.platform},
+    }
+
+
+def print_report(results: dict):
+    def seconds(value):
+        return "-" if value is None else f"{value:.2f}s"
+
+    print("\nPipeline benchmark results")
+    print(f"  Streams:                   {results['config']['streams']}")
+    print(f"  Chunks published:          {results['chunks']} ({results['chunks_without_subtitles']} without subtitles)")
+    print(f"  Chunks per second:         {results['chunks_per_second']:.2f}")
+    print(f"  Subtitle lag p50/p95/max:  {seconds(results['lag_p50'])} / {seconds(results['lag_p95'])} / {seconds(results['lag_max'])}")
+    for stage, values in results["stage_seconds"].items():
+        print(f"    {stage:<22}  p50 {seconds(values['p50'])}  p95 {seconds(values['p95'])}")
+    print(f"  CPU per stream:            {results['cpu_percent_per_stream']:.1f}%")
+    print(f"  Memory per stream:         {results['memory_mb_per_stream']:.1f} MB")
+
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    """Return the regressions of `results` against `baseline`, as readable messages."""
+    # Results of another configuration or machine size are not comparable
+    differences = [
+        f"{key}: {baseline['config'].get(key)!r} in the baseline, {value!r} now"
+        for key, value in results["config"].items()
+        if baseline["config"].get(key) != value
+    ]
+    if differences:
+        return ["baseline was recorded with a different configuration"] + differences
+
+    regressions = []
+    for key in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+        current, reference = results.get(key), baseline.get(key)
+        if reference is None:
+            continue
+        if current is None:
+            regressions.append(f"{key}: no value (baseline {reference:.3f})")
+            continue
+        if key in LOWER_IS_BETTER and current > reference * (1 + tolerance):
+            regressions.append(f"{key}: {current:.3f} > {reference:.3f} + {tolerance:.0%}")
+        if key in HIGHER_IS_BETTER and current < reference * (1 - tolerance):
+            regressions.append(f"{key}: {current:.3f} < {reference:.3f} - {tolerance:.0%}")
+    if results["chunks_without_subtitles"] > baseline["chunks_without_subtitles"]:
+        regressions.append(
+            f"chunks_without_subtitles: {results['chunks_without_subtitles']} > {baseline['chunks_without_subtitles']}"
+        )
+    return regressions
+
+
+def main():
+    args = parse_args()
+    work_dir = tempfile.mkdtemp(prefix="pipeline-benchmark-")
+    source_dir = os.path.join(work_dir, "source")
+    os.makedirs(source_dir)
+    processes = []
+    try:
+        source_port, mock_port = free_port(), free_port()
+        processes += start_test_stream(source_dir, source_port)
+        processes.append(start_mock_services(args, mock_port))
+        configure_pipeline(args, os.path.join(work_dir, "media"), f"http://127.0.0.1:{mock_port}")
+
+        from app.services import live_stream_service
+
+        # The pipeline runs on an event loop, as it does in the server
+        results = asyncio.run(run_benchmark(args, live_stream_service, f"http://127.0.0.1:{source_port}/live.m3u8"))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_report(results)
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=4)
+    print(f"\nResults saved to {args.output}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=4)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to record one")
+        return
+    with open(args.baseline, encoding="utf-8") as file:
+        baseline = json.load(file)
+    regressions = compare_with_baseline(results, baseline, args.tolerance)
+    if regressions:
+        print("\nRegressions against the baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("\nNo regression against the baseline")
+
+
+if __name__ == "__main__":
+    main()
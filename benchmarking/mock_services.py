@@ -0,0 +1,114 @@
+"""
+Local stand-ins for the STT and translation APIs used by the pipeline benchmark.
+
+One HTTP server answers:
+- OpenAI and Groq transcription requests (any path ending in `/audio/transcriptions`) with a
+  `verbose_json` transcript whose segments fit the duration of the uploaded audio.
+- XL8 real-time translation requests (any other POST) by tagging every sentence with its target language.
+
+Every request waits for a latency drawn from a log-normal distribution (median and sigma per service)
+and fails with HTTP 500 at the configured rate, so the benchmark can reproduce slow or flaky providers.
+
+Usage:
+    python benchmarking/mock_services.py --port 8766 --stt-latency 0.8 --stt-failure-rate 0.05
+"""
+import argparse
+import itertools
+import json
+import math
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Bytes per second of the 16 kHz mono 16-bit audio the pipeline uploads
+PCM_BYTES_PER_SECOND = 32000
+
+
+class ServiceProfile:
+    """Latency (log-normal around `median`, spread `sigma`) and failure rate of a mocked service."""
+
+    def __init__(self, median: float, sigma: float, failure_rate: float):
+        self.median = median
+        self.sigma = sigma
+        self.failure_rate = failure_rate
+
+    def wait(self) -> bool:
+        """Sleep for one request's latency; returns False if the request should fail."""
+        if self.median > 0:
+            time.sleep(random.lognormvariate(math.log(self.median), self.sigma))
+        return random.random() >= self.failure_rate
+
+
+def make_handler(stt: ServiceProfile, translation: ServiceProfile):
+    counter = itertools.count()
+
+    class MockHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("content-length", 0)))
+            if self.path.rstrip("/").endswith("/audio/transcriptions"):
+                ok, result = stt.wait(), self.transcription(len(body))
+            else:
+                ok, result = translation.wait(), self.translation(body)
+            if not ok:
+                self.respond(500, {"error": {"message": "Mock service failure"}})
+            else:
+                self.respond(200, result)
+
+        def transcription(self, size: int) -> dict:
+            # Two sentences spread over the audio; the counter keeps every transcript unique
+            duration = max(size / PCM_BYTES_PER_SECOND, 0.5)
+            number = next(counter)
+            first, second = f"벤치마크 문장 {number}번입니다.", "두번째 문장입니다."
+            return {
+                "text": f"{first} {second}",
+                "duration": duration,
+                "segments": [
+                    {"id": 0, "start": round(duration * 0.1, 2), "end": round(duration * 0.5, 2), "text": f" {first}"},
+                    {"id": 1, "start": round(duration * 0.55, 2), "end": round(duration * 0.95, 2), "text": f" {second}"},
+                ],
+            }
+
+        def translation(self, body: bytes) -> dict:
+            request = json.loads(body or b"{}")
+            language = request.get("target_language", "")
+            return {"sentences": [f"[{language}] {sentence}" for sentence in request.get("sentences", [])]}
+
+        def respond(self, status: int, payload: dict):
+            content = json.dumps(payload, ensure_ascii=False).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MockHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock STT and translation APIs for the pipeline benchmark")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--stt-latency", type=float, default=0.8, help="Median STT latency in seconds")
+    parser.add_argument("--stt-sigma", type=float, default=0.3, help="Log-normal spread of the STT latency")
+    parser.add_argument("--stt-failure-rate", type=float, default=0.0)
+    parser.add_argument("--translation-latency", type=float, default=0.3, help="Median XL8 latency in seconds")
+    parser.add_argument("--translation-sigma", type=float, default=0.3)
+    parser.add_argument("--translation-failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    handler = make_handler(
+        ServiceProfile(args.stt_latency, args.stt_sigma, args.stt_failure_rate),
+        ServiceProfile(args.translation_latency, args.translation_sigma, args.translation_failure_rate),
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), handler)
+    server.daemon_threads = True
+    print(f"Mock STT and translation services listening on http://127.0.0.1:{args.port}", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+# tests/conftest.py
+import os
+import sys
+
+# The app reads its settings from the environment when it is imported; tests need no .env file
+os.environ.setdefault("CHUNK_DURATION", "10")
+for key in ("OPENAI_API_KEY", "GROQ_API_KEY", "XL8_API_KEY"):
+    os.environ.setdefault(key, "test")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
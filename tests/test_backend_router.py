@@ -0,0 +1,86 @@
+# tests/test_backend_router.py
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services.backend_router import Backend, BackendRouter, StubBackend
+
+
+# Stub that counts its calls
+class CountingStub(StubBackend):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = 0
+
+    def __call__(self, *args):
+        self.calls += 1
+        return super().__call__(*args)
+
+
+def make_router(*stubs, hedge_delay: float = 0.1, **backend_options) -> BackendRouter:
+    backends = [Backend(f"backend-{i}", stub, **backend_options) for i, stub in enumerate(stubs)]
+    return BackendRouter("test", backends, hedge_delay, max_workers=4)
+
+
+def test_healthy_primary_answers_alone():
+    primary, secondary = CountingStub("primary", latency=(0.01, 0.01)), CountingStub("secondary")
+    router = make_router(primary, secondary)
+    assert router.call("audio") == "primary"
+    assert (primary.calls, secondary.calls) == (1, 0)
+
+
+def test_slow_primary_is_hedged():
+    primary, secondary = CountingStub("primary", latency=(1.0, 1.0)), CountingStub("secondary", latency=(0.01, 0.01))
+    router = make_router(primary, secondary, hedge_delay=0.1)
+    start = time.monotonic()
+    assert router.call("audio") == "secondary"
+    assert time.monotonic() - start < 0.5
+
+
+def test_failure_falls_over_without_waiting_for_the_hedge():
+    router = make_router(StubBackend("primary", failure_rate=1.0), StubBackend("secondary"), hedge_delay=5.0)
+    start = time.monotonic()
+    assert router.call("audio") == "secondary"
+    assert time.monotonic() - start < 1.0
+
+
+def test_all_backends_failing_raises():
+    router = make_router(StubBackend("primary", failure_rate=1.0), StubBackend("secondary", failure_rate=1.0))
+    with pytest.raises(RuntimeError):
+        router.call("audio")
+
+
+def test_breaker_skips_a_failing_backend_until_the_cooldown_ends():
+    primary, secondary = CountingStub("primary", failure_rate=1.0), CountingStub("secondary")
+    router = make_router(primary, secondary, failure_threshold=2, cooldown=0.2)
+    for _ in range(2):
+        assert router.call("audio") == "secondary"
+    assert router.stats()["backend-0"]["state"] == "open"
+
+    # The open circuit is skipped
+    assert router.call("audio") == "secondary"
+    assert primary.calls == 2
+
+    # After the cooldown a single trial call closes the circuit again
+    time.sleep(0.25)
+    primary.failure_rate = 0.0
+    assert router.call("audio") == "primary"
+    assert router.stats()["backend-0"]["state"] == "closed"
+
+
+def test_resize_gives_every_backend_a_thread_per_request():
+    router = make_router(StubBackend("primary"), StubBackend("secondary"))
+    router.resize(3)
+    assert router.max_workers == 6
+    assert router.call("audio") == "primary"
+
+
+def test_hedge_delay_counts_from_the_start_of_the_call():
+    primary, secondary = CountingStub("primary", latency=(0.3, 0.3)), CountingStub("secondary")
+    router = BackendRouter("test", [Backend("primary", primary), Backend("secondary", secondary)], 0.5, max_workers=1)
+    # The second call waits 0.3 s for the only thread, which does not count towards its hedging delay
+    with ThreadPoolExecutor(max_workers=2) as requests:
+        results = list(requests.map(router.call, ["first", "second"]))
+    assert results == ["primary", "primary"]
+    assert secondary.calls == 0
@@ -0,0 +1,62 @@
+# tests/test_hls_playlist.py
+import asyncio
+import threading
+
+from app.services.playlist_service import HLSPlaylist
+
+
+def uris(playlist: HLSPlaylist) -> list:
+    content, _ = playlist.snapshot()
+    return [line for line in content.decode().splitlines() if line.endswith(".ts")]
+
+
+def test_unbounded_playlist_keeps_every_segment(tmp_path):
+    playlist = HLSPlaylist(str(tmp_path / "playlist.m3u8"), 10, playlist_type="EVENT")
+    for i in range(5):
+        playlist.add_segment(f"video_{i}.ts", 10.0)
+    assert uris(playlist) == [f"video_{i}.ts" for i in range(5)]
+    content = (tmp_path / "playlist.m3u8").read_text()
+    assert "#EXT-X-PLAYLIST-TYPE:EVENT" in content
+    assert "#EXT-X-MEDIA-SEQUENCE:0" in content
+
+
+def test_window_size_slides_the_media_sequence(tmp_path):
+    playlist = HLSPlaylist(str(tmp_path / "playlist.m3u8"), 10, window_size=3, playlist_type="EVENT")
+    for i in range(5):
+        playlist.add_segment(f"video_{i}.ts", 10.0)
+    assert uris(playlist) == ["video_2.ts", "video_3.ts", "video_4.ts"]
+    assert playlist.media_sequence == 2
+    assert playlist.next_sequence == 5
+    content = (tmp_path / "playlist.m3u8").read_text()
+    assert "#EXT-X-MEDIA-SEQUENCE:2" in content
+    # Segments leave a sliding window, which an EVENT playlist does not allow
+    assert "#EXT-X-PLAYLIST-TYPE" not in content
+
+
+def test_window_duration_keeps_the_latest_seconds(tmp_path):
+    playlist = HLSPlaylist(str(tmp_path / "playlist.m3u8"), 10, window_duration=25)
+    for i in range(6):
+        playlist.add_segment(f"video_{i}.ts", 10.0)
+    assert uris(playlist) == ["video_3.ts", "video_4.ts", "video_5.ts"]
+    assert playlist.media_sequence == 3
+
+
+def test_every_update_changes_the_etag(tmp_path):
+    playlist = HLSPlaylist(str(tmp_path / "playlist.m3u8"), 10)
+    _, first = playlist.snapshot()
+    playlist.add_segment("video_0.ts", 10.0)
+    _, second = playlist.snapshot()
+    assert first != second
+
+
+def test_blocked_request_wakes_up_when_the_segment_is_added(tmp_path):
+    playlist = HLSPlaylist(str(tmp_path / "playlist.m3u8"), 10)
+
+    async def scenario():
+        # The segment is added from another thread, as the pipeline's playlist writer does
+        threading.Timer(0.05, playlist.add_segment, ("video_0.ts", 10.0)).start()
+        available = await playlist.wait_for_segment(0, timeout=2)
+        missing = await playlist.wait_for_segment(1, timeout=0.05)
+        return available, missing
+
+    assert asyncio.run(scenario()) == (True, False)
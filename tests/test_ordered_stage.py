@@ -0,0 +1,78 @@
+# tests/test_ordered_stage.py
+import asyncio
+
+from app.workers.background_tasks import OrderedStage
+
+
+# Run a stage over `count` items and return everything it put on the output queue, in order
+async def run_stage(worker, count: int, concurrency: int = 3, skip: set = ()):
+    input_queue, output_queue = asyncio.Queue(), asyncio.Queue()
+    stage = OrderedStage("test", worker, input_queue, output_queue, concurrency)
+    stage.start()
+    for sequence in range(count):
+        if sequence in skip:
+            await stage.skip(sequence)
+        else:
+            await input_queue.put((sequence, f"item {sequence}"))
+    await asyncio.wait_for(input_queue.join(), 5)
+    stage.cancel()
+    return [output_queue.get_nowait() for _ in range(output_queue.qsize())]
+
+
+def test_results_leave_in_sequence_order():
+    # Later chunks finish first
+    async def worker(sequence, item):
+        await asyncio.sleep((6 - sequence) * 0.01)
+        return item.upper()
+
+    results = asyncio.run(run_stage(worker, 6))
+    assert results == [(sequence, f"ITEM {sequence}") for sequence in range(6)]
+
+
+def test_worker_error_passes_none_on():
+    async def worker(sequence, item):
+        if sequence == 1:
+            raise RuntimeError("boom")
+        return item
+
+    results = asyncio.run(run_stage(worker, 3))
+    assert results == [(0, "item 0"), (1, None), (2, "item 2")]
+
+
+def test_skipped_sequence_passes_none_in_its_place():
+    async def worker(sequence, item):
+        await asyncio.sleep(0.01)
+        return item
+
+    results = asyncio.run(run_stage(worker, 4, skip={2}))
+    assert results == [(0, "item 0"), (1, "item 1"), (2, None), (3, "item 3")]
+
+
+def test_full_output_queue_stops_taking_input():
+    async def scenario():
+        started = []
+
+        async def worker(sequence, item):
+            started.append(sequence)
+            return item
+
+        input_queue, output_queue = asyncio.Queue(), asyncio.Queue(maxsize=1)
+        stage = OrderedStage("test", worker, input_queue, output_queue, concurrency=2, max_pending=2)
+        stage.start()
+        for sequence in range(8):
+            input_queue.put_nowait((sequence, f"item {sequence}"))
+        await asyncio.sleep(0.1)
+
+        # Chunk 0 is on the output queue, chunk 1 waits for room and chunk 2 for chunk 1: no slot is free
+        assert started == [0, 1, 2]
+        assert input_queue.qsize() == 5
+
+        results = []
+        while len(results) < 8:
+            results.append(await asyncio.wait_for(output_queue.get(), 5))
+        await asyncio.wait_for(input_queue.join(), 5)
+        stage.cancel()
+        return results
+
+    results = asyncio.run(scenario())
+    assert [sequence for sequence, _ in results] == list(range(8))
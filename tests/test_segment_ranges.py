@@ -0,0 +1,25 @@
+# tests/test_segment_ranges.py
+import pytest
+
+from app.services.segment_service import parse_range
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-200", (800, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+])
+def test_single_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["items=0-99", "bytes=0-9,20-29", "bytes=a-b"])
+def test_unsupported_range_serves_the_whole_segment(header):
+    assert parse_range(header, 1000) is None
+
+
+def test_range_past_the_end_is_not_satisfiable():
+    with pytest.raises(ValueError):
+        parse_range("bytes=1000-", 1000)
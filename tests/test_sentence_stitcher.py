@@ -0,0 +1,49 @@
+# tests/test_sentence_stitcher.py
+from app.services.stitching_service import SentenceStitcher, transcript_segments
+
+
+def segment(start: float, end: float, text: str) -> dict:
+    return {"start": start, "end": end, "text": text}
+
+
+def test_complete_sentences_pass_through():
+    stitcher = SentenceStitcher(max_hold=20)
+    sentences, span = stitcher.stitch([segment(0, 3, "One."), segment(4, 9, "Two!")], 10, 20)
+    assert sentences == [segment(0, 3, "One."), segment(4, 9, "Two!")]
+    assert span == (10, 20)
+    assert stitcher.flush() is None
+
+
+def test_unfinished_sentence_moves_to_the_next_chunk():
+    stitcher = SentenceStitcher(max_hold=20)
+    sentences, span = stitcher.stitch([segment(0, 3, "One."), segment(8, 10, "Two and")], 0, 10)
+    assert sentences == [segment(0, 3, "One.")]
+    # The chunk ends where the held sentence starts
+    assert span == (0, 8)
+
+    sentences, span = stitcher.stitch([segment(0, 2, "a half."), segment(3, 5, "Three")], 10, 20)
+    # Times are relative to the new span, which starts with the held sentence
+    assert sentences == [segment(0, 4, "Two and a half.")]
+    assert span == (8, 13)
+
+    sentences, span = stitcher.flush()
+    assert sentences == [segment(0, 2, "Three")]
+    assert span == (13, 15)
+
+
+def test_sentence_is_not_held_beyond_max_hold():
+    stitcher = SentenceStitcher(max_hold=5)
+    # Published with the next chunk, the sentence starting at 2 s would wait until 20 s
+    sentences, span = stitcher.stitch([segment(0, 1, "One."), segment(2, 10, "Two and")], 0, 10)
+    assert sentences == [segment(0, 1, "One."), segment(2, 10, "Two and")]
+    assert span == (0, 10)
+    assert stitcher.flush() is None
+
+
+def test_transcript_without_timestamps_is_spread_over_the_chunk(tmp_path):
+    transcript = tmp_path / "audio_0.txt"
+    transcript.write_text("First sentence. Second one.", encoding="utf-8")
+    segments = transcript_segments(str(transcript), 10.0)
+    assert [segment["text"] for segment in segments] == ["First sentence.", "Second one."]
+    assert segments[0]["start"] >= 0 and segments[-1]["end"] <= 10.0
+    assert transcript_segments(None, 10.0) == []
@@ -0,0 +1,63 @@
+# tests/test_vad_segmenter.py
+import numpy as np
+
+from app.services.vad_service import VoiceActivitySegmenter
+
+SAMPLE_RATE = 16000
+FRAME = 480  # 30 ms
+PADDING = 3200  # 200 ms
+
+
+# Feed (frames, loud) runs of 30 ms frames to a segmenter and return the segments in seconds
+def segment(runs: list, target_duration: float = 4.0, max_duration: float = None) -> list:
+    segmenter = VoiceActivitySegmenter(
+        SAMPLE_RATE, target_duration, max_duration, threshold_db=-40, min_pause=0.2, max_silence=1.0, min_speech=0.3
+    )
+    speech, silence = np.full(FRAME, 8000, dtype=np.int16), np.zeros(FRAME, dtype=np.int16)
+    segments = []
+    end = 0
+    for frames, loud in runs:
+        for _ in range(frames):
+            end += FRAME
+            result = segmenter.process_frame(end, speech if loud else silence)
+            if result is not None:
+                segments.append(result)
+    result = segmenter.flush(end)
+    if result is not None:
+        segments.append(result)
+    return [(start / SAMPLE_RATE, end / SAMPLE_RATE) for start, end in segments]
+
+
+def test_silence_produces_no_segment():
+    assert segment([(200, False)]) == []
+
+
+def test_long_silence_is_skipped_between_segments():
+    # 1.5 s of speech, 3 s of silence, 1.5 s of speech
+    segments = segment([(50, True), (100, False), (50, True)])
+    assert segments == [(0.0, 1.5 + PADDING / SAMPLE_RATE), (4.5 - PADDING / SAMPLE_RATE, 6.0)]
+
+
+def test_short_noise_is_dropped():
+    # 90 ms of sound is less than min_speech
+    assert segment([(30, False), (3, True), (60, False)]) == []
+
+
+def test_long_segment_is_cut_in_a_pause():
+    # 4.5 s of speech, a 300 ms pause, then 1.5 s of speech
+    segments = segment([(150, True), (10, False), (50, True)])
+    assert len(segments) == 2
+    first, second = segments
+    assert 4.5 <= first[1] <= 4.8
+    # The next segment starts with its padding before the speech, never before the cut
+    assert second[0] == max(first[1], 4.8 - PADDING / SAMPLE_RATE)
+    assert second[1] == 6.3
+
+
+def test_segment_without_pause_is_cut_before_max_duration():
+    segments = segment([(400, True)], target_duration=4.0, max_duration=6.0)
+    assert len(segments) >= 2
+    for (start, end), (next_start, _) in zip(segments, segments[1:]):
+        assert end - start <= 6.0 + FRAME / SAMPLE_RATE
+        assert next_start == end
+    assert segments[-1][1] == 400 * FRAME / SAMPLE_RATE